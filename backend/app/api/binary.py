@@ -0,0 +1,127 @@
+"""
+Accept-based binary negotiation for the key, entropy and ciphertext endpoints.
+
+JSON with base64 fields stays the default. Clients opt in per request:
+
+  Accept: application/octet-stream   endpoints whose reply is one blob send it
+                                     raw; any other fields go to X-* headers
+  Accept: application/cbor           the reply as CBOR (core/cbor.py) with the
+                                     binary fields as byte strings
+  Content-Type: application/cbor     a request body in the same shape, read
+                                     straight into bytes
+
+In CBOR, fields keep their JSON names minus the base64 affix (iv_b64 -> iv,
+base64_key -> key; /qrng's base64 -> data). Binary types are only picked when
+the Accept header prefers them over JSON; */* or no header means JSON.
+"""
+import base64
+import binascii
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+
+from app.core import cbor
+
+JSON = "application/json"
+OCTET = "application/octet-stream"
+CBOR = "application/cbor"
+
+
+def _accepted(header: str) -> List[str]:
+    """Media types of an Accept header, most preferred first (q=0 dropped)."""
+    ranked = []
+    for i, part in enumerate(header.split(",")):
+        mtype, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for p in params:
+            name, _, value = p.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if mtype and q > 0:
+            ranked.append((-q, i, mtype.lower()))
+    return [m for _, _, m in sorted(ranked)]
+
+
+def negotiate(request: Request, *offered: str) -> Optional[str]:
+    """The type in `offered` the client prefers to JSON, or None to answer JSON."""
+    for mtype in _accepted(request.headers.get("accept", "")):
+        if mtype in offered:
+            return mtype
+        if mtype in (JSON, "application/*", "*/*"):
+            return None
+    return None
+
+
+def is_cbor(request: Request) -> bool:
+    return request.headers.get("content-type", "").split(";")[0].strip().lower() == CBOR
+
+
+async def read_cbor(request: Request) -> Dict[str, Any]:
+    try:
+        body = cbor.loads(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid CBOR body: {e}")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="CBOR body must be a map")
+    return body
+
+
+async def read_json(request: Request, model: Type[BaseModel]) -> Any:
+    """Validate a JSON body as FastAPI does for a body parameter (422 on failure)."""
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])}
+                                      for err in e.errors(include_url=False)])
+
+
+def blob(obj: Dict[str, Any], name: str, where: str = "", required: bool = True) -> Optional[bytes]:
+    """Byte-string field of a CBOR map; 400 if it is missing (and required) or not bytes."""
+    v = obj.get(name)
+    if v is None and not required:
+        return None
+    if not isinstance(v, bytes):
+        raise HTTPException(status_code=400, detail=f"{where}{name} must be a byte string")
+    return v
+
+
+def b64decode(value: str, what: str) -> bytes:
+    try:
+        return base64.b64decode(value, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail=f"{what} is not valid base64")
+
+
+def cbor_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(cbor.dumps(content), media_type=CBOR, headers=headers)
+
+
+def octet_response(data: bytes, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(data, media_type=OCTET, headers=headers)
+
+
+def _inline_refs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    defs = schema.pop("$defs", {})
+
+    def walk(x):
+        if isinstance(x, dict):
+            if "$ref" in x:
+                return walk(defs[x["$ref"].rsplit("/", 1)[-1]])
+            return {k: walk(v) for k, v in x.items()}
+        if isinstance(x, list):
+            return [walk(v) for v in x]
+        return x
+    return walk(schema)
+
+
+def body_doc(model: Type[BaseModel]) -> Dict[str, Any]:
+    """openapi_extra for handlers that read their own JSON or CBOR body."""
+    return {"requestBody": {"required": True, "content": {
+        JSON: {"schema": _inline_refs(model.model_json_schema())},
+        CBOR: {"schema": {"type": "object", "description": "same fields as JSON, bytes without the base64 affix"}},
+    }}}
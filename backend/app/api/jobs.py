@@ -0,0 +1,44 @@
+from fastapi import APIRouter, HTTPException
+from app.models.schemas import JobSimulateIn, JobOut
+from app.services.jobs import JobQueueFull, get_manager
+import base64, binascii
+
+router = APIRouter()
+
+@router.post("/jobs/simulate", response_model=JobOut, status_code=202)
+def submit_simulation(body: JobSimulateIn):
+    """
+    Queue a simulate_qkd run on the worker processes; poll GET /jobs/{id}.
+    Unlike /simulate_bb84 this accepts any mode and n_bits up to JOBS_MAX_BITS.
+    """
+    try:
+        base64.b64decode(body.seed_b64, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="seed_b64 is not valid base64")
+    params = {"seed_b64": body.seed_b64, "n_bits": body.n_bits, "mode": body.mode,
+              "engine": body.engine, "rng_version": body.rng_version}
+    if body.mode == "bb84":
+        params["eavesdrop"] = body.eavesdrop
+    if body.flip_prob is not None:
+        params["flip_prob"] = body.flip_prob
+    try:
+        job = get_manager().submit(params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return job.to_dict()
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+def get_job(job_id: str):
+    job = get_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
+
+@router.delete("/jobs/{job_id}", response_model=JobOut)
+def cancel_job(job_id: str):
+    job = get_manager().cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job.to_dict()
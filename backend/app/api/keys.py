@@ -0,0 +1,57 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from typing import Optional
+from app.models.schemas import ChatKeysOut
+from app.services import firestore as fs
+from app.services.keys import ChatNotFound, NotMember, get_key_cache
+import base64, binascii
+
+router = APIRouter()
+
+@router.get("/chats/{chat_id}/keys", response_model=ChatKeysOut, response_model_exclude_none=True)
+def chat_keys(
+    chat_id: str,
+    epoch: Optional[int] = Query(None, ge=0),
+    message_index: Optional[int] = Query(None, ge=0),
+    messages_per_epoch: int = Query(100, ge=1),
+    count: int = Query(1, ge=1, le=256),
+    x_chat_proof: Optional[str] = Header(None),
+):
+    """
+    Ratchet keys of a chat for epochs epoch .. epoch+count-1 (see core/ratchet.py).
+    Pass either epoch, or message_index to get the epoch holding that message
+    when the chat rotates keys every messages_per_epoch messages.
+    X-Chat-Proof must be base64(HMAC-SHA256(chat seed, "qw-chat-keys-v1" + chat_id)),
+    which only members, who can read the seed, can compute (see services/keys.py).
+    """
+    if not fs.enabled():
+        raise HTTPException(status_code=503, detail="Server-side reads disabled")
+    if not x_chat_proof:
+        raise HTTPException(status_code=401, detail="X-Chat-Proof required")
+    try:
+        proof = base64.b64decode(x_chat_proof, validate=True)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=401, detail="X-Chat-Proof is not valid base64")
+    if epoch is not None and message_index is not None:
+        raise HTTPException(status_code=400, detail="Pass either epoch or message_index")
+    per = None
+    if message_index is not None:
+        epoch, per = message_index // messages_per_epoch, messages_per_epoch
+    epoch = epoch or 0
+    try:
+        keys = get_key_cache().keys(chat_id, proof, epoch, count)
+    except ChatNotFound:
+        raise HTTPException(status_code=404, detail="Unknown chat")
+    except NotMember:
+        raise HTTPException(status_code=403, detail="Not a member of this chat")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "chat_id": chat_id,
+        "epoch": epoch,
+        "messages_per_epoch": per,
+        "keys": [{"epoch": epoch + i, "base64_key": base64.b64encode(k).decode()} for i, k in enumerate(keys)],
+    }
+
+@router.get("/chats/keys/cache_stats")
+def chat_keys_cache_stats():
+    return get_key_cache().stats()
@@ -1,26 +1,128 @@
-from fastapi import APIRouter, HTTPException, Query
-from app.models.schemas import MessageIn, MessageOut, ChatCreate
+from fastapi import APIRouter, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from typing import Any, Dict, Optional
+import asyncio, base64, binascii, json
+from app.api.binary import CBOR, blob, body_doc, cbor_response, is_cbor, negotiate, read_cbor, read_json
+from app.models.schemas import MAX_BULK, MessageIn, MessageOut, MessageBulkIn, MessageBulkOut, ChatCreate
 from app.services import firestore as fs
+from app.services import storage
+from app.services.hub import POLICIES, get_hub
 
 router = APIRouter()
 
-@router.post("/messages", response_model=MessageOut)
-def add_message(msg: MessageIn):
-    if not fs.enabled():
-        raise HTTPException(status_code=503, detail="Server-side writes disabled")
-    mid = fs.add_message(msg.chat_id, {
+MAX_PAGE = 500  # messages per GET /messages; longer histories are paged with the cursors
+
+def _message_doc(msg: MessageIn):
+    return {
         "senderUid": msg.sender_uid,
         "iv_b64": msg.iv_b64,
         "ct_b64": msg.ct_b64,
-        "createdAt": None  # server timestamp set via rules OR use SERVER_TIMESTAMP here
-    })
-    return {**msg.dict(), "message_id": mid}
+        # createdAt is filled with the server timestamp by the service layer
+    }
+
+# CBOR bodies and replies carry iv / ct as byte strings (see api/binary.py).
+# Stored documents keep iv_b64 / ct_b64, which clients also read from Firestore
+# directly, so the server converts at this edge.
+
+def _cbor_message(m: Any, where: str = "") -> MessageIn:
+    if not isinstance(m, dict):
+        raise HTTPException(status_code=400, detail=f"{where}message must be a map")
+    iv, ct = blob(m, "iv", where), blob(m, "ct", where)
+    try:
+        return MessageIn(chat_id=m.get("chat_id"), sender_uid=m.get("sender_uid"),
+                         iv_b64=base64.b64encode(iv).decode(), ct_b64=base64.b64encode(ct).decode())
+    except ValidationError as e:
+        err = e.errors()[0]
+        raise HTTPException(status_code=400, detail=f"{where}{err['loc'][0]}: {err['msg']}")
+
+def _cbor_item(m: Dict[str, Any]) -> Dict[str, Any]:
+    out = dict(m)
+    for field in ("iv", "ct"):
+        v = out.get(field + "_b64")
+        if isinstance(v, str):
+            try:
+                out[field] = base64.b64decode(v, validate=True)
+                del out[field + "_b64"]
+            except (binascii.Error, ValueError):
+                pass  # not written by this API; hand it back as stored
+    return out
+
+@router.post("/messages", response_model=MessageOut, openapi_extra=body_doc(MessageIn))
+async def add_message(request: Request):
+    if not fs.enabled():
+        raise HTTPException(status_code=503, detail="Server-side writes disabled")
+    msg = _cbor_message(await read_cbor(request)) if is_cbor(request) else await read_json(request, MessageIn)
+    # goes through the batch writer, so bursts of single posts share commits
+    mid = await fs.add_message_async(msg.chat_id, _message_doc(msg))
+    out = {**msg.model_dump(), "message_id": mid}
+    return cbor_response(_cbor_item(out)) if negotiate(request, CBOR) else out
+
+@router.post("/messages/bulk", response_model=MessageBulkOut, openapi_extra=body_doc(MessageBulkIn))
+async def add_messages_bulk(request: Request):
+    if not fs.enabled():
+        raise HTTPException(status_code=503, detail="Server-side writes disabled")
+    if is_cbor(request):
+        raw = (await read_cbor(request)).get("messages")
+        if not isinstance(raw, list) or not 1 <= len(raw) <= MAX_BULK:
+            raise HTTPException(status_code=400, detail=f"messages must be a list of 1..{MAX_BULK} maps")
+        messages = [_cbor_message(m, f"message {i}: ") for i, m in enumerate(raw)]
+    else:
+        messages = (await read_json(request, MessageBulkIn)).messages
+    results = await fs.add_messages_bulk([(m.chat_id, _message_doc(m)) for m in messages])
+    return cbor_response({"results": results}) if negotiate(request, CBOR) else {"results": results}
+
+def _ndjson(items):
+    for x in items:
+        yield json.dumps(jsonable_encoder(x), separators=(",", ":")).encode() + b"\n"
 
 @router.get("/messages")
-def list_messages(chat_id: str = Query(...), limit: int = 50):
+def list_messages(
+    request: Request,
+    response: Response,
+    chat_id: str = Query(...),
+    limit: int = Query(50, ge=1, le=MAX_PAGE),
+    start_after: Optional[str] = None,
+    end_before: Optional[str] = None,
+):
+    """
+    One page of at most limit (<= MAX_PAGE) messages in createdAt order. Pass
+    the X-Next-Cursor header as start_after for the next page, or X-Prev-Cursor
+    as end_before to scroll back; a whole chat is read page by page, never in
+    one request.
+    With "Accept: application/x-ndjson" the page is streamed one message per
+    line as Firestore yields it (end_before pages then arrive newest-first);
+    every item carries its own cursor for resuming. "Accept: application/cbor"
+    returns the page as a CBOR array with iv / ct as byte strings.
+    """
     if not fs.enabled():
         raise HTTPException(status_code=503, detail="Server-side reads disabled")
-    return fs.list_messages(chat_id, limit)
+    if start_after and end_before:
+        raise HTTPException(status_code=400, detail="use start_after or end_before, not both")
+    for c in (start_after, end_before):
+        if c:
+            try:
+                fs.decode_cursor(c)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(_ndjson(fs.iter_messages(chat_id, limit, start_after, end_before)),
+                                 media_type="application/x-ndjson")
+
+    items = fs.list_messages(chat_id, limit, start_after, end_before)
+    headers: Dict[str, str] = {}
+    if items:
+        headers["X-Prev-Cursor"] = items[0]["cursor"]
+        if len(items) == limit or end_before:
+            headers["X-Next-Cursor"] = items[-1]["cursor"]
+    if negotiate(request, CBOR):
+        # datetimes as the same ISO strings the JSON reply uses
+        return cbor_response([_cbor_item(m) for m in jsonable_encoder(items)], headers=headers)
+    response.headers.update(headers)
+    return items
 
 @router.post("/chats")
 def create_chat(body: ChatCreate):
@@ -28,3 +130,95 @@ def create_chat(body: ChatCreate):
         raise HTTPException(status_code=503, detail="Server-side writes disabled")
     chat_id = fs.create_chat(body.members, body.q_seed_b64)
     return {"chat_id": chat_id}
+
+# ---------- realtime ----------
+
+REPLAY_PAGE = 500
+
+def _frame(kind: str, **body) -> str:
+    return json.dumps(jsonable_encoder({"type": kind, **body}), separators=(",", ":"))
+
+def _position(m):
+    return (storage.to_us(m["createdAt"]), m["message_id"]) if m.get("createdAt") else None
+
+async def _replay(ws: WebSocket, chat_id: str, after: str):
+    """Send everything stored after the cursor; returns the position of the last message sent."""
+    last = None
+    while True:
+        page = await run_in_threadpool(fs.list_messages, chat_id, REPLAY_PAGE, after)
+        if page:
+            await ws.send_text(_frame("messages", messages=page, replay=True))
+            after, last = page[-1]["cursor"], _position(page[-1])
+        if len(page) < REPLAY_PAGE:
+            return after, last
+
+async def _watch(ws: WebSocket, sub) -> None:
+    # the client never needs to send anything; this only notices disconnects
+    try:
+        while (await ws.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        sub.close()
+
+@router.websocket("/ws/chats/{chat_id}")
+async def chat_socket(
+    ws: WebSocket,
+    chat_id: str,
+    cursor: Optional[str] = None,
+    policy: str = "drop",
+    queue: int = 256,
+    batch_ms: int = 0,
+    max_batch: int = 100,
+):
+    """
+    Push new messages of a chat as JSON frames:
+      {"type": "messages", "messages": [...], "dropped": n}
+    Each message carries its cursor. Reconnect with ?cursor=<last cursor> to
+    replay what was missed (frames marked "replay": true) before live ones.
+    policy=drop|coalesce picks what happens when this client falls more than
+    `queue` messages behind (see services/hub.py); batch_ms > 0 groups bursts
+    into one frame of up to max_batch messages.
+    """
+    if not fs.enabled():
+        await ws.close(code=1013, reason="Server-side messages disabled")
+        return
+    try:
+        if cursor:
+            fs.decode_cursor(cursor)
+        if policy not in POLICIES or not 1 <= queue <= 10000 or not 0 <= batch_ms <= 1000 or not 1 <= max_batch <= 1000:
+            raise ValueError("bad policy/queue/batch_ms/max_batch")
+    except ValueError as e:
+        await ws.close(code=1008, reason=str(e))
+        return
+
+    await ws.accept()
+    # subscribe before replaying so nothing committed in between is missed;
+    # live messages already covered by the replay are skipped by position
+    sub = get_hub().subscribe(chat_id, maxsize=queue, policy=policy)
+    watcher = asyncio.create_task(_watch(ws, sub))
+    try:
+        last = None
+        if cursor:
+            cursor, last = await _replay(ws, chat_id, cursor)
+        while True:
+            msgs, dropped, overflowed = await sub.get(max_batch, batch_ms / 1000)
+            if sub.closed:
+                break
+            if overflowed:
+                if cursor:
+                    cursor, pos = await _replay(ws, chat_id, cursor)
+                    last = pos or last
+                else:
+                    # nothing delivered yet to resume from: let the client refetch
+                    await ws.send_text(_frame("gap"))
+            if last is not None:
+                msgs = [m for m in msgs if (p := _position(m)) is None or p > last]
+            if msgs or dropped:
+                await ws.send_text(_frame("messages", messages=msgs, dropped=dropped))
+            if msgs:
+                cursor, last = msgs[-1]["cursor"], _position(msgs[-1]) or last
+    except (WebSocketDisconnect, RuntimeError):
+        pass  # client went away mid-send
+    finally:
+        sub.close()
+        watcher.cancel()
@@ -1,21 +1,121 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from app.api.binary import CBOR, OCTET, b64decode, negotiate, octet_response
+from app.core import cbor
 from app.core.bb84_sim import simulate_bb84
-from app.models.schemas import BB84Out
-import base64
+from app.core.keystream import DEFAULT_MAX_QBER, bb84_key_stream
+from app.core.montecarlo import run_trials
+from app.core.profiling import profiled
+from app.models.schemas import BB84Out, MonteCarloIn
+from app.services.cache import cache_key, simulation_cache
+from typing import Optional
+import base64, json, os
 
 router = APIRouter()
 
-@router.get("/simulate_bb84", response_model=BB84Out)
+@router.get("/simulate_bb84", response_model=BB84Out, response_model_exclude_none=True)
+@profiled
 def simulate_bb84_api(
+    request: Request,
     n_bits: int = Query(2048, ge=128, le=65536),
     seed_b64: str = Query(...),
-    eavesdrop: bool = False
+    eavesdrop: bool = False,
+    engine: str = Query("python", pattern="^(python|numpy)$"),
+    rng_version: int = Query(1, ge=1, le=2),
+    privacy: str = Query("hkdf", pattern="^(hkdf|toeplitz)$"),
+    reconcile: Optional[str] = Query(None, pattern="^cascade$"),
 ):
-    seed = base64.b64decode(seed_b64)
-    key_bytes, stats = simulate_bb84(seed, n_bits=n_bits, eavesdrop=eavesdrop)
-    return {
-        "base64_key": base64.b64encode(key_bytes).decode(),
-        "qber": stats["qber"],
-        "kept": stats["kept"],
-        "discarded": stats["discarded"],
-    }
+    """
+    Accept: application/octet-stream returns the raw key with qber, kept and
+    discarded in X-QBER / X-Kept / X-Discarded headers; application/cbor the
+    JSON fields with base64_key as the byte string "key" (see api/binary.py).
+    privacy=toeplitz answers 422 when the sifted key is too short to leave any
+    secure bits after error-correction leakage and the security margin.
+    """
+    seed = b64decode(seed_b64, "seed_b64")
+
+    # Fully deterministic in its inputs, so every chat participant can share one result.
+    # Cached as the CBOR reply, which holds the key raw for every representation.
+    def compute() -> bytes:
+        key_bytes, stats = simulate_bb84(seed, n_bits=n_bits, eavesdrop=eavesdrop,
+                                         engine=engine, rng_version=rng_version,
+                                         reconcile=reconcile, privacy=privacy)
+        out = {"key": key_bytes, "qber": stats["qber"], "kept": stats["kept"], "discarded": stats["discarded"]}
+        if stats.get("privacy_amplification"):
+            out["privacy_amplification"] = stats["privacy_amplification"]
+        return cbor.dumps(out)
+
+    key = cache_key("simulate_bb84/cbor", seed, n_bits, eavesdrop, engine, rng_version, reconcile, privacy)
+    cached = simulation_cache().get_or_compute(key, compute)
+    out = cbor.loads(cached)
+    if not out["key"]:
+        raise HTTPException(status_code=422, detail="sifted key too short for privacy amplification")
+    kind = negotiate(request, OCTET, CBOR)
+    if kind == CBOR:
+        return Response(cached, media_type=CBOR)
+    if kind == OCTET:
+        return octet_response(out["key"], headers={
+            "X-QBER": repr(out["qber"]), "X-Kept": str(out["kept"]), "X-Discarded": str(out["discarded"])})
+    return {"base64_key": base64.b64encode(out.pop("key")).decode(), **out}
+
+@router.get("/simulate_bb84/cache_stats")
+def simulate_bb84_cache_stats():
+    return simulation_cache().stats()
+
+@router.get("/simulate_bb84/stream")
+def simulate_bb84_stream(
+    seed_b64: str = Query(...),
+    block_bits: int = Query(4096, ge=128, le=65536),
+    key_bits: int = Query(256, ge=128, le=4096),
+    max_keys: int = Query(16, ge=1, le=4096),
+    max_blocks: int = Query(1000, ge=1, le=1000),
+    eavesdrop: bool = False,
+    flip_prob: float = Query(0.02, ge=0.0, le=0.5),
+    max_qber: float = Query(DEFAULT_MAX_QBER, ge=0.0, le=0.5),
+):
+    """
+    Continuous BB84 keys as NDJSON, one line per block (see core/keystream.py):
+    {"block", "kept", "qber", "accepted", "residue_bits", "keys": [{"index", "base64_key"}]}
+    Lines are sent as each block finishes; memory does not grow with max_keys.
+    max_keys and max_blocks are capped so one stream stays within ~15 CPU
+    seconds (see _stream_cost in core/admission.py).
+    """
+    seed = b64decode(seed_b64, "seed_b64")
+
+    def lines():
+        for blk in bb84_key_stream(seed, block_bits=block_bits, key_bits=key_bits, max_keys=max_keys,
+                                   max_blocks=max_blocks, eavesdrop=eavesdrop, flip_prob=flip_prob,
+                                   max_qber=max_qber):
+            blk["keys"] = [{"index": i, "base64_key": base64.b64encode(k).decode()} for i, k in blk["keys"]]
+            yield json.dumps(blk, separators=(",", ":")).encode() + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/simulate/montecarlo")
+def simulate_montecarlo(body: MonteCarloIn):
+    """
+    Distribution of QBER, kept fraction and toy key rate over `trials` runs with
+    seeds split from one master seed (see core/montecarlo.py). Trials run on
+    MC_WORKERS processes; trials * n_bits is capped by MC_MAX_WORK.
+    """
+    seed = b64decode(body.seed_b64, "seed_b64")
+    if any(not 0.0 <= q <= 1.0 for q in body.quantiles):
+        raise HTTPException(status_code=400, detail="quantiles must be in [0, 1]")
+    max_work = int(os.getenv("MC_MAX_WORK", str(1 << 28)))
+    bits_per_trial = 1 if body.engine == "analytic" else body.n_bits  # analytic cost is flat
+    if body.trials * bits_per_trial > max_work:
+        raise HTTPException(status_code=400, detail=f"trials * n_bits exceeds {max_work}")
+
+    params = {"n_bits": body.n_bits, "mode": body.mode, "engine": body.engine,
+              "rng_version": body.rng_version}
+    if body.mode == "bb84":
+        params["eavesdrop"] = body.eavesdrop
+    if body.flip_prob is not None:
+        params["flip_prob"] = body.flip_prob
+    if body.reconcile:
+        params["reconcile"] = body.reconcile
+    workers = int(os.getenv("MC_WORKERS", "0")) or None
+    try:
+        return run_trials(seed, body.trials, workers=workers, quantiles=body.quantiles, **params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
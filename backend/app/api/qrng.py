@@ -1,44 +1,25 @@
-from fastapi import APIRouter
-import os, base64, requests
+from fastapi import APIRouter, Query, Request
+from app.api.binary import CBOR, OCTET, cbor_response, negotiate, octet_response
+from app.core.entropy import qrng_bytes
+import base64
 
 router = APIRouter()
 
+MAX_BYTES = 65536  # per request; keys need 32
+
 @router.get("/qrng")
-def get_qrng(n: int = 32):
+def get_qrng(request: Request, n: int = Query(32, ge=1, le=MAX_BYTES)):
     """
     Returns n random bytes from a QRNG provider if configured, else OS CSPRNG.
-    Env (optional):
-      QRNG_URL    e.g., https://provider.example/api/bytes?length=
-      QRNG_HEADER e.g., Authorization:Bearer YOUR_TOKEN
+    Bytes come from the shared prefetching pool in core.entropy (see get_pool
+    for the QRNG_* env settings); requests never wait on the provider.
+    Accept: application/octet-stream returns the bytes raw, application/cbor
+    as {"data": bytes} (see api/binary.py).
     """
-    data = None
-    url = os.getenv("QRNG_URL")
-    header = os.getenv("QRNG_HEADER")
-
-    if url:
-        try:
-            headers = {}
-            if header and ":" in header:
-                k,v = header.split(":",1)
-                headers[k.strip()] = v.strip()
-            resp = requests.get(f"{url}{n}", headers=headers, timeout=4)
-            resp.raise_for_status()
-            # Try JSON with base64; fallback to raw content
-            try:
-                j = resp.json()
-                if "base64" in j:
-                    import base64 as b64
-                    data = b64.b64decode(j["base64"])
-                elif "bytes" in j and isinstance(j["bytes"], list):
-                    data = bytes(j["bytes"])
-                else:
-                    data = resp.content
-            except Exception:
-                data = resp.content
-        except Exception:
-            data = None
-
-    if data is None:
-        data = os.urandom(n)
-
+    data = qrng_bytes(n)
+    kind = negotiate(request, OCTET, CBOR)
+    if kind == OCTET:
+        return octet_response(data)
+    if kind == CBOR:
+        return cbor_response({"data": data})
     return {"base64": base64.b64encode(data).decode()}
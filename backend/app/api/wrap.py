@@ -1,19 +1,239 @@
-from fastapi import APIRouter
-from app.models.schemas import WrapRequest, WrapResponse
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from app.api.binary import (
+    CBOR, OCTET, b64decode, blob, body_doc, cbor_response, is_cbor, negotiate, octet_response,
+    read_cbor, read_json,
+)
+from app.core.aead_stream import DEFAULT_CHUNK, MAX_CHUNK, StreamDecryptor, StreamEncryptor
+from app.core.profiling import profiled
+from app.models.schemas import (
+    WrapRequest, WrapResponse,
+    WrapBatchRequest, WrapBatchResponse, UnwrapBatchRequest, UnwrapBatchResponse, MAX_BATCH,
+)
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import os, base64
+from functools import partial
+from typing import Dict, List, Optional, Set, Tuple
+import os, base64, binascii, tempfile
 
 router = APIRouter()
 
-@router.post("/wrap_key", response_model=WrapResponse)
-def wrap_key(req: WrapRequest):
-    key = base64.b64decode(req.wrap_key_b64)
-    pt  = base64.b64decode(req.plaintext_b64)
-    aes = AESGCM(key)
-    iv = base64.b64decode(req.iv_b64) if req.iv_b64 else os.urandom(12)
-    ct = aes.encrypt(iv, pt, None)
+_Item = Tuple[Optional[bytes], bytes, Optional[bytes]]  # (key or None for the shared one, data, iv)
+
+
+def _aes(key: bytes, where: str = "") -> AESGCM:
+    try:
+        return AESGCM(key)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{where}invalid AES-GCM key")
+
+
+@profiled
+def wrap_key(key: bytes, plaintext: bytes, iv: Optional[bytes] = None) -> Tuple[bytes, bytes]:
+    """(iv, ciphertext || tag); a random 12-byte IV unless one is given."""
+    iv = iv or os.urandom(12)
+    try:
+        return iv, _aes(key).encrypt(iv, plaintext, None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/wrap_key", response_model=WrapResponse, openapi_extra=body_doc(WrapRequest))
+async def wrap_key_api(request: Request):
+    """
+    AES-GCM wrap of one plaintext. Also takes a CBOR body {wrap_key, plaintext, iv?}
+    (see api/binary.py); Accept: application/cbor replies {iv, ct, tag_included},
+    application/octet-stream with the ciphertext raw and the IV in X-IV (base64).
+    """
+    if is_cbor(request):
+        body = await read_cbor(request)
+        args = blob(body, "wrap_key"), blob(body, "plaintext"), blob(body, "iv", required=False)
+    else:
+        req = await read_json(request, WrapRequest)
+        args = (b64decode(req.wrap_key_b64, "wrap_key_b64"), b64decode(req.plaintext_b64, "plaintext_b64"),
+                b64decode(req.iv_b64, "iv_b64") if req.iv_b64 else None)
+    iv, ct = await run_in_threadpool(wrap_key, *args)
+
+    kind = negotiate(request, OCTET, CBOR)
+    if kind == OCTET:
+        return octet_response(ct, headers={"X-IV": base64.b64encode(iv).decode()})
+    if kind == CBOR:
+        return cbor_response({"iv": iv, "ct": ct, "tag_included": True})
     return {
         "iv_b64": base64.b64encode(iv).decode(),
         "ct_b64": base64.b64encode(ct).decode(),
         "tag_included": True
     }
+
+
+class _Ciphers:
+    """One AESGCM context per distinct key within a batch."""
+
+    def __init__(self, default_key: Optional[bytes]):
+        self.default = default_key
+        self._by_key: Dict[bytes, AESGCM] = {}
+
+    def get(self, i: int, key: Optional[bytes]) -> Tuple[bytes, AESGCM]:
+        key = key or self.default
+        if not key:
+            raise HTTPException(status_code=400, detail=f"item {i}: no wrap key")
+        aes = self._by_key.get(key)
+        if aes is None:
+            aes = self._by_key[key] = _aes(key, f"item {i}: ")
+        return key, aes
+
+
+@profiled
+def wrap_batch(default_key: Optional[bytes], items: List[_Item]) -> Tuple[List[bytes], List[bytes]]:
+    """Rejects the batch if an IV repeats under the same key (GCM nonce reuse)."""
+    ciphers = _Ciphers(default_key)
+    seen: Set[Tuple[bytes, bytes]] = set()
+    ivs, cts = [], []
+    for i, (key, pt, iv) in enumerate(items):
+        key, aes = ciphers.get(i, key)
+        iv = iv or os.urandom(12)
+        if (key, iv) in seen:
+            raise HTTPException(status_code=400, detail=f"item {i}: IV reused under the same key")
+        seen.add((key, iv))
+        try:
+            cts.append(aes.encrypt(iv, pt, None))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"item {i}: {e}")
+        ivs.append(iv)
+    return ivs, cts
+
+
+@profiled
+def unwrap_batch(default_key: Optional[bytes], items: List[_Item]) -> Tuple[List[Optional[bytes]], List[int]]:
+    """Plaintexts (None where authentication failed) and the indexes that failed."""
+    ciphers = _Ciphers(default_key)
+    out, failed = [], []
+    for i, (key, ct, iv) in enumerate(items):
+        _, aes = ciphers.get(i, key)
+        try:
+            out.append(aes.decrypt(iv, ct, None))
+        except (InvalidTag, ValueError):
+            out.append(None)
+            failed.append(i)
+    return out, failed
+
+
+async def _batch_body(request: Request, model, data_field: str, iv_required: bool):
+    """(shared key, items) from a JSON or CBOR batch body; data_field is plaintext or ct."""
+    if not is_cbor(request):
+        req = await read_json(request, model)
+        default = b64decode(req.wrap_key_b64, "wrap_key_b64") if req.wrap_key_b64 else None
+        items = []
+        for i, it in enumerate(req.items):
+            where = f"item {i}: "
+            items.append((
+                b64decode(it.wrap_key_b64, where + "wrap_key_b64") if it.wrap_key_b64 else None,
+                b64decode(getattr(it, data_field + "_b64"), f"{where}{data_field}_b64"),
+                b64decode(it.iv_b64, where + "iv_b64") if it.iv_b64 else None,
+            ))
+        return default, items
+
+    body = await read_cbor(request)
+    raw = body.get("items")
+    if not isinstance(raw, list) or not 1 <= len(raw) <= MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"items must be a list of 1..{MAX_BATCH} maps")
+    items = []
+    for i, it in enumerate(raw):
+        where = f"item {i}: "
+        if not isinstance(it, dict):
+            raise HTTPException(status_code=400, detail=f"{where}not a map")
+        items.append((blob(it, "wrap_key", where, required=False), blob(it, data_field, where),
+                      blob(it, "iv", where, required=iv_required)))
+    return blob(body, "wrap_key", required=False), items
+
+
+@router.post("/wrap_key/batch", response_model=WrapBatchResponse, openapi_extra=body_doc(WrapBatchRequest))
+async def wrap_key_batch(request: Request):
+    """
+    Wrap many plaintexts in one round trip, under per-item keys or one shared key.
+    Rejects the batch if an IV repeats under the same key (GCM nonce reuse).
+    CBOR bodies and replies use wrap_key / plaintext / iv / ct byte strings.
+    """
+    default, items = await _batch_body(request, WrapBatchRequest, "plaintext", iv_required=False)
+    ivs, cts = await run_in_threadpool(wrap_batch, default, items)
+    if negotiate(request, CBOR):
+        return cbor_response({"iv": ivs, "ct": cts, "tag_included": True})
+    return {"iv_b64": [base64.b64encode(iv).decode() for iv in ivs],
+            "ct_b64": [base64.b64encode(ct).decode() for ct in cts], "tag_included": True}
+
+
+@router.post("/unwrap_key/batch", response_model=UnwrapBatchResponse, openapi_extra=body_doc(UnwrapBatchRequest))
+async def unwrap_key_batch(request: Request):
+    """Inverse of /wrap_key/batch; items that fail authentication come back as null."""
+    default, items = await _batch_body(request, UnwrapBatchRequest, "ct", iv_required=True)
+    out, failed = await run_in_threadpool(unwrap_batch, default, items)
+    if negotiate(request, CBOR):
+        return cbor_response({"plaintext": out, "failed": failed})
+    return {"plaintext_b64": [base64.b64encode(p).decode() if p is not None else None for p in out],
+            "failed": failed}
+
+
+# Transformed output is spooled rather than streamed while the body is still
+# arriving: HTTP/1.1 clients (browsers included) send the whole request before
+# reading the response, so a full-duplex reply would stall once socket buffers
+# fill. Spooling keeps memory bounded (spills to disk past this size) and lets
+# decryption fail with a proper status before any plaintext is released.
+_SPOOL_MEM = 1 << 20
+_READ_CHUNK = 64 * 1024
+
+
+def _stream_key(x_wrap_key: str) -> bytes:
+    try:
+        key = base64.b64decode(x_wrap_key, validate=True)
+    except (binascii.Error, ValueError):
+        key = b""
+    if len(key) not in (16, 24, 32):
+        raise HTTPException(status_code=400, detail="X-Wrap-Key must be a base64 AES-128/192/256 key")
+    return key
+
+
+async def _spool(request: Request, transformer) -> "tempfile.SpooledTemporaryFile":
+    spool = tempfile.SpooledTemporaryFile(max_size=_SPOOL_MEM)
+    try:
+        async for piece in request.stream():
+            spool.write(transformer.update(piece))
+        spool.write(transformer.finalize())
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+def _spooled_response(spool) -> StreamingResponse:
+    return StreamingResponse(iter(partial(spool.read, _READ_CHUNK), b""),
+                             media_type="application/octet-stream",
+                             background=BackgroundTask(spool.close))
+
+
+@router.post("/encrypt_stream")
+async def encrypt_stream(
+    request: Request,
+    x_wrap_key: str = Header(...),
+    chunk_size: int = Query(DEFAULT_CHUNK, ge=1024, le=MAX_CHUNK),
+):
+    """
+    Encrypt a raw request body (e.g. an attachment) as a chunked AES-GCM
+    stream (see core/aead_stream.py). The body is read incrementally, so
+    memory stays constant regardless of file size.
+    """
+    key = _stream_key(x_wrap_key)
+    return _spooled_response(await _spool(request, StreamEncryptor(key, chunk_size)))
+
+
+@router.post("/decrypt_stream")
+async def decrypt_stream(request: Request, x_wrap_key: str = Header(...)):
+    """Inverse of /encrypt_stream; 400 if any chunk fails authentication."""
+    key = _stream_key(x_wrap_key)
+    try:
+        spool = await _spool(request, StreamDecryptor(key))
+    except (InvalidTag, ValueError):
+        raise HTTPException(status_code=400, detail="stream failed authentication")
+    return _spooled_response(spool)
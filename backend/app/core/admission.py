@@ -0,0 +1,376 @@
+"""
+Cost-based admission control for the CPU-bound simulation endpoints.
+
+Simulations hold the GIL in the request threadpool, so a flood of large
+/simulate_bb84 calls could occupy every worker thread and push /health and
+/qrng latency into seconds. AdmissionMiddleware puts only the routes in COSTS
+behind an AdmissionController; every other request (health, metrics, qrng,
+wrap, job polling, ...) bypasses it and never waits on a simulation.
+
+  cost      estimated CPU seconds from the request parameters (n_bits, mode,
+            engine, reconcile/privacy, trials) and per-bit rates measured on
+            the simulators; cache hits are charged like misses
+  bucket    one per client, refilled at `rate` CPU seconds per second up to
+            `burst`. A request needs min(cost, burst) tokens but is charged
+            its full cost, so an oversized request is admitted once and leaves
+            the client in debt rather than being refused forever
+  slots     at most `concurrency` admitted requests compute at once; the rest
+            wait FIFO in a queue of `queue_size` until `queue_timeout`. A
+            streamed response holds its slot only while it computes a block:
+            it gives the slot up while a block is delivered, so slow readers
+            never hold one, and queues for it again before the next block
+            (without a deadline, the stream has already started)
+  shedding  empty bucket or full queue: 429; deadline passed while queued:
+            503. Both carry Retry-After, and shed requests get their tokens back
+
+POST /jobs/simulate is not governed: it runs on worker processes behind its
+own bounded queue (see services/jobs.py).
+"""
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.core.metrics import REGISTRY
+
+# CPU seconds per simulated pulse at n_bits=65536 (same runs as bench/run.py sim cases)
+SECONDS_PER_BIT = {
+    ("bb84", "python"): 0.3e-6, ("decoy", "python"): 0.8e-6, ("mdi", "python"): 0.3e-6,
+    ("bb84", "numpy"): 0.02e-6, ("decoy", "numpy"): 0.035e-6, ("mdi", "numpy"): 0.02e-6,
+}
+EXTRA_PER_BIT = {"cascade": 0.1e-6, "toeplitz": 0.15e-6}
+STREAM_PER_BIT = 0.2e-6      # bb84_key_stream, per pulse
+ANALYTIC_TRIAL = 50e-6       # montecarlo engine=analytic, per trial
+BASE_COST = 0.0002           # per request: parsing, HKDF, response
+
+ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "qw_admission_wait_seconds", "Time admitted simulation requests queued for a slot.", ("route",))
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+# ---------- cost estimates ----------
+
+def _arg(q: Dict[str, List[str]], name: str, default: Any) -> Any:
+    v = q.get(name)
+    return v[0] if v else default
+
+
+def _int(v: Any, default: int) -> int:
+    # malformed values are rejected by the endpoint later; estimate with the default
+    try:
+        return max(0, int(v))
+    except (TypeError, ValueError):
+        return default
+
+
+def sim_cost(n_bits: int, mode: str = "bb84", engine: str = "python",
+             reconcile: Optional[str] = None, privacy: Optional[str] = None) -> float:
+    per_bit = SECONDS_PER_BIT.get((mode, engine), SECONDS_PER_BIT["decoy", "python"])
+    per_bit += EXTRA_PER_BIT.get(reconcile, 0.0) + EXTRA_PER_BIT.get(privacy, 0.0)
+    return BASE_COST + n_bits * per_bit
+
+
+def _bb84_cost(q: Dict[str, List[str]], body: Any) -> float:
+    return sim_cost(_int(_arg(q, "n_bits", None), 2048), "bb84", _arg(q, "engine", "python"),
+                    _arg(q, "reconcile", None), _arg(q, "privacy", None))
+
+
+def _stream_cost(q: Dict[str, List[str]], body: Any) -> float:
+    block = max(1, _int(_arg(q, "block_bits", None), 4096))
+    wanted = _int(_arg(q, "key_bits", None), 256) * _int(_arg(q, "max_keys", None), 16)
+    # ~2.2 pulses per key bit: half the bases mismatch, then errors are dropped
+    blocks = min(_int(_arg(q, "max_blocks", None), 1000), math.ceil(2.2 * wanted / block) + 1)
+    return BASE_COST + blocks * block * STREAM_PER_BIT
+
+
+def _montecarlo_cost(q: Dict[str, List[str]], body: Any) -> float:
+    b = body if isinstance(body, dict) else {}
+    trials = _int(b.get("trials"), 1000)
+    if b.get("engine") == "analytic":
+        return BASE_COST + trials * ANALYTIC_TRIAL
+    return trials * sim_cost(_int(b.get("n_bits"), 2048), b.get("mode", "bb84"),
+                             b.get("engine", "python"), b.get("reconcile"))
+
+
+# (method, path) -> cost(query, json body or None); paths not listed take the fast lane
+COSTS: Dict[Tuple[str, str], Callable[[Dict[str, List[str]], Any], float]] = {
+    ("GET", "/simulate_bb84"): _bb84_cost,
+    ("GET", "/simulate_bb84/stream"): _stream_cost,
+    ("POST", "/simulate/montecarlo"): _montecarlo_cost,
+}
+
+
+# ---------- controller ----------
+
+class Shed(Exception):
+    def __init__(self, status: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+def _wake(fut: "asyncio.Future") -> None:
+    if not fut.done():  # a timed-out waiter may have cancelled it already
+        fut.set_result(None)
+
+
+class AdmissionController:
+    def __init__(self, concurrency: int = 2, queue_size: int = 64, queue_timeout: float = 2.0,
+                 rate: float = 1.0, burst: float = 4.0, max_clients: int = 10000):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()  # client -> [tokens, updated]
+        self._running = 0
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+        self._hold = 0.05  # moving average of seconds a slot is held, for Retry-After
+        self.admitted = 0
+        self.shed = {"rate": 0, "queue": 0, "deadline": 0}
+
+    # ---------- per-client buckets ----------
+
+    def charge(self, client: str, cost: float, now: Optional[float] = None) -> None:
+        """Take `cost` tokens from the client's bucket; Shed(429) if it cannot cover min(cost, burst)."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            b = self._buckets.get(client)
+            if b is None:
+                b = self._buckets[client] = [self.burst, now]
+                if len(self._buckets) > self.max_clients:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(client)
+                b[0] = min(self.burst, b[0] + (now - b[1]) * self.rate)
+                b[1] = now
+            need = min(cost, self.burst)
+            if b[0] < need:
+                self.shed["rate"] += 1
+                raise Shed(429, (need - b[0]) / self.rate, "simulation budget exceeded for this client")
+            b[0] -= cost
+
+    def refund(self, client: str, cost: float) -> None:
+        with self._lock:
+            b = self._buckets.get(client)
+            if b is not None:
+                b[0] = min(self.burst, b[0] + cost)
+
+    # ---------- global slots ----------
+
+    def _retry_after(self) -> float:
+        return (len(self._waiters) + 1) * self._hold / self.concurrency
+
+    async def acquire(self, resume: bool = False) -> float:
+        """
+        Wait for a slot; returns the seconds waited. Shed(429) if the queue is full, Shed(503) at the deadline.
+        resume=True is for a stream taking its slot back between blocks: it waits
+        its turn in the same FIFO but is neither limited by queue_size nor shed.
+        """
+        with self._lock:
+            if self._running < self.concurrency and not self._waiters:
+                self._running += 1
+                self.admitted += 1
+                return 0.0
+            if not resume and len(self._waiters) >= self.queue_size:
+                self.shed["queue"] += 1
+                raise Shed(429, self._retry_after(), "simulation queue full")
+            loop = asyncio.get_running_loop()
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter[1], None if resume else self.queue_timeout)
+        except BaseException as e:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.shed["deadline"] += 1
+                        raise Shed(503, self._retry_after(), "simulation queue deadline passed")
+                    raise
+            # release() handed this waiter the slot just as it gave up: keep it on
+            # a timeout, give it back if the request itself was cancelled
+            if not isinstance(e, asyncio.TimeoutError):
+                self.release()
+                raise
+        return time.monotonic() - start
+
+    def release(self, held: Optional[float] = None) -> None:
+        """Free a slot held for `held` seconds, handing it straight to the oldest waiter."""
+        with self._lock:
+            if held is not None:
+                self._hold += 0.2 * (held - self._hold)
+            if self._waiters:
+                loop, fut = self._waiters.popleft()
+                self.admitted += 1
+                loop.call_soon_threadsafe(_wake, fut)
+            else:
+                self._running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"running": self._running, "queued": len(self._waiters), "clients": len(self._buckets),
+                    "admitted": self.admitted, "shed": dict(self.shed)}
+
+
+def get_controller() -> AdmissionController:
+    """
+    Process-wide admission controller.
+    Env (optional):
+      ADMISSION_CONCURRENCY       simulations running at once (default half the CPUs, at least 1)
+      ADMISSION_QUEUE             requests waiting for a slot before 429s (default 64)
+      ADMISSION_QUEUE_TIMEOUT_MS  longest wait for a slot before a 503 (default 2000)
+      ADMISSION_CLIENT_RATE       CPU seconds per second granted to each client (default 1.0)
+      ADMISSION_CLIENT_BURST      bucket size in CPU seconds (default 4.0)
+    """
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    concurrency=int(os.getenv("ADMISSION_CONCURRENCY", "0")) or max(1, (os.cpu_count() or 2) // 2),
+                    queue_size=int(os.getenv("ADMISSION_QUEUE", "64")),
+                    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000")) / 1000,
+                    rate=float(os.getenv("ADMISSION_CLIENT_RATE", "1.0")),
+                    burst=float(os.getenv("ADMISSION_CLIENT_BURST", "4.0")),
+                )
+    return _controller
+
+
+def _admission_metrics() -> List[str]:
+    """Exposition lines for the controller; empty until the first governed request."""
+    if _controller is None:
+        return []
+    s = _controller.stats()
+    out = []
+    for key in ("running", "queued"):
+        out += [f"# TYPE qw_admission_{key} gauge", f"qw_admission_{key} {s[key]}"]
+    out += ["# TYPE qw_admission_admitted_total counter", f"qw_admission_admitted_total {s['admitted']}",
+            "# TYPE qw_admission_shed_total counter"]
+    out += [f'qw_admission_shed_total{{reason="{k}"}} {v}' for k, v in s["shed"].items()]
+    return out
+
+REGISTRY.add_collector(_admission_metrics)
+
+
+# ---------- middleware ----------
+
+async def _buffered(receive) -> Tuple[bytes, Callable]:
+    """Read the whole request body; returns it and a receive() that replays it."""
+    messages, chunks = [], []
+    while True:
+        msg = await receive()
+        messages.append(msg)
+        if msg["type"] != "http.request":
+            break
+        chunks.append(msg.get("body", b""))
+        if not msg.get("more_body", False):
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+    return b"".join(chunks), replay
+
+
+async def _reject(send, shed: Shed) -> None:
+    body = json.dumps({"detail": shed.reason}).encode()
+    await send({"type": "http.response.start", "status": shed.status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(shed.retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware applying the admission controller to the routes in COSTS.
+    Env (optional):
+      ADMISSION_ENABLED          "false" turns admission control off (default on)
+      ADMISSION_TRUST_FORWARDED  "true" keys clients by the first X-Forwarded-For
+                                 hop; only behind a proxy that sets it (default false)
+    Controller limits: see get_controller.
+    """
+
+    def __init__(self, app, controller: Optional[AdmissionController] = None,
+                 trust_forwarded: Optional[bool] = None):
+        self.app = app
+        self.enabled = controller is not None or os.getenv("ADMISSION_ENABLED", "true").lower() != "false"
+        self._controller = controller
+        self.trust_forwarded = (trust_forwarded if trust_forwarded is not None
+                                else os.getenv("ADMISSION_TRUST_FORWARDED", "false").lower() == "true")
+
+    def _client(self, scope) -> str:
+        if self.trust_forwarded:
+            for k, v in scope["headers"]:
+                if k == b"x-forwarded-for":
+                    return v.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            return await self.app(scope, receive, send)
+        estimate = COSTS.get((scope["method"], scope["path"]))
+        if estimate is None:
+            return await self.app(scope, receive, send)
+
+        body = None
+        if scope["method"] == "POST":
+            raw, receive = await _buffered(receive)
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                pass  # the endpoint reports it; charge the default estimate
+        cost = estimate(parse_qs(scope.get("query_string", b"").decode("latin-1")), body)
+        client = self._client(scope)
+        ctl = self._controller or get_controller()
+        try:
+            ctl.charge(client, cost)
+            try:
+                waited = await ctl.acquire()
+            except BaseException:
+                ctl.refund(client, cost)
+                raise
+        except Shed as e:
+            return await _reject(send, e)
+
+        ADMISSION_WAIT_SECONDS.observe(waited, scope["path"])
+        start = time.perf_counter()
+        held = True
+
+        def release() -> None:
+            nonlocal held
+            if held:
+                held = False
+                ctl.release(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            # The slot covers computing the response, not delivering it: it is
+            # handed on while each body chunk goes out, so a slow reader of
+            # /simulate_bb84/stream keeps no other simulation queued, and taken
+            # back before the app computes the next block.
+            nonlocal held, start
+            if message["type"] != "http.response.body":
+                return await send(message)
+            release()
+            await send(message)
+            if message.get("more_body", False):
+                await ctl.acquire(resume=True)
+                held, start = True, time.perf_counter()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            release()
@@ -0,0 +1,135 @@
+"""
+Chunked AES-GCM for large payloads (STREAM construction, Hoang et al. 2015).
+
+Wire format:
+  header  = b"QWS1" || uint32_be(chunk_size) || nonce_prefix (7 bytes)
+  chunk i = AES-GCM(key, nonce_i, plaintext_i) -> len(plaintext_i) + 16 bytes
+  nonce_i = nonce_prefix || uint32_be(i) || last_flag (0x01 on the final chunk, else 0x00)
+
+Every chunk except the last carries exactly chunk_size plaintext bytes; the
+last may be shorter (or empty). Binding the index and the final flag into the
+nonce means reordering, dropping or truncating chunks fails authentication.
+
+StreamEncryptor / StreamDecryptor are push-based (update/finalize) and buffer
+at most one chunk, so memory stays constant regardless of payload size.
+"""
+import os
+import struct
+from typing import Iterable, Iterator, Optional
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+MAGIC = b"QWS1"
+HEADER_LEN = len(MAGIC) + 4 + 7
+TAG_LEN = 16
+DEFAULT_CHUNK = 64 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+_MAX_CHUNKS = 1 << 32
+
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index >= _MAX_CHUNKS:
+        raise ValueError("stream too long for a 32-bit chunk counter")
+    return prefix + struct.pack(">IB", index, 1 if last else 0)
+
+
+class StreamEncryptor:
+    def __init__(self, key: bytes, chunk_size: int = DEFAULT_CHUNK, nonce_prefix: Optional[bytes] = None):
+        if not 1 <= chunk_size <= MAX_CHUNK:
+            raise ValueError(f"chunk_size must be in [1, {MAX_CHUNK}]")
+        self._aes = AESGCM(key)
+        self._chunk = chunk_size
+        self._prefix = nonce_prefix if nonce_prefix is not None else os.urandom(7)
+        if len(self._prefix) != 7:
+            raise ValueError("nonce_prefix must be 7 bytes")
+        self._buf = bytearray()
+        self._index = 0
+        self._header_sent = False
+
+    def _header(self) -> bytes:
+        if self._header_sent:
+            return b""
+        self._header_sent = True
+        return MAGIC + struct.pack(">I", self._chunk) + self._prefix
+
+    def _seal(self, pt: bytes, last: bool) -> bytes:
+        ct = self._aes.encrypt(_nonce(self._prefix, self._index, last), pt, None)
+        self._index += 1
+        return ct
+
+    def update(self, data: bytes) -> bytes:
+        """Feed plaintext; returns any ciphertext that is ready."""
+        out = [self._header()]
+        self._buf += data
+        # keep at least one byte back: only finalize() knows which chunk is last
+        while len(self._buf) > self._chunk:
+            out.append(self._seal(bytes(self._buf[: self._chunk]), last=False))
+            del self._buf[: self._chunk]
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        out = self._header() + self._seal(bytes(self._buf), last=True)
+        self._buf.clear()
+        return out
+
+
+class StreamDecryptor:
+    def __init__(self, key: bytes):
+        self._aes = AESGCM(key)
+        self._buf = bytearray()
+        self._prefix: Optional[bytes] = None
+        self._chunk = 0
+        self._index = 0
+
+    def _open(self, ct: bytes, last: bool) -> bytes:
+        # raises cryptography.exceptions.InvalidTag on tampering/truncation
+        pt = self._aes.decrypt(_nonce(self._prefix, self._index, last), ct, None)
+        self._index += 1
+        return pt
+
+    def update(self, data: bytes) -> bytes:
+        """Feed ciphertext; returns any plaintext that is authenticated and ready."""
+        self._buf += data
+        if self._prefix is None:
+            if len(self._buf) < HEADER_LEN:
+                return b""
+            if self._buf[:4] != MAGIC:
+                raise ValueError("not a QWS1 stream")
+            (self._chunk,) = struct.unpack(">I", self._buf[4:8])
+            if not 1 <= self._chunk <= MAX_CHUNK:
+                raise ValueError("invalid chunk size in header")
+            self._prefix = bytes(self._buf[8:HEADER_LEN])
+            del self._buf[:HEADER_LEN]
+        out = []
+        sealed = self._chunk + TAG_LEN
+        # a full chunk is only known to be non-final once more data follows it
+        while len(self._buf) > sealed:
+            out.append(self._open(bytes(self._buf[:sealed]), last=False))
+            del self._buf[:sealed]
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        if self._prefix is None:
+            raise ValueError("truncated stream header")
+        pt = self._open(bytes(self._buf), last=True)
+        self._buf.clear()
+        return pt
+
+
+def encrypt_iter(key: bytes, chunks: Iterable[bytes], chunk_size: int = DEFAULT_CHUNK) -> Iterator[bytes]:
+    enc = StreamEncryptor(key, chunk_size)
+    for c in chunks:
+        out = enc.update(c)
+        if out:
+            yield out
+    yield enc.finalize()
+
+
+def decrypt_iter(key: bytes, chunks: Iterable[bytes]) -> Iterator[bytes]:
+    dec = StreamDecryptor(key)
+    for c in chunks:
+        out = dec.update(c)
+        if out:
+            yield out
+    yield dec.finalize()
+
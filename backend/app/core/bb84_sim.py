@@ -2,7 +2,27 @@ import hashlib
 import hmac
 import math
 import random
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from app.core.bitstream import LEGACY_VERSION, STREAM_VERSION, SUPPORTED_VERSIONS, BitStream
+from app.core.bitvec import BitVector
+from app.core.metrics import stages
+
+# Lanes of the version-2 bit stream (see bitstream.py). Fixed so that any
+# engine or client reading the same lane gets the same draws.
+LANE_BITS = 0      # Alice's bits
+LANE_A_BASES = 1   # Alice's bases
+LANE_B_BASES = 2   # Bob's bases
+LANE_NOISE = 3     # channel flip, one per kept pulse
+LANE_EVE = 4       # eavesdropper disturbance, one per kept pulse
+LANE_CLASS = 5     # decoy: signal/decoy class, one per pulse
+LANE_PHOTONS = 6   # decoy: non-empty pulse, one per pulse
+LANE_LOSS = 7      # decoy: channel loss, one per pulse
+LANE_BSM = 8       # mdi: successful Bell-state measurement, one per pulse
+LANE_TOEPLITZ = 9  # public Toeplitz matrix for privacy amplification (any rng_version)
+
+RECONCILE_METHODS = ("cascade",)
+PRIVACY_METHODS = ("hkdf", "toeplitz")
 
 # =========================
 # Utilities (deterministic)
@@ -12,27 +32,30 @@ def _rng_from_seed(seed_bytes: bytes) -> random.Random:
     """Deterministic RNG from shared seed."""
     return random.Random(int.from_bytes(seed_bytes, "big", signed=False))
 
-def _hkdf_from_bits(bits: List[int], salt: bytes, length: int = 32) -> bytes:
+def _check_rng_version(rng_version: int) -> None:
+    if rng_version not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unknown rng_version: {rng_version!r}")
+
+def _check_reconcile(reconcile: Optional[str]) -> None:
+    if reconcile is not None and reconcile not in RECONCILE_METHODS:
+        raise ValueError(f"Unknown reconcile method: {reconcile!r}")
+
+def _check_privacy(privacy: str) -> None:
+    if privacy not in PRIVACY_METHODS:
+        raise ValueError(f"Unknown privacy amplification: {privacy!r}")
+
+def _rng_bits(rng: random.Random, n: int) -> BitVector:
+    """Same bits as n calls to rng.getrandbits(1), drawn in one call."""
+    return BitVector.from_rng_words(rng.getrandbits(32 * n), n)
+
+def _hkdf_from_bits(bits: Iterable[int], salt: bytes, length: int = 32) -> bytes:
     """
     HKDF(Extract+Expand) over packed bitstring using HMAC-SHA256.
     Returns 'length' bytes (default 32 for AES-256 key).
+    A BitVector is already packed MSB-first and is used as-is.
     """
-    # pack bits -> bytes
-    by = bytearray()
-    acc = 0
-    n = 0
-    for b in bits:
-        acc = (acc << 1) | (1 if b else 0)
-        n += 1
-        if n == 8:
-            by.append(acc & 0xFF)
-            acc = 0
-            n = 0
-    if n:
-        by.append((acc << (8 - n)) & 0xFF)
-
     # HKDF-Extract
-    prk = hmac.new(salt, bytes(by), hashlib.sha256).digest()
+    prk = hmac.new(salt, BitVector.from_bits(bits).to_bytes(), hashlib.sha256).digest()
     # HKDF-Expand
     okm = b""
     t = b""
@@ -43,12 +66,44 @@ def _hkdf_from_bits(bits: List[int], salt: bytes, length: int = 32) -> bytes:
         i += 1
     return okm[:length]
 
+def _reconcile_bits(alice_kept: BitVector, bob_kept: BitVector, qber: float,
+                    seed_bytes: bytes) -> Tuple[BitVector, Dict[str, Any]]:
+    """Bob's sifted bits after Cascade (see cascade.py) and its leakage stats."""
+    import numpy as np
+    from app.core import cascade
+    fixed, info = cascade.reconcile(np.frombuffer(alice_kept.to_01(), dtype=np.uint8),
+                                    np.frombuffer(bob_kept.to_01(), dtype=np.uint8), qber, seed_bytes)
+    return BitVector.from_01(fixed.tobytes()), info
+
+def _amplify_bits(bits: BitVector, qber: float, seed_bytes: bytes,
+                  leaked_bits: Optional[int]) -> Tuple[bytes, Dict[str, Any]]:
+    """Toeplitz privacy amplification of the key bits (see privacy.py)."""
+    import numpy as np
+    from app.core import privacy
+    return privacy.amplify(np.frombuffer(bits.to_01(), dtype=np.uint8), qber, seed_bytes, leaked_bits)
+
 def _h2(x: float) -> float:
     """Binary entropy (base-2)."""
     if x <= 0.0 or x >= 1.0:
         return 0.0
     return -x * math.log2(x) - (1 - x) * math.log2(1 - x)
 
+def _vector_engine(engine: str):
+    """
+    Resolve the 'engine' kwarg of the simulators.
+    Returns None for the reference pure-Python engine, else the vectorized module.
+    """
+    if engine == "python":
+        return None
+    if engine == "numpy":
+        from app.core import bb84_vec  # numpy is only imported when asked for
+        return bb84_vec
+    raise ValueError(f"Unknown engine: {engine!r}")
+
+def _nonempty_prob(mu: float) -> float:
+    """P(Poisson(mu) > 0) = 1 - e^-mu; the only photon-number fact detection uses."""
+    return -math.expm1(-mu) if mu > 0 else 0.0
+
 def _poisson(rng: random.Random, mu: float) -> int:
     """Knuth Poisson sampler (deterministic via rng)."""
     if mu <= 0:
@@ -61,6 +116,49 @@ def _poisson(rng: random.Random, mu: float) -> int:
         p *= rng.random()
     return k - 1
 
+def _binomial(rng: random.Random, n: int, p: float) -> int:
+    """
+    Binomial(n, p) sample in O(1) expected rng calls (deterministic via rng).
+    Geometric skipping when n*p < 10, else Hormann's BTRS rejection sampler
+    (same algorithm as random.binomialvariate in Python 3.12+).
+    """
+    if n <= 0 or p <= 0.0:
+        return 0
+    if p >= 1.0:
+        return n
+    if p > 0.5:
+        return n - _binomial(rng, n, 1.0 - p)
+    if n * p < 10.0:
+        x = y = 0
+        c = math.log1p(-p)
+        while True:
+            y += math.floor(math.log(1.0 - rng.random()) / c) + 1
+            if y > n:
+                return x
+            x += 1
+
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    vr = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(p / (1.0 - p))
+    m = math.floor((n + 1) * p)
+    h = math.lgamma(m + 1) + math.lgamma(n - m + 1)
+    while True:
+        u = rng.random() - 0.5
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        v = rng.random()
+        if us >= 0.07 and v <= vr:
+            return k
+        v *= alpha / (a / (us * us) + b)
+        if v > 0 and math.log(v) <= h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - m) * lpq:
+            return k
+
 
 # ======================================
 # 1) Improved baseline: (toy) BB84 flow
@@ -71,55 +169,97 @@ def simulate_bb84(
     n_bits: int = 2048,
     eavesdrop: bool = False,
     flip_prob: float = 0.02,
+    engine: str = "python",
+    rng_version: int = LEGACY_VERSION,
+    reconcile: Optional[str] = None,
+    privacy: str = "hkdf",
 ) -> Tuple[bytes, Dict[str, Any]]:
     """
     Deterministic BB84-like simulation driven by a shared seed.
     - Adds parameterized noise (flip_prob) and optional eavesdropping disturbance.
     - Derives a 32-byte session key via HKDF(HMAC-SHA256) from the kept bits.
+    - engine: "python" (reference) or "numpy" (vectorized, see bb84_vec).
+    - rng_version: 1 = legacy random.Random stream (existing seeds),
+                   2 = counter-mode bit stream (see bitstream.py).
+    - reconcile: None keeps the positions where Alice and Bob already agree;
+                 "cascade" corrects Bob's sifted bits instead and reports the
+                 disclosed parity bits under stats["reconciliation"].
+    - privacy: "hkdf" derives the 32-byte key above; "toeplitz" outputs as many
+               bytes as the leakage estimate allows (see privacy.py), possibly
+               none, and reports them under stats["privacy_amplification"].
 
     RETURNS:
       (key_bytes, stats_dict)
         key_bytes: 32 bytes (e.g., for AES-256-GCM)
-        stats_dict: {mode, kept, discarded, qber, n_bits}
+        stats_dict: {mode, kept, discarded, qber, n_bits, engine, rng_version}
     NOTE: Pedagogical only; not physical QKD.
     """
-    r = _rng_from_seed(seed_bytes)
-
-    photon_bits = [r.getrandbits(1) for _ in range(n_bits)]
-    alice_bases = [r.getrandbits(1) for _ in range(n_bits)]  # 0=Z, 1=X
-    bob_bases   = [r.getrandbits(1) for _ in range(n_bits)]
-
-    measured = []
-    for i in range(n_bits):
-        bit = photon_bits[i]
-        if alice_bases[i] == bob_bases[i]:
-            # channel noise / eavesdropping disturbance
-            if eavesdrop and r.random() < 0.10:  # simple disturbance model
-                bit ^= 1
-            if r.random() < flip_prob:
-                bit ^= 1
-        else:
-            # mismatched bases -> random outcome
-            bit = r.getrandbits(1)
-        measured.append(bit)
-
-    kept_idx   = [i for i in range(n_bits) if alice_bases[i] == bob_bases[i]]
-    alice_kept = [photon_bits[i] for i in kept_idx]
-    bob_kept   = [measured[i]     for i in kept_idx]
-
-    mismatches = sum(1 for a, b in zip(alice_kept, bob_kept) if a != b)
-    kept = len(kept_idx)
+    _check_rng_version(rng_version)
+    _check_reconcile(reconcile)
+    _check_privacy(privacy)
+    vec = _vector_engine(engine)
+    if vec is not None:
+        return vec.simulate_bb84(seed_bytes, n_bits=n_bits, eavesdrop=eavesdrop,
+                                 flip_prob=flip_prob, rng_version=rng_version, reconcile=reconcile,
+                                 privacy=privacy)
+
+    lap = stages("bb84", "python")
+    if rng_version == STREAM_VERSION:
+        photon_bits = BitStream(seed_bytes, LANE_BITS).bits(n_bits)
+        alice_bases = BitStream(seed_bytes, LANE_A_BASES).bits(n_bits)
+        bob_bases   = BitStream(seed_bytes, LANE_B_BASES).bits(n_bits)
+        alice_kept = photon_bits.compress(~(alice_bases ^ bob_bases))
+        flips = BitStream(seed_bytes, LANE_NOISE).bernoulli(len(alice_kept), flip_prob)
+        if eavesdrop:
+            flips ^= BitStream(seed_bytes, LANE_EVE).bernoulli(len(alice_kept), 0.10)
+        bob_kept = alice_kept ^ flips
+    else:
+        r = _rng_from_seed(seed_bytes)
+
+        photon_bits = _rng_bits(r, n_bits)
+        alice_bases = _rng_bits(r, n_bits)  # 0=Z, 1=X
+        bob_bases   = _rng_bits(r, n_bits)
+        matched = ~(alice_bases ^ bob_bases)
+
+        bob_measured = bytearray()  # Bob's bits on matched bases only
+        for bit, same_basis in zip(photon_bits.to_01(), matched.to_01()):
+            if same_basis:
+                # channel noise / eavesdropping disturbance
+                if eavesdrop and r.random() < 0.10:  # simple disturbance model
+                    bit ^= 1
+                if r.random() < flip_prob:
+                    bit ^= 1
+                bob_measured.append(bit)
+            else:
+                # mismatched bases -> random outcome (discarded by sifting,
+                # but still drawn so the RNG stream stays in step)
+                r.getrandbits(1)
+
+        alice_kept = photon_bits.compress(matched)
+        bob_kept   = BitVector.from_01(bob_measured)
+    lap("bits")
+
+    diff = alice_kept ^ bob_kept
+    mismatches = diff.popcount()
+    kept = len(alice_kept)
     qber = (mismatches / kept) if kept else 0.0
 
     # Sift: only matching bits become raw key material
-    key_bits = [b for a, b in zip(alice_kept, bob_kept) if a == b]
+    if reconcile:
+        key_bits, rec = _reconcile_bits(alice_kept, bob_kept, qber, seed_bytes)
+    else:
+        key_bits = bob_kept.compress(~diff)
+    lap("sift")
 
     # Derive stable 32-byte session key via HKDF over kept bits
-    if key_bits:
+    if privacy == "toeplitz":
+        key_bytes, pa = _amplify_bits(key_bits, qber, seed_bytes, rec["leaked_bits"] if reconcile else None)
+    elif len(key_bits):
         key_bytes = _hkdf_from_bits(key_bits, salt=b"bb84-edu-v2")
     else:
         # No kept bits; derive from seed so it's still deterministic
         key_bytes = hmac.new(b"bb84-edu-v2", seed_bytes, hashlib.sha256).digest()
+    lap("hkdf")
 
     stats = {
         "mode": "bb84",
@@ -127,7 +267,13 @@ def simulate_bb84(
         "discarded": n_bits - kept,
         "qber": qber,          # fraction in [0,1]
         "n_bits": n_bits,
+        "engine": "python",
+        "rng_version": rng_version,
     }
+    if reconcile:
+        stats["reconciliation"] = rec
+    if privacy == "toeplitz":
+        stats["privacy_amplification"] = pa
     return key_bytes, stats
 
 
@@ -143,6 +289,10 @@ def simulate_bb84_decoy(
     p_signal: float = 0.7,
     channel_loss: float = 0.10,
     flip_prob: float = 0.02,
+    engine: str = "python",
+    rng_version: int = LEGACY_VERSION,
+    reconcile: Optional[str] = None,
+    privacy: str = "hkdf",
 ) -> Tuple[bytes, Dict[str, Any]]:
     """
     Educational Decoy-state BB84:
@@ -150,61 +300,91 @@ def simulate_bb84_decoy(
     - Photon numbers ~ Poisson(mu_signal/decoy).
     - Detection requires >=1 photon AND survival through channel loss.
     - Sift on basis match; add flip noise; estimate toy secure key rate.
+    - rng_version 2 draws "photons > 0" directly with probability 1 - e^-mu.
 
     RETURNS: (key_bytes (32), stats)
       stats includes a 'decoy' subdict with per-class info.
     NOTE: Pedagogical only; not security-proof calculations.
     """
-    r = _rng_from_seed(seed_bytes)
-
-    # Bit & basis choices
-    a_bits  = [r.getrandbits(1) for _ in range(n_bits)]
-    a_bases = [r.getrandbits(1) for _ in range(n_bits)]
-    b_bases = [r.getrandbits(1) for _ in range(n_bits)]
-
-    # Class (signal/decoy) assignment
-    cls = ["signal" if r.random() < p_signal else "decoy" for _ in range(n_bits)]
-
-    # Photon numbers and simple detection model
-    detections = []
-    for i in range(n_bits):
-        mu = mu_signal if cls[i] == "signal" else mu_decoy
-        photons = _poisson(r, mu)
-        detected = photons > 0 and (r.random() > channel_loss)
-        detections.append(detected)
-
-    # Sifting
-    kept_positions: List[int] = []
-    bob_kept_bits: List[int] = []
-    for i in range(n_bits):
-        if not detections[i]:
-            continue
-        if a_bases[i] != b_bases[i]:
-            continue
-        bit = a_bits[i]
-        if r.random() < flip_prob:
-            bit ^= 1
-        kept_positions.append(i)
-        bob_kept_bits.append(bit)
-
-    alice_kept_bits = [a_bits[i] for i in kept_positions]
-    mismatches = sum(1 for a, b in zip(alice_kept_bits, bob_kept_bits) if a != b)
-    kept = len(kept_positions)
+    _check_rng_version(rng_version)
+    _check_reconcile(reconcile)
+    _check_privacy(privacy)
+    vec = _vector_engine(engine)
+    if vec is not None:
+        return vec.simulate_bb84_decoy(
+            seed_bytes, n_bits=n_bits, mu_signal=mu_signal, mu_decoy=mu_decoy,
+            p_signal=p_signal, channel_loss=channel_loss, flip_prob=flip_prob,
+            rng_version=rng_version, reconcile=reconcile, privacy=privacy,
+        )
+
+    lap = stages("decoy", "python")
+    if rng_version == STREAM_VERSION:
+        a_bits  = BitStream(seed_bytes, LANE_BITS).bits(n_bits)
+        a_bases = BitStream(seed_bytes, LANE_A_BASES).bits(n_bits)
+        b_bases = BitStream(seed_bytes, LANE_B_BASES).bits(n_bits)
+        is_signal = BitStream(seed_bytes, LANE_CLASS).bernoulli(n_bits, p_signal)
+        nonempty = BitStream(seed_bytes, LANE_PHOTONS).bernoulli_where(
+            is_signal, _nonempty_prob(mu_signal), _nonempty_prob(mu_decoy))
+        lost = BitStream(seed_bytes, LANE_LOSS).bernoulli(n_bits, channel_loss)
+        detected = nonempty & ~lost
+
+        sifted = detected & ~(a_bases ^ b_bases)
+        alice_kept_bits = a_bits.compress(sifted)
+        flips = BitStream(seed_bytes, LANE_NOISE).bernoulli(len(alice_kept_bits), flip_prob)
+        bob_kept_bits = alice_kept_bits ^ flips
+    else:
+        r = _rng_from_seed(seed_bytes)
+
+        # Bit & basis choices
+        a_bits  = _rng_bits(r, n_bits)
+        a_bases = _rng_bits(r, n_bits)
+        b_bases = _rng_bits(r, n_bits)
+
+        # Class (signal/decoy) assignment
+        is_signal = BitVector.from_01(bytes(r.random() < p_signal for _ in range(n_bits)))
+
+        # Photon numbers and simple detection model
+        detections = bytearray()
+        for signal in is_signal.to_01():
+            mu = mu_signal if signal else mu_decoy
+            photons = _poisson(r, mu)
+            detections.append(photons > 0 and (r.random() > channel_loss))
+        detected = BitVector.from_01(detections)
+
+        # Sifting (bit-flip noise drawn per kept pulse, in pulse order)
+        sifted = detected & ~(a_bases ^ b_bases)
+        alice_kept_bits = a_bits.compress(sifted)
+        bob_kept_bits = BitVector.from_01(bytes(
+            bit ^ (r.random() < flip_prob) for bit in alice_kept_bits.to_01()
+        ))
+    lap("bits")
+
+    mismatches = (alice_kept_bits ^ bob_kept_bits).popcount()
+    kept = len(alice_kept_bits)
     qber = (mismatches / kept) if kept else 0.0
 
     # Per-class detection stats
-    det_sig = sum(1 for i, d in enumerate(detections) if d and cls[i] == "signal")
-    det_dec = sum(1 for i, d in enumerate(detections) if d and cls[i] == "decoy")
+    det_sig = (detected & is_signal).popcount()
+    det_dec = detected.popcount() - det_sig
 
-    # Toy secure key rate preview: R ≈ s * (1 − H2(q))
+    leaked = 0
+    if reconcile:
+        bob_kept_bits, rec = _reconcile_bits(alice_kept_bits, bob_kept_bits, qber, seed_bytes)
+        leaked = rec["leaked_bits"]
+
+    # Toy secure key rate preview: R ≈ s * (1 − H2(q)) − leaked / n
     kept_frac = kept / n_bits if n_bits else 0.0
-    secure_key_rate = max(0.0, kept_frac * (1.0 - _h2(min(qber, 0.49))))
+    secure_key_rate = max(0.0, kept_frac * (1.0 - _h2(min(qber, 0.49))) - (leaked / n_bits if n_bits else 0.0))
+    lap("sift")
 
     # Derive 32-byte session key
-    if kept:
+    if privacy == "toeplitz":
+        key_bytes, pa = _amplify_bits(bob_kept_bits, qber, seed_bytes, rec["leaked_bits"] if reconcile else None)
+    elif kept:
         key_bytes = _hkdf_from_bits(bob_kept_bits, salt=b"decoy-bb84-edu-v1")
     else:
         key_bytes = hmac.new(b"decoy-bb84-edu-v1", seed_bytes, hashlib.sha256).digest()
+    lap("hkdf")
 
     stats = {
         "mode": "decoy-bb84",
@@ -212,6 +392,8 @@ def simulate_bb84_decoy(
         "discarded": n_bits - kept,
         "qber": qber,  # fraction
         "n_bits": n_bits,
+        "engine": "python",
+        "rng_version": rng_version,
         "decoy": {
             "mu_signal": mu_signal,
             "mu_decoy": mu_decoy,
@@ -223,9 +405,71 @@ def simulate_bb84_decoy(
             "secure_key_rate_toy": secure_key_rate,
         },
     }
+    if reconcile:
+        stats["reconciliation"] = rec
+    if privacy == "toeplitz":
+        stats["privacy_amplification"] = pa
     return key_bytes, stats
 
 
+def simulate_bb84_decoy_counts(
+    seed_bytes: bytes,
+    n_bits: int = 2048,
+    mu_signal: float = 0.5,
+    mu_decoy: float = 0.1,
+    p_signal: float = 0.7,
+    channel_loss: float = 0.10,
+    flip_prob: float = 0.02,
+) -> Dict[str, Any]:
+    """
+    Statistics-only fast path of simulate_bb84_decoy: samples the aggregate
+    counts from the same model instead of simulating each pulse, so the cost
+    does not depend on n_bits. Per class, a pulse is detected with probability
+    (1 - e^-mu) * (1 - channel_loss); half the detections survive sifting and
+    each kept bit flips with flip_prob:
+
+      signal   ~ Bin(n_bits, p_signal)
+      det_sig  ~ Bin(signal, P_det(mu_signal)),  det_dec ~ Bin(decoy, P_det(mu_decoy))
+      kept     ~ Bin(det_sig + det_dec, 1/2)
+      errors   ~ Bin(kept, flip_prob)
+
+    Same distribution of stats as the per-pulse simulator (not the same draws
+    for a given seed). RETURNS: stats only; there are no key bits to derive from.
+    """
+    r = _rng_from_seed(seed_bytes)
+    lap = stages("decoy", "analytic")
+    n_sig = _binomial(r, n_bits, p_signal)
+    det_sig = _binomial(r, n_sig, _nonempty_prob(mu_signal) * (1.0 - channel_loss))
+    det_dec = _binomial(r, n_bits - n_sig, _nonempty_prob(mu_decoy) * (1.0 - channel_loss))
+    kept = _binomial(r, det_sig + det_dec, 0.5)
+    mismatches = _binomial(r, kept, flip_prob)
+    lap("bits")
+
+    qber = (mismatches / kept) if kept else 0.0
+    kept_frac = kept / n_bits if n_bits else 0.0
+    secure_key_rate = max(0.0, kept_frac * (1.0 - _h2(min(qber, 0.49))))
+    lap("sift")
+
+    return {
+        "mode": "decoy-bb84",
+        "kept": kept,
+        "discarded": n_bits - kept,
+        "qber": qber,
+        "n_bits": n_bits,
+        "engine": "analytic",
+        "decoy": {
+            "mu_signal": mu_signal,
+            "mu_decoy": mu_decoy,
+            "p_signal": p_signal,
+            "detected_signal": det_sig,
+            "detected_decoy": det_dec,
+            "channel_loss": channel_loss,
+            "flip_prob": flip_prob,
+            "secure_key_rate_toy": secure_key_rate,
+        },
+    }
+
+
 # ================================
 # 3) Advanced: MDI-BB84 (toy)
 # ================================
@@ -235,6 +479,10 @@ def simulate_mdi_bb84(
     n_bits: int = 2048,
     bsm_success: float = 0.25,
     flip_prob: float = 0.02,
+    engine: str = "python",
+    rng_version: int = LEGACY_VERSION,
+    reconcile: Optional[str] = None,
+    privacy: str = "hkdf",
 ) -> Tuple[bytes, Dict[str, Any]]:
     """
     Educational MDI-BB84:
@@ -246,40 +494,58 @@ def simulate_mdi_bb84(
       stats includes an 'mdi' subdict with BSM parameters.
     NOTE: Pedagogical only; not physical implementation.
     """
-    r = _rng_from_seed(seed_bytes)
+    _check_rng_version(rng_version)
+    _check_reconcile(reconcile)
+    _check_privacy(privacy)
+    vec = _vector_engine(engine)
+    if vec is not None:
+        return vec.simulate_mdi_bb84(seed_bytes, n_bits=n_bits, bsm_success=bsm_success,
+                                     flip_prob=flip_prob, rng_version=rng_version, reconcile=reconcile,
+                                     privacy=privacy)
+
+    lap = stages("mdi", "python")
+    if rng_version == STREAM_VERSION:
+        a_bits  = BitStream(seed_bytes, LANE_BITS).bits(n_bits)
+        a_bases = BitStream(seed_bytes, LANE_A_BASES).bits(n_bits)
+        b_bases = BitStream(seed_bytes, LANE_B_BASES).bits(n_bits)
+        bsm_ok = BitStream(seed_bytes, LANE_BSM).bernoulli(n_bits, bsm_success)
+
+        sifted = bsm_ok & ~(a_bases ^ b_bases)
+        alice_kept_bits = a_bits.compress(sifted)
+        flips = BitStream(seed_bytes, LANE_NOISE).bernoulli(len(alice_kept_bits), flip_prob)
+        bob_kept_bits = alice_kept_bits ^ flips
+    else:
+        r = _rng_from_seed(seed_bytes)
 
-    a_bits, a_bases = ([r.getrandbits(1) for _ in range(n_bits)],
-                       [r.getrandbits(1) for _ in range(n_bits)])
-    b_bits, b_bases = ([r.getrandbits(1) for _ in range(n_bits)],
-                       [r.getrandbits(1) for _ in range(n_bits)])
+        a_bits, a_bases = _rng_bits(r, n_bits), _rng_bits(r, n_bits)
+        b_bits, b_bases = _rng_bits(r, n_bits), _rng_bits(r, n_bits)
 
-    # Which time slots yield a successful BSM at the relay
-    bsm_ok = [r.random() < bsm_success for _ in range(n_bits)]
+        # Which time slots yield a successful BSM at the relay
+        bsm_ok = BitVector.from_01(bytes(r.random() < bsm_success for _ in range(n_bits)))
 
-    kept_positions: List[int] = []
-    bob_kept_bits: List[int] = []
-    for i in range(n_bits):
-        if not bsm_ok[i]:
-            continue
-        if a_bases[i] != b_bases[i]:
-            continue
         # Simple correlation model: start with Alice's bit, add noise
-        bit = a_bits[i]
-        if r.random() < flip_prob:
-            bit ^= 1
-        kept_positions.append(i)
-        bob_kept_bits.append(bit)
-
-    alice_kept_bits = [a_bits[i] for i in kept_positions]
-    mismatches = sum(1 for a, b in zip(alice_kept_bits, bob_kept_bits) if a != b)
-    kept = len(kept_positions)
+        sifted = bsm_ok & ~(a_bases ^ b_bases)
+        alice_kept_bits = a_bits.compress(sifted)
+        bob_kept_bits = BitVector.from_01(bytes(
+            bit ^ (r.random() < flip_prob) for bit in alice_kept_bits.to_01()
+        ))
+    lap("bits")
+
+    mismatches = (alice_kept_bits ^ bob_kept_bits).popcount()
+    kept = len(alice_kept_bits)
     qber = (mismatches / kept) if kept else 0.0
+    if reconcile:
+        bob_kept_bits, rec = _reconcile_bits(alice_kept_bits, bob_kept_bits, qber, seed_bytes)
+    lap("sift")
 
     # Derive 32-byte session key
-    if kept:
+    if privacy == "toeplitz":
+        key_bytes, pa = _amplify_bits(bob_kept_bits, qber, seed_bytes, rec["leaked_bits"] if reconcile else None)
+    elif kept:
         key_bytes = _hkdf_from_bits(bob_kept_bits, salt=b"mdi-bb84-edu-v1")
     else:
         key_bytes = hmac.new(b"mdi-bb84-edu-v1", seed_bytes, hashlib.sha256).digest()
+    lap("hkdf")
 
     stats = {
         "mode": "mdi-bb84",
@@ -287,12 +553,18 @@ def simulate_mdi_bb84(
         "discarded": n_bits - kept,
         "qber": qber,  # fraction
         "n_bits": n_bits,
+        "engine": "python",
+        "rng_version": rng_version,
         "mdi": {
             "bsm_success": bsm_success,
             "flip_prob": flip_prob,
             "kept_fraction": (kept / n_bits) if n_bits else 0.0,
         },
     }
+    if reconcile:
+        stats["reconciliation"] = rec
+    if privacy == "toeplitz":
+        stats["privacy_amplification"] = pa
     return key_bytes, stats
 
 
@@ -309,6 +581,8 @@ def simulate_qkd(
     """
     Convenience wrapper:
       mode ∈ {"bb84", "decoy", "mdi"}
+      engine ∈ {"python", "numpy"}, rng_version ∈ {1, 2},
+      reconcile ∈ {None, "cascade"}, privacy ∈ {"hkdf", "toeplitz"} (forwarded via kwargs)
     """
     mode = mode.lower()
     if mode == "bb84":
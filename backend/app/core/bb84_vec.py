@@ -0,0 +1,270 @@
+"""
+Vectorized (NumPy) engine for the toy QKD simulators in bb84_sim.
+
+Each function mirrors its pure-Python counterpart but produces bits, bases,
+noise masks and sifting masks as whole-array operations.
+
+With rng_version=1 the draws come from a NumPy generator seeded like the
+legacy engine: statistics match the reference engine but the exact key bytes
+do not, so both chat participants must use the same engine for a given seed.
+With rng_version=2 both engines read the same counter-mode lanes (see
+bitstream.py) and derive identical keys.
+
+Select per call with ``engine="numpy"`` on the simulate_* functions.
+"""
+import hashlib
+import hmac
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.bb84_sim import (
+    LANE_A_BASES, LANE_B_BASES, LANE_BITS, LANE_BSM, LANE_CLASS, LANE_EVE,
+    LANE_LOSS, LANE_NOISE, LANE_PHOTONS, _h2, _hkdf_from_bits, _nonempty_prob,
+)
+from app.core import cascade, privacy as pa_mod
+from app.core.bitstream import STREAM_VERSION, BitStream
+from app.core.bitvec import BitVector
+from app.core.metrics import stages
+
+
+def _unpack(raw: bytes, n: int) -> np.ndarray:
+    """First n bits (MSB-first) of raw as a uint8 0/1 array."""
+    return np.unpackbits(np.frombuffer(raw, dtype=np.uint8), count=n)
+
+
+class _GeneratorSource:
+    """rng_version 1: one sequential NumPy generator; lanes are ignored."""
+
+    def __init__(self, seed_bytes: bytes):
+        self._r = np.random.default_rng(int.from_bytes(seed_bytes, "big", signed=False))
+
+    def bits(self, lane: int, n: int) -> np.ndarray:
+        return _unpack(self._r.bytes((n + 7) // 8), n)
+
+    def bernoulli(self, lane: int, n: int, p) -> np.ndarray:
+        return self._r.random(n) < p
+
+
+class _StreamSource:
+    """rng_version 2: counter-mode lanes, bit-for-bit the same as the Python engine."""
+
+    def __init__(self, seed_bytes: bytes):
+        self._seed = seed_bytes
+
+    def bits(self, lane: int, n: int) -> np.ndarray:
+        return _unpack(BitStream(self._seed, lane).read((n + 7) // 8), n)
+
+    def bernoulli(self, lane: int, n: int, p) -> np.ndarray:
+        words = np.frombuffer(BitStream(self._seed, lane).read(8 * n), dtype=">u8") >> np.uint64(11)
+        # u < p  <=>  (w >> 11) < ceil(p * 2**53); exact in float64 (see bernoulli_limit)
+        return words < np.ceil(np.asarray(p, dtype=np.float64) * float(1 << 53))
+
+
+def _source(seed_bytes: bytes, rng_version: int):
+    if rng_version == STREAM_VERSION:
+        return _StreamSource(seed_bytes)
+    return _GeneratorSource(seed_bytes)
+
+def _key_from_bits(bits: np.ndarray, salt: bytes, seed_bytes: bytes) -> bytes:
+    if bits.size:
+        return _hkdf_from_bits(BitVector(np.packbits(bits).tobytes(), int(bits.size)), salt)
+    return hmac.new(salt, seed_bytes, hashlib.sha256).digest()
+
+
+def simulate_bb84(
+    seed_bytes: bytes,
+    n_bits: int = 2048,
+    eavesdrop: bool = False,
+    flip_prob: float = 0.02,
+    rng_version: int = 1,
+    reconcile: Optional[str] = None,
+    privacy: str = "hkdf",
+) -> Tuple[bytes, Dict[str, Any]]:
+    """Array version of bb84_sim.simulate_bb84."""
+    lap = stages("bb84", "numpy")
+    src = _source(seed_bytes, rng_version)
+
+    photon_bits = src.bits(LANE_BITS, n_bits)
+    alice_bases = src.bits(LANE_A_BASES, n_bits)  # 0=Z, 1=X
+    bob_bases   = src.bits(LANE_B_BASES, n_bits)
+    matched = alice_bases == bob_bases
+
+    # Only matched-basis slots are kept, so Bob's random outcomes on
+    # mismatched bases never influence the result and are not drawn.
+    alice_kept = photon_bits[matched]
+    flips = src.bernoulli(LANE_NOISE, alice_kept.size, flip_prob)
+    if eavesdrop:
+        flips ^= src.bernoulli(LANE_EVE, alice_kept.size, 0.10)  # simple disturbance model
+    bob_kept = alice_kept ^ flips
+    lap("bits")
+
+    kept = int(alice_kept.size)
+    mismatches = int(np.count_nonzero(alice_kept != bob_kept))
+    qber = (mismatches / kept) if kept else 0.0
+
+    if reconcile:
+        key_bits, rec = cascade.reconcile(alice_kept, bob_kept, qber, seed_bytes)
+    else:
+        key_bits = bob_kept[alice_kept == bob_kept]
+    lap("sift")
+    if privacy == "toeplitz":
+        key_bytes, pa = pa_mod.amplify(key_bits, qber, seed_bytes, rec["leaked_bits"] if reconcile else None)
+    else:
+        key_bytes = _key_from_bits(key_bits, b"bb84-edu-v2", seed_bytes)
+    lap("hkdf")
+
+    stats = {
+        "mode": "bb84",
+        "kept": kept,
+        "discarded": n_bits - kept,
+        "qber": qber,
+        "n_bits": n_bits,
+        "engine": "numpy",
+        "rng_version": rng_version,
+    }
+    if reconcile:
+        stats["reconciliation"] = rec
+    if privacy == "toeplitz":
+        stats["privacy_amplification"] = pa
+    return key_bytes, stats
+
+
+def simulate_bb84_decoy(
+    seed_bytes: bytes,
+    n_bits: int = 2048,
+    mu_signal: float = 0.5,
+    mu_decoy: float = 0.1,
+    p_signal: float = 0.7,
+    channel_loss: float = 0.10,
+    flip_prob: float = 0.02,
+    rng_version: int = 1,
+    reconcile: Optional[str] = None,
+    privacy: str = "hkdf",
+) -> Tuple[bytes, Dict[str, Any]]:
+    """Array version of bb84_sim.simulate_bb84_decoy."""
+    lap = stages("decoy", "numpy")
+    src = _source(seed_bytes, rng_version)
+
+    a_bits  = src.bits(LANE_BITS, n_bits)
+    a_bases = src.bits(LANE_A_BASES, n_bits)
+    b_bases = src.bits(LANE_B_BASES, n_bits)
+
+    is_signal = src.bernoulli(LANE_CLASS, n_bits, p_signal)
+    # Only "photons > 0" matters for detection, and P(Poisson(mu) > 0) = 1 - e^-mu,
+    # so one uniform per pulse replaces the per-pulse Knuth loop.
+    p_nonempty = np.where(is_signal, _nonempty_prob(mu_signal), _nonempty_prob(mu_decoy))
+    nonempty = src.bernoulli(LANE_PHOTONS, n_bits, p_nonempty)
+    detected = nonempty & ~src.bernoulli(LANE_LOSS, n_bits, channel_loss)
+
+    sifted = detected & (a_bases == b_bases)
+    alice_kept_bits = a_bits[sifted]
+    flips = src.bernoulli(LANE_NOISE, alice_kept_bits.size, flip_prob)
+    bob_kept_bits = alice_kept_bits ^ flips
+    lap("bits")
+
+    kept = int(alice_kept_bits.size)
+    mismatches = int(np.count_nonzero(flips))
+    qber = (mismatches / kept) if kept else 0.0
+
+    det_sig = int(np.count_nonzero(detected & is_signal))
+    det_dec = int(np.count_nonzero(detected & ~is_signal))
+
+    leaked = 0
+    if reconcile:
+        bob_kept_bits, rec = cascade.reconcile(alice_kept_bits, bob_kept_bits, qber, seed_bytes)
+        leaked = rec["leaked_bits"]
+
+    kept_frac = kept / n_bits if n_bits else 0.0
+    secure_key_rate = max(0.0, kept_frac * (1.0 - _h2(min(qber, 0.49))) - (leaked / n_bits if n_bits else 0.0))
+    lap("sift")
+
+    if privacy == "toeplitz":
+        key_bytes, pa = pa_mod.amplify(bob_kept_bits, qber, seed_bytes, rec["leaked_bits"] if reconcile else None)
+    else:
+        key_bytes = _key_from_bits(bob_kept_bits, b"decoy-bb84-edu-v1", seed_bytes)
+    lap("hkdf")
+
+    stats = {
+        "mode": "decoy-bb84",
+        "kept": kept,
+        "discarded": n_bits - kept,
+        "qber": qber,
+        "n_bits": n_bits,
+        "engine": "numpy",
+        "rng_version": rng_version,
+        "decoy": {
+            "mu_signal": mu_signal,
+            "mu_decoy": mu_decoy,
+            "p_signal": p_signal,
+            "detected_signal": det_sig,
+            "detected_decoy": det_dec,
+            "channel_loss": channel_loss,
+            "flip_prob": flip_prob,
+            "secure_key_rate_toy": secure_key_rate,
+        },
+    }
+    if reconcile:
+        stats["reconciliation"] = rec
+    if privacy == "toeplitz":
+        stats["privacy_amplification"] = pa
+    return key_bytes, stats
+
+
+def simulate_mdi_bb84(
+    seed_bytes: bytes,
+    n_bits: int = 2048,
+    bsm_success: float = 0.25,
+    flip_prob: float = 0.02,
+    rng_version: int = 1,
+    reconcile: Optional[str] = None,
+    privacy: str = "hkdf",
+) -> Tuple[bytes, Dict[str, Any]]:
+    """Array version of bb84_sim.simulate_mdi_bb84."""
+    lap = stages("mdi", "numpy")
+    src = _source(seed_bytes, rng_version)
+
+    a_bits  = src.bits(LANE_BITS, n_bits)
+    a_bases = src.bits(LANE_A_BASES, n_bits)
+    b_bases = src.bits(LANE_B_BASES, n_bits)
+
+    bsm_ok = src.bernoulli(LANE_BSM, n_bits, bsm_success)
+
+    sifted = bsm_ok & (a_bases == b_bases)
+    alice_kept_bits = a_bits[sifted]
+    flips = src.bernoulli(LANE_NOISE, alice_kept_bits.size, flip_prob)
+    bob_kept_bits = alice_kept_bits ^ flips
+    lap("bits")
+
+    kept = int(alice_kept_bits.size)
+    mismatches = int(np.count_nonzero(flips))
+    qber = (mismatches / kept) if kept else 0.0
+    if reconcile:
+        bob_kept_bits, rec = cascade.reconcile(alice_kept_bits, bob_kept_bits, qber, seed_bytes)
+    lap("sift")
+
+    if privacy == "toeplitz":
+        key_bytes, pa = pa_mod.amplify(bob_kept_bits, qber, seed_bytes, rec["leaked_bits"] if reconcile else None)
+    else:
+        key_bytes = _key_from_bits(bob_kept_bits, b"mdi-bb84-edu-v1", seed_bytes)
+    lap("hkdf")
+
+    stats = {
+        "mode": "mdi-bb84",
+        "kept": kept,
+        "discarded": n_bits - kept,
+        "qber": qber,
+        "n_bits": n_bits,
+        "engine": "numpy",
+        "rng_version": rng_version,
+        "mdi": {
+            "bsm_success": bsm_success,
+            "flip_prob": flip_prob,
+            "kept_fraction": (kept / n_bits) if n_bits else 0.0,
+        },
+    }
+    if reconcile:
+        stats["reconciliation"] = rec
+    if privacy == "toeplitz":
+        stats["privacy_amplification"] = pa
+    return key_bytes, stats
@@ -0,0 +1,92 @@
+"""
+Versioned, counter-mode deterministic bit source for the QKD simulators.
+
+Version 1 is the legacy ``random.Random`` (MT19937) path in bb84_sim and is
+kept so existing chat seeds still derive the same keys. Version 2 is defined
+here and is meant to be reproducible outside Python (e.g. with Web Crypto in
+the frontend):
+
+  stream key   K    = HMAC-SHA256(key=b"qw-bitstream-v2", msg=seed)
+  lane L            = AES-256-CTR keystream under K, initial counter block
+                      uint32_be(L) || 12 zero bytes (counter = low 64 bits)
+  bits(n)           = next ceil(n/8) bytes of the lane, MSB-first, first n bits
+  uniform           = next 8 bytes of the lane as uint64_be w, u = (w >> 11) / 2**53
+  bernoulli(p)      = 1 if u < p else 0, one uniform per trial
+
+Each lane is consumed sequentially; the simulators assign one lane per
+purpose (photon bits, bases, noise, ...) so every draw has a fixed position
+independent of the others. Bits and uniforms are produced a block at a time.
+"""
+import hashlib
+import hmac
+import math
+import sys
+from array import array
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from app.core.bitvec import BitVector
+
+LEGACY_VERSION = 1
+STREAM_VERSION = 2
+SUPPORTED_VERSIONS = (LEGACY_VERSION, STREAM_VERSION)
+
+_KEY_LABEL = b"qw-bitstream-v2"
+
+
+def stream_key(seed_bytes: bytes) -> bytes:
+    """K = HMAC-SHA256(b"qw-bitstream-v2", seed)."""
+    return hmac.new(_KEY_LABEL, seed_bytes, hashlib.sha256).digest()
+
+def bernoulli_limit(p: float) -> int:
+    """
+    Integer threshold t such that u < p  <=>  (w >> 11) < t, for a 64-bit
+    word w with u = (w >> 11) / 2**53. Avoids float conversion per draw.
+    """
+    if p <= 0.0:
+        return 0
+    if p >= 1.0:
+        return 1 << 53
+    return math.ceil(p * (1 << 53))
+
+
+class BitStream:
+    """One lane of the version-2 stream, read sequentially."""
+
+    def __init__(self, seed_bytes: bytes, lane: int):
+        if not 0 <= lane < (1 << 32):
+            raise ValueError("lane must fit in 32 bits")
+        iv = lane.to_bytes(4, "big") + bytes(12)
+        self._enc = Cipher(algorithms.AES(stream_key(seed_bytes)), modes.CTR(iv)).encryptor()
+
+    def read(self, nbytes: int) -> bytes:
+        """Next nbytes of raw keystream."""
+        return self._enc.update(bytes(nbytes))
+
+    def bits(self, n: int) -> BitVector:
+        return BitVector(self.read((n + 7) // 8), n)
+
+    def words(self, n: int) -> array:
+        """Next n uint64_be words as native integers."""
+        w = array("Q", self.read(8 * n))
+        if sys.byteorder == "little":
+            w.byteswap()
+        return w
+
+    def uniforms(self, n: int):
+        """Next n uniform variates in [0, 1) with 53-bit resolution."""
+        return [(w >> 11) * (1.0 / (1 << 53)) for w in self.words(n)]
+
+    def bernoulli(self, n: int, p: float) -> BitVector:
+        """n independent draws of (u < p) as a packed mask."""
+        return _below(self.words(n), p)
+
+    def bernoulli_where(self, select: BitVector, p_true: float, p_false: float) -> BitVector:
+        """One draw per bit of select, with probability p_true where it is 1 else p_false."""
+        words = self.words(len(select))
+        return (select & _below(words, p_true)) | (~select & _below(words, p_false))
+
+
+def _below(words: array, p: float) -> BitVector:
+    # (w >> 11) < t  <=>  w < t << 11, compared in C via map()
+    return BitVector.from_01(bytes(map((bernoulli_limit(p) << 11).__gt__, words)))
@@ -0,0 +1,151 @@
+"""
+Compact bit-vector for BB84 key material.
+
+Bits are packed MSB-first into an immutable ``bytes`` buffer, with any
+padding bits in the last byte kept at zero. That is exactly the layout
+``_hkdf_from_bits`` has always fed to HMAC, so ``to_bytes()`` can go
+straight into HKDF without a re-packing pass.
+
+All bulk operations (XOR/AND/OR, popcount, compress) run over whole words
+via int/bytes builtins rather than per-bit Python loops.
+"""
+from itertools import compress as _compress
+from typing import Iterable, Iterator, Union
+
+# byte value -> its 8 bits as b"\x00"/b"\x01" (MSB first)
+_UNPACK = [bytes((v >> (7 - k)) & 1 for k in range(8)) for v in range(256)]
+# b"\x00"/b"\x01" -> b"0"/b"1" so a 0/1 byte string can be parsed by int(.., 2)
+_TO_ASCII = bytes.maketrans(b"\x00\x01", b"01")
+# any byte -> its top bit (used to pick bits out of raw RNG words)
+_TOP_BIT = bytes(v >> 7 for v in range(256))
+
+
+class BitVector:
+    """Immutable packed bit sequence of fixed length."""
+
+    __slots__ = ("_buf", "_n")
+
+    def __init__(self, buf: bytes = b"", n_bits: int = -1):
+        if n_bits < 0:
+            n_bits = len(buf) * 8
+        if n_bits > len(buf) * 8:
+            raise ValueError("n_bits exceeds buffer size")
+        nbytes = (n_bits + 7) // 8
+        buf = bytes(buf[:nbytes])
+        pad = nbytes * 8 - n_bits
+        if pad and buf[-1] & ((1 << pad) - 1):
+            buf = buf[:-1] + bytes([buf[-1] & (0xFF << pad) & 0xFF])
+        self._buf = buf
+        self._n = n_bits
+
+    # ---------- construction ----------
+
+    @classmethod
+    def from_bits(cls, bits: Iterable[int]) -> "BitVector":
+        """Pack an iterable of truthy/falsy values."""
+        if isinstance(bits, BitVector):
+            return bits
+        if not isinstance(bits, (bytes, bytearray)):
+            bits = bytes(1 if b else 0 for b in bits)
+        return cls.from_01(bits)
+
+    @classmethod
+    def from_01(cls, bits01: Union[bytes, bytearray]) -> "BitVector":
+        """Pack a byte string whose bytes are each 0 or 1."""
+        n = len(bits01)
+        if not n:
+            return cls(b"", 0)
+        nbytes = (n + 7) // 8
+        s = bytes(bits01).translate(_TO_ASCII) + b"0" * (nbytes * 8 - n)
+        return cls(int(s, 2).to_bytes(nbytes, "big"), n)
+
+    @classmethod
+    def from_rng_words(cls, words: int, n_bits: int) -> "BitVector":
+        """
+        Top bit of each 32-bit word of ``words`` (least-significant word first).
+        ``random.Random.getrandbits(32 * n)`` packs n MT outputs this way, and
+        ``getrandbits(1)`` returns the top bit of one output, so this reproduces
+        n successive ``getrandbits(1)`` calls in a single draw.
+        """
+        tops = words.to_bytes(4 * n_bits, "little")[3::4]
+        return cls.from_01(tops.translate(_TOP_BIT))
+
+    @classmethod
+    def zeros(cls, n_bits: int) -> "BitVector":
+        return cls(bytes((n_bits + 7) // 8), n_bits)
+
+    # ---------- views / export ----------
+
+    def __len__(self) -> int:
+        return self._n
+
+    def to_bytes(self) -> bytes:
+        """Packed MSB-first bytes (the internal buffer; no copy)."""
+        return self._buf
+
+    def __bytes__(self) -> bytes:
+        return self._buf
+
+    def to_01(self) -> bytes:
+        """One byte (0 or 1) per bit."""
+        return b"".join(map(_UNPACK.__getitem__, self._buf))[: self._n]
+
+    def to_list(self):
+        return list(self.to_01())
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.to_01())
+
+    def __getitem__(self, i: int) -> int:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("bit index out of range")
+        return (self._buf[i >> 3] >> (7 - (i & 7))) & 1
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, BitVector):
+            return NotImplemented
+        return self._n == other._n and self._buf == other._buf
+
+    def __hash__(self) -> int:
+        return hash((self._n, self._buf))
+
+    def __repr__(self) -> str:
+        return f"BitVector(n_bits={self._n}, ones={self.popcount()})"
+
+    # ---------- word-level ops ----------
+
+    def _int(self) -> int:
+        return int.from_bytes(self._buf, "big")
+
+    def _same_len(self, other: "BitVector") -> None:
+        if self._n != other._n:
+            raise ValueError(f"length mismatch: {self._n} != {other._n}")
+
+    def _wrap(self, value: int) -> "BitVector":
+        return BitVector(value.to_bytes(len(self._buf), "big"), self._n)
+
+    def popcount(self) -> int:
+        return self._int().bit_count()
+
+    def __xor__(self, other: "BitVector") -> "BitVector":
+        self._same_len(other)
+        return self._wrap(self._int() ^ other._int())
+
+    def __and__(self, other: "BitVector") -> "BitVector":
+        self._same_len(other)
+        return self._wrap(self._int() & other._int())
+
+    def __or__(self, other: "BitVector") -> "BitVector":
+        self._same_len(other)
+        return self._wrap(self._int() | other._int())
+
+    def __invert__(self) -> "BitVector":
+        # padding bits are cleared again by the constructor
+        return self._wrap(self._int() ^ ((1 << (8 * len(self._buf))) - 1))
+
+    def compress(self, mask: "BitVector") -> "BitVector":
+        """Bits of self at positions where mask is 1, in order."""
+        self._same_len(mask)
+        return BitVector.from_01(bytes(_compress(self.to_01(), mask.to_01())))
@@ -0,0 +1,206 @@
+"""
+Minimal CBOR (RFC 8949) codec for the binary API framing (see api/binary.py).
+
+dumps() covers what the API sends: None, bool, int (-2**64 .. 2**64 - 1),
+float (always float64), bytes, str, list/tuple and dict. loads() reads the
+same plus what other encoders commonly emit: half and single precision
+floats, indefinite-length strings/arrays/maps, undefined (read as None) and
+tags (dropped, the tagged item is returned as is). Bignums and other
+extensions are out of scope.
+
+loads() raises ValueError on anything malformed, truncated or followed by
+trailing bytes, and bounds nesting and declared lengths by the input size,
+so a short hostile body cannot make it allocate or recurse without limit.
+"""
+import struct
+from typing import Any, List
+
+MAX_DEPTH = 64
+
+_UINT, _NINT, _BYTES, _TEXT, _ARRAY, _MAP, _TAG, _SIMPLE = range(8)
+_BREAK = 0xFF
+
+
+def _head(out: bytearray, major: int, n: int) -> None:
+    mt = major << 5
+    if n < 24:
+        out.append(mt | n)
+    elif n < 1 << 8:
+        out += bytes((mt | 24, n))
+    elif n < 1 << 16:
+        out.append(mt | 25)
+        out += n.to_bytes(2, "big")
+    elif n < 1 << 32:
+        out.append(mt | 26)
+        out += n.to_bytes(4, "big")
+    elif n < 1 << 64:
+        out.append(mt | 27)
+        out += n.to_bytes(8, "big")
+    else:
+        raise ValueError("integer does not fit in 64 bits")
+
+
+def _encode(out: bytearray, obj: Any) -> None:
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        _head(out, _BYTES, len(obj))
+        out += obj
+    elif isinstance(obj, str):
+        b = obj.encode()
+        _head(out, _TEXT, len(b))
+        out += b
+    elif obj is None:
+        out.append(0xF6)
+    elif obj is True:
+        out.append(0xF5)
+    elif obj is False:
+        out.append(0xF4)
+    elif isinstance(obj, int):
+        if obj >= 0:
+            _head(out, _UINT, obj)
+        else:
+            _head(out, _NINT, -1 - obj)
+    elif isinstance(obj, float):
+        out.append(0xFB)
+        out += struct.pack(">d", obj)
+    elif isinstance(obj, dict):
+        _head(out, _MAP, len(obj))
+        for k, v in obj.items():
+            _encode(out, k)
+            _encode(out, v)
+    elif isinstance(obj, (list, tuple)):
+        _head(out, _ARRAY, len(obj))
+        for x in obj:
+            _encode(out, x)
+    else:
+        raise TypeError(f"cannot CBOR-encode {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    out = bytearray()
+    _encode(out, obj)
+    return bytes(out)
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = bytes(data)
+        self.pos = 0
+
+    def take(self, n: int) -> bytes:
+        end = self.pos + n
+        if end > len(self.data):
+            raise ValueError("truncated CBOR")
+        chunk = self.data[self.pos:end]
+        self.pos = end
+        return chunk
+
+    def byte(self) -> int:
+        if self.pos >= len(self.data):
+            raise ValueError("truncated CBOR")
+        self.pos += 1
+        return self.data[self.pos - 1]
+
+    def length(self, info: int) -> int:
+        if info < 24:
+            return info
+        if info > 27:
+            raise ValueError(f"bad CBOR additional info {info}")
+        return int.from_bytes(self.take(1 << (info - 24)), "big")
+
+    def sized(self, n: int) -> int:
+        # every item takes at least one byte, so no honest length exceeds the rest
+        if n > len(self.data) - self.pos:
+            raise ValueError("truncated CBOR")
+        return n
+
+    def chunks(self, major: int) -> bytes:
+        # indefinite-length string: definite chunks of the same major type up to a break
+        parts: List[bytes] = []
+        while True:
+            ib = self.byte()
+            if ib == _BREAK:
+                return b"".join(parts)
+            if ib >> 5 != major or ib & 31 == 31:
+                raise ValueError("bad chunk in indefinite-length CBOR string")
+            parts.append(self.take(self.length(ib & 31)))
+
+    def item(self, depth: int = 0) -> Any:
+        if depth > MAX_DEPTH:
+            raise ValueError("CBOR nested too deeply")
+        ib = self.byte()
+        major, info = ib >> 5, ib & 31
+        if major == _SIMPLE:
+            return self.simple(info)
+        if info == 31:
+            return self.indefinite(major, depth)
+        n = self.length(info)
+        if major == _UINT:
+            return n
+        if major == _NINT:
+            return -1 - n
+        if major == _BYTES:
+            return self.take(n)
+        if major == _TEXT:
+            return self.text(self.take(n))
+        if major == _ARRAY:
+            return [self.item(depth + 1) for _ in range(self.sized(n))]
+        if major == _MAP:
+            out = {}
+            for _ in range(self.sized(n)):
+                k = self.item(depth + 1)
+                out[self.key(k)] = self.item(depth + 1)
+            return out
+        return self.item(depth + 1)  # tag: keep the tagged item
+
+    def indefinite(self, major: int, depth: int) -> Any:
+        if major == _BYTES:
+            return self.chunks(major)
+        if major == _TEXT:
+            return self.text(self.chunks(major))
+        if major not in (_ARRAY, _MAP):
+            raise ValueError("bad indefinite-length CBOR item")
+        items = []
+        while self.data[self.pos:self.pos + 1] != b"\xff":
+            items.append(self.item(depth + 1))
+        self.take(1)
+        if major == _ARRAY:
+            return items
+        if len(items) % 2:
+            raise ValueError("odd number of items in CBOR map")
+        return {self.key(k): v for k, v in zip(items[::2], items[1::2])}
+
+    def simple(self, info: int) -> Any:
+        if info == 20:
+            return False
+        if info == 21:
+            return True
+        if info in (22, 23):
+            return None
+        if info == 25:
+            return struct.unpack(">e", self.take(2))[0]
+        if info == 26:
+            return struct.unpack(">f", self.take(4))[0]
+        if info == 27:
+            return struct.unpack(">d", self.take(8))[0]
+        raise ValueError(f"unsupported CBOR simple value {info}")
+
+    @staticmethod
+    def text(b: bytes) -> str:
+        try:
+            return b.decode()
+        except UnicodeDecodeError:
+            raise ValueError("CBOR text string is not UTF-8")
+
+    @staticmethod
+    def key(k: Any) -> Any:
+        if isinstance(k, (list, dict)):
+            raise ValueError("unhashable CBOR map key")
+        return k
+
+
+def loads(data: bytes) -> Any:
+    r = _Reader(data)
+    obj = r.item()
+    if r.pos != len(r.data):
+        raise ValueError("trailing bytes after CBOR item")
+    return obj
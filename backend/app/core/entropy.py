@@ -1,25 +1,232 @@
-import base64, os, requests
+import base64, os, threading, time
+from typing import Dict, List, Optional
 
-def qrng_bytes(n: int = 32) -> bytes:
-    url = os.getenv("QRNG_URL")
-    header = os.getenv("QRNG_HEADER")
-    if url:
+from app.core.metrics import QRNG_FETCH_SECONDS, REGISTRY
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _parse_qrng_response(resp: "requests.Response") -> bytes:
+    """Provider payload -> bytes: JSON {"base64": ...} or {"bytes": [...]}, else raw body."""
+    try:
+        j = resp.json()
+        if "base64" in j:
+            return base64.b64decode(j["base64"])
+        if "bytes" in j and isinstance(j["bytes"], list):
+            return bytes(j["bytes"])
+        return resp.content
+    except Exception:
+        return resp.content
+
+
+class _Ring:
+    """Fixed-capacity byte ring buffer (not thread-safe; EntropyPool holds the lock)."""
+
+    def __init__(self, capacity: int):
+        self._buf = bytearray(capacity)
+        self._start = 0
+        self.size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    def write(self, data: bytes) -> int:
+        cap = len(self._buf)
+        data = memoryview(data)[: cap - self.size]
+        end = (self._start + self.size) % cap
+        first = min(len(data), cap - end)
+        self._buf[end:end + first] = data[:first]
+        self._buf[: len(data) - first] = data[first:]
+        self.size += len(data)
+        return len(data)
+
+    def read(self, n: int) -> bytes:
+        if not 0 <= n <= self.size:
+            raise ValueError(f"cannot read {n} of {self.size} buffered bytes")
+        cap = len(self._buf)
+        first = min(n, cap - self._start)
+        out = bytes(self._buf[self._start:self._start + first]) + bytes(self._buf[: n - first])
+        self._start = (self._start + n) % cap
+        self.size -= n
+        return out
+
+
+class EntropyPool:
+    """
+    Shared QRNG entropy pool.
+    A background thread keeps a ring buffer between the low and high watermarks
+    using one pooled HTTP session; take() serves from the buffer and falls back
+    to os.urandom for that request whenever the buffer can't cover it.
+    Without a provider URL every request is served by os.urandom.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        header: Optional[str] = None,
+        low_water: int = 1024,
+        high_water: int = 8192,
+        fetch_bytes: int = 1024,
+        timeout: float = 4.0,
+        retry_backoff: float = 5.0,
+    ):
+        if not 0 <= low_water <= high_water:
+            raise ValueError("require 0 <= low_water <= high_water")
+        self.url = url
+        self.headers: Dict[str, str] = {}
+        if header and ":" in header:
+            k, v = header.split(":", 1)
+            self.headers[k.strip()] = v.strip()
+        self.low_water = low_water
+        self.high_water = high_water
+        self.fetch_bytes = fetch_bytes
+        self.timeout = timeout
+        self.retry_backoff = retry_backoff
+
+        self._ring = _Ring(max(high_water, 1))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._session: Optional["requests.Session"] = None
+
+        self.served = 0
+        self.fallbacks = 0
+        self.fetches = 0
+        self.fetch_errors = 0
+
+    # ---------- provider ----------
+
+    def _fetch(self, n: int) -> bytes:
+        if self._session is None:
+            import requests  # deferred: ~60 ms of startup, unused when QRNG_URL is unset
+            self._session = requests.Session()
+        start, outcome = time.perf_counter(), "error"
         try:
-            headers = {}
-            if header and ":" in header:
-                k,v = header.split(":",1)
-                headers[k.strip()] = v.strip()
-            r = requests.get(f"{url}{n}", headers=headers, timeout=4)
-            r.raise_for_status()
+            resp = self._session.get(f"{self.url}{n}", headers=self.headers, timeout=self.timeout)
+            resp.raise_for_status()
+            outcome = "ok"
+        finally:
+            QRNG_FETCH_SECONDS.observe(time.perf_counter() - start, outcome)
+        return _parse_qrng_response(resp)
+
+    def _refill(self) -> None:
+        while not self._stop.is_set():
+            with self._lock:
+                want = self.high_water - self._ring.size
+            if want <= 0:
+                return
             try:
-                j = r.json()
-                if "base64" in j:
-                    return base64.b64decode(j["base64"])
-                if "bytes" in j:
-                    return bytes(j["bytes"])
-                return r.content
+                data = self._fetch(min(self.fetch_bytes, want))
             except Exception:
-                return r.content
-        except Exception:
-            pass
-    return os.urandom(n)
+                data = b""
+            with self._lock:
+                if data:
+                    self.fetches += 1
+                    self._ring.write(data)
+                else:
+                    self.fetch_errors += 1
+            if not data:
+                # provider down: back off instead of hammering it
+                self._stop.wait(self.retry_backoff)
+                return
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # clear before draining: a wake-up that lands during the refill is kept
+            self._wake.clear()
+            self._refill()
+            self._wake.wait()
+
+    def start(self) -> "EntropyPool":
+        if self.url and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="qrng-pool", daemon=True)
+            self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+            self._thread = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    # ---------- consumers ----------
+
+    def take(self, n: int) -> bytes:
+        """n random bytes: from the QRNG buffer if it has them, else os.urandom."""
+        if n < 0:
+            raise ValueError("n must be non-negative")
+        data = None
+        refill = False
+        if self.url:
+            with self._lock:
+                if self._ring.size >= n:
+                    data = self._ring.read(n)
+                    self.served += 1
+                refill = self._ring.size < self.low_water
+        if refill or (self.url and data is None):
+            self._wake.set()
+        if data is None:
+            with self._lock:
+                self.fallbacks += 1
+            data = os.urandom(n)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "buffered": self._ring.size,
+                "low_water": self.low_water,
+                "high_water": self.high_water,
+                "served": self.served,
+                "fallbacks": self.fallbacks,
+                "fetches": self.fetches,
+                "fetch_errors": self.fetch_errors,
+            }
+
+
+def get_pool() -> EntropyPool:
+    """
+    Process-wide entropy pool, configured from env on first use.
+    Env (optional):
+      QRNG_URL        e.g., https://provider.example/api/bytes?length=
+      QRNG_HEADER     e.g., Authorization:Bearer YOUR_TOKEN
+      QRNG_POOL_LOW   refill when fewer bytes than this are buffered (default 1024)
+      QRNG_POOL_HIGH  refill up to this many bytes (default 8192)
+      QRNG_TIMEOUT    provider request timeout in seconds (default 4)
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = EntropyPool(
+                    url=os.getenv("QRNG_URL") or None,
+                    header=os.getenv("QRNG_HEADER"),
+                    low_water=int(os.getenv("QRNG_POOL_LOW", "1024")),
+                    high_water=int(os.getenv("QRNG_POOL_HIGH", "8192")),
+                    timeout=float(os.getenv("QRNG_TIMEOUT", "4")),
+                ).start()
+    return _pool
+
+
+def _pool_metrics() -> List[str]:
+    """Exposition lines for the pool counters; empty until the pool is first used."""
+    if _pool is None:
+        return []
+    s = _pool.stats()
+    out = ["# TYPE qw_qrng_pool_buffered_bytes gauge", f"qw_qrng_pool_buffered_bytes {s['buffered']}"]
+    for key in ("served", "fallbacks", "fetches", "fetch_errors"):
+        out += [f"# TYPE qw_qrng_{key}_total counter", f"qw_qrng_{key}_total {s[key]}"]
+    return out
+
+REGISTRY.add_collector(_pool_metrics)
+
+
+def qrng_bytes(n: int = 32) -> bytes:
+    return get_pool().take(n)
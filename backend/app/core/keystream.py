@@ -0,0 +1,87 @@
+"""
+Continuous blockwise BB84 key generation.
+
+bb84_key_stream runs the toy BB84 flow of simulate_bb84 (rng_version 2) in
+blocks of block_bits pulses, reading every lane of the version-2 bit stream
+sequentially across blocks, so block k continues exactly where block k-1
+stopped. Sifted bits that agree after error estimation are appended to a
+residue buffer; every key_bits of residue become one 32-byte key
+
+  key_i = HKDF(residue bits, salt = b"bb84-stream-v1" || uint64_be(i))
+
+and the remainder carries over to the next block. Blocks whose QBER exceeds
+max_qber are discarded entirely (their bits never reach the residue), as a
+real link would abort on a suspected eavesdropper.
+
+Memory is bounded by one block plus less than one key of residue, whatever
+the number of keys produced; the first keys are available after the first
+block. The first block draws the same bits as
+simulate_bb84(seed, n_bits=block_bits, rng_version=2).
+"""
+import struct
+from typing import Any, Dict, Iterator, Optional
+
+from app.core.bb84_sim import LANE_A_BASES, LANE_B_BASES, LANE_BITS, LANE_EVE, LANE_NOISE, _hkdf_from_bits
+from app.core.bitstream import BitStream
+from app.core.bitvec import BitVector
+from app.core.metrics import stages
+
+SALT = b"bb84-stream-v1"
+DEFAULT_MAX_QBER = 0.11  # BB84 (one-way post-processing) security threshold
+
+
+def bb84_key_stream(
+    seed_bytes: bytes,
+    block_bits: int = 4096,
+    key_bits: int = 256,
+    max_keys: Optional[int] = None,
+    max_blocks: Optional[int] = None,
+    eavesdrop: bool = False,
+    flip_prob: float = 0.02,
+    max_qber: float = DEFAULT_MAX_QBER,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yields one dict per block:
+      {block, kept, qber, accepted, residue_bits, keys: [(index, 32-byte key), ...]}
+    Stops after max_keys keys or max_blocks blocks, whichever comes first
+    (never, if both are None).
+    """
+    if block_bits < 8 or key_bits < 1:
+        raise ValueError("block_bits must be >= 8 and key_bits >= 1")
+    photons = BitStream(seed_bytes, LANE_BITS)
+    a_bases = BitStream(seed_bytes, LANE_A_BASES)
+    b_bases = BitStream(seed_bytes, LANE_B_BASES)
+    noise = BitStream(seed_bytes, LANE_NOISE)
+    eve = BitStream(seed_bytes, LANE_EVE) if eavesdrop else None
+
+    residue = bytearray()  # 0/1 bytes, < key_bits + one block long
+    emitted = 0
+    block = 0
+    while (max_keys is None or emitted < max_keys) and (max_blocks is None or block < max_blocks):
+        lap = stages("bb84", "stream")
+        matched = ~(a_bases.bits(block_bits) ^ b_bases.bits(block_bits))
+        alice_kept = photons.bits(block_bits).compress(matched)
+        flips = noise.bernoulli(len(alice_kept), flip_prob)
+        if eve is not None:
+            flips ^= eve.bernoulli(len(alice_kept), 0.10)
+        lap("bits")
+
+        kept = len(alice_kept)
+        qber = flips.popcount() / kept if kept else 0.0
+        accepted = qber <= max_qber
+        if accepted:
+            # bob_kept = alice_kept ^ flips; keep the positions where they agree
+            residue += alice_kept.compress(~flips).to_01()
+        lap("sift")
+
+        keys = []
+        while len(residue) >= key_bits and (max_keys is None or emitted < max_keys):
+            bits = BitVector.from_01(residue[:key_bits])
+            del residue[:key_bits]
+            keys.append((emitted, _hkdf_from_bits(bits, salt=SALT + struct.pack(">Q", emitted))))
+            emitted += 1
+        lap("hkdf")
+
+        yield {"block": block, "kept": kept, "qber": qber, "accepted": accepted,
+               "residue_bits": len(residue), "keys": keys}
+        block += 1
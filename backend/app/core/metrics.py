@@ -0,0 +1,174 @@
+"""
+Minimal in-process metrics with Prometheus text exposition (GET /metrics).
+
+Histograms keep per-bucket counts (cumulated only when rendered), so an
+observation is a bisect plus three adds under a lock, about a microsecond.
+Label values must come from small fixed sets (route templates, stage names),
+never from raw paths or ids.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# seconds; covers sub-millisecond simulator stages up to slow upstream calls
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def time(self, *labels: str) -> "_Timer":
+        return _Timer(self, labels)
+
+    def collect(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v)) for k, v in self._series.items()]
+        for labels, s in sorted(series):
+            acc = 0
+            for bound, n in zip(self.buckets + (float("inf"),), s):
+                acc += n
+                le = 'le="%s"' % _num(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(s[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {s[-1]}")
+        return out
+
+
+class _Timer:
+    __slots__ = ("_h", "_labels", "_t")
+
+    def __init__(self, h: Histogram, labels: Tuple[str, ...]):
+        self._h, self._labels = h, labels
+
+    def __enter__(self):
+        self._t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._h.observe(time.perf_counter() - self._t, *self._labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        h = Histogram(*args, **kwargs)
+        self._metrics.append(h)
+        return h
+
+    def add_collector(self, fn: Callable[[], Iterable[str]]) -> None:
+        """fn returns ready-made exposition lines (for values owned elsewhere, e.g. pool stats)."""
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines += m.collect()
+        for fn in self._collectors:
+            lines += fn()
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_SECONDS = REGISTRY.histogram(
+    "qw_http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"))
+SIM_STAGE_SECONDS = REGISTRY.histogram(
+    "qw_sim_stage_seconds", "QKD simulator time per stage (bits: draws + basis sifting, "
+    "sift: error estimation and key sifting, hkdf: key derivation).", ("mode", "engine", "stage"))
+QRNG_FETCH_SECONDS = REGISTRY.histogram(
+    "qw_qrng_fetch_seconds", "QRNG provider request latency.", ("outcome",))
+STORE_SECONDS = REGISTRY.histogram(
+    "qw_store_seconds", "Message store call latency.", ("backend", "op"))
+
+
+_stage_listener: Optional[Callable[[str, str, str], None]] = None
+
+
+def set_stage_listener(fn: Optional[Callable[[str, str, str], None]]) -> None:
+    """fn(mode, engine, stage) is called after every finished stage (job progress)."""
+    global _stage_listener
+    _stage_listener = fn
+
+
+def stages(mode: str, engine: str) -> Callable[[str], None]:
+    """
+    lap = stages("bb84", "python"); ...; lap("bits"); ...; lap("hkdf")
+    Each call records the time since the previous one under that stage.
+    """
+    last = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal last
+        now = time.perf_counter()
+        SIM_STAGE_SECONDS.observe(now - last, mode, engine, stage)
+        last = now
+        if _stage_listener is not None:
+            _stage_listener(mode, engine, stage)
+
+    return lap
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: per-route latency until the last body chunk is sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            HTTP_SECONDS.observe(time.perf_counter() - start, scope["method"], path, str(status[0]))
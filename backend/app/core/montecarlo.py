@@ -0,0 +1,215 @@
+"""
+Multi-trial Monte Carlo statistics for the QKD simulators.
+
+Trial i runs with child seed HMAC-SHA256(master_seed, b"qw-trial" || uint64_be(i)),
+so trials are independent and addressable without running the ones before.
+Trials are grouped into fixed chunks of CHUNK; each chunk is reduced to a
+RunningStats summary (count, mean, M2, min, max, sparse histogram) wherever it
+runs, and summaries are merged strictly in chunk order. Per-trial results are
+never kept, and the output is bit-identical for any worker count.
+
+Quantiles come from a fixed histogram over [0, 1] (all tracked metrics are
+fractions) with BINS buckets, i.e. they are exact to 1/BINS.
+
+engine="analytic" (decoy mode only) samples each trial's counts directly
+with simulate_bb84_decoy_counts, so a trial costs the same for any n_bits.
+"""
+import hashlib
+import hmac
+import math
+import multiprocessing as mp
+import os
+import struct
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from app.core.bb84_sim import _h2, simulate_bb84_decoy_counts, simulate_qkd
+
+CHUNK = 32
+BINS = 10000
+METRICS = ("qber", "kept_fraction", "secure_key_rate_toy")
+DEFAULT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+_Z95 = 1.959963984540054
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def child_seed(master_seed: bytes, index: int) -> bytes:
+    return hmac.new(master_seed, b"qw-trial" + struct.pack(">Q", index), hashlib.sha256).digest()
+
+
+class RunningStats:
+    """Mergeable streaming summary of values in [0, 1] (Welford / Chan et al.)."""
+
+    __slots__ = ("n", "mean", "m2", "min", "max", "hist")
+
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.hist: Dict[int, int] = {}
+
+    def add(self, x: float) -> None:
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        self.min = min(self.min, x)
+        self.max = max(self.max, x)
+        b = min(BINS - 1, max(0, int(x * BINS)))
+        self.hist[b] = self.hist.get(b, 0) + 1
+
+    def merge(self, other: "RunningStats") -> None:
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        d = other.mean - self.mean
+        self.mean += d * other.n / n
+        self.m2 += other.m2 + d * d * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        for b, c in other.hist.items():
+            self.hist[b] = self.hist.get(b, 0) + c
+
+    def quantile(self, q: float) -> float:
+        """Midpoint of the bin holding the q-quantile."""
+        if self.n == 0:
+            return math.nan
+        rank = q * (self.n - 1)
+        seen = 0
+        for b in sorted(self.hist):
+            seen += self.hist[b]
+            if seen > rank:
+                return min(self.max, max(self.min, (b + 0.5) / BINS))
+        return self.max
+
+    def summary(self, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+        var = self.m2 / (self.n - 1) if self.n > 1 else 0.0
+        half = _Z95 * math.sqrt(var / self.n) if self.n else math.nan
+        return {
+            "n": self.n,
+            "mean": self.mean,
+            "variance": var,
+            "std": math.sqrt(var),
+            "min": self.min,
+            "max": self.max,
+            "ci95": [self.mean - half, self.mean + half],
+            "quantiles": {str(q): self.quantile(q) for q in quantiles},
+        }
+
+    # compact form for crossing process boundaries
+    def __getstate__(self):
+        return (self.n, self.mean, self.m2, self.min, self.max, self.hist)
+
+    def __setstate__(self, state):
+        self.n, self.mean, self.m2, self.min, self.max, self.hist = state
+
+
+def _trial_metrics(stats: Dict[str, Any]) -> Dict[str, float]:
+    n = stats["n_bits"]
+    kept_frac = stats["kept"] / n if n else 0.0
+    rate = stats.get("decoy", {}).get("secure_key_rate_toy")
+    if rate is None:
+        # same toy estimate as the decoy simulator: s * (1 - H2(q)) - leaked / n
+        leaked = stats.get("reconciliation", {}).get("leaked_bits", 0)
+        rate = max(0.0, kept_frac * (1.0 - _h2(min(stats["qber"], 0.49))) - (leaked / n if n else 0.0))
+    return {"qber": stats["qber"], "kept_fraction": kept_frac, "secure_key_rate_toy": rate}
+
+
+def _trial(seed: bytes, params: Dict[str, Any]) -> Dict[str, Any]:
+    if params.get("engine") == "analytic":
+        kw = {k: v for k, v in params.items() if k not in ("mode", "engine", "rng_version")}
+        return simulate_bb84_decoy_counts(seed, **kw)
+    return simulate_qkd(seed, **params)[1]
+
+
+def run_chunk(master_seed: bytes, start: int, count: int, params: Dict[str, Any]) -> Dict[str, RunningStats]:
+    """Trials start..start+count-1 reduced to one RunningStats per metric."""
+    acc = {m: RunningStats() for m in METRICS}
+    for i in range(start, start + count):
+        for m, v in _trial_metrics(_trial(child_seed(master_seed, i), params)).items():
+            acc[m].add(v)
+    return acc
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+            _pool_workers = workers
+        return _pool
+
+
+def _chunks(trials: int) -> Iterable[tuple]:
+    for idx, start in enumerate(range(0, trials, CHUNK)):
+        yield idx, start, min(CHUNK, trials - start)
+
+
+def run_trials(
+    master_seed: bytes,
+    trials: int,
+    workers: Optional[int] = None,
+    quantiles: Sequence[float] = DEFAULT_QUANTILES,
+    **params,
+) -> Dict[str, Any]:
+    """
+    Run `trials` independent simulate_qkd(child_seed(master_seed, i), **params)
+    calls and summarize qber, kept_fraction and secure_key_rate_toy.
+    workers: processes to use (default cpu_count; 1 runs in-process).
+    """
+    if trials < 1:
+        raise ValueError("trials must be >= 1")
+    if params.get("engine") == "analytic":
+        if params.get("mode") != "decoy":
+            raise ValueError('engine "analytic" is only available for mode "decoy"')
+        if params.get("reconcile"):
+            raise ValueError('engine "analytic" has no bits to reconcile')
+    workers = workers or os.cpu_count() or 1
+    total = {m: RunningStats() for m in METRICS}
+
+    if workers == 1 or trials <= CHUNK:
+        for _, start, count in _chunks(trials):
+            for m, s in run_chunk(master_seed, start, count, params).items():
+                total[m].merge(s)
+    else:
+        pool = _get_pool(workers)
+        todo = iter(_chunks(trials))
+        in_flight = {}
+        done: Dict[int, Dict[str, RunningStats]] = {}  # finished out of order, waiting for their turn
+        next_merge = 0
+
+        def submit_one() -> bool:
+            item = next(todo, None)
+            if item is None:
+                return False
+            idx, start, count = item
+            in_flight[pool.submit(run_chunk, master_seed, start, count, params)] = idx
+            return True
+
+        while len(in_flight) < 2 * workers and submit_one():
+            pass
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                done[in_flight.pop(fut)] = fut.result()
+                submit_one()
+            while next_merge in done:
+                for m, s in done.pop(next_merge).items():
+                    total[m].merge(s)
+                next_merge += 1
+
+    return {
+        "trials": trials,
+        "chunk": CHUNK,
+        "params": params,
+        "stats": {m: total[m].summary(quantiles) for m in METRICS},
+    }
@@ -0,0 +1,68 @@
+"""
+Toeplitz-hash privacy amplification for the toy QKD simulators.
+
+The HKDF path squeezes any number of sifted bits into 32 bytes. This mode
+instead outputs as many bits as the toy leakage estimate allows:
+
+  m = n * (1 - H2(q)) - leak_EC - 2 * log2(1 / eps)     (rounded down to bytes)
+
+where leak_EC is the parity bits Cascade actually disclosed (when the run was
+reconciled) or EC_EFFICIENCY * n * H2(q) otherwise. The key is T x over
+GF(2), T the m x n Toeplitz matrix defined by n + m - 1 public bits read from
+lane LANE_TOEPLITZ of the version-2 bit stream, so it is the same for either
+engine and rng_version.
+
+T x is the middle of the convolution of the Toeplitz diagonal with x, taken
+mod 2 and computed with one real FFT (O((n + m) log(n + m)) instead of
+O(n * m)). Sums stay below n, so float64 rounding is exact well past 1M bits.
+"""
+import math
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.bb84_sim import LANE_TOEPLITZ, _h2
+from app.core.bitstream import BitStream
+
+EC_EFFICIENCY = 1.16  # Cascade leakage / Shannon bound, as measured by cascade.reconcile
+EPS_PA = 1e-10
+
+
+def output_bits(n: int, qber: float, leaked_bits: Optional[int] = None, eps: float = EPS_PA) -> int:
+    """Toy secure length m for n input bits, a multiple of 8 (0 if nothing is left)."""
+    h = _h2(min(qber, 0.5))
+    if leaked_bits is None:
+        leaked_bits = math.ceil(EC_EFFICIENCY * n * h)
+    m = math.floor(n * (1.0 - h) - leaked_bits - 2 * math.log2(1 / eps))
+    return max(0, m) // 8 * 8
+
+
+def toeplitz_hash(bits: np.ndarray, diagonal: np.ndarray, m: int) -> np.ndarray:
+    """
+    y = T x (mod 2) for the m x n Toeplitz matrix T[i, j] = diagonal[i - j + n - 1].
+    bits: n 0/1 values; diagonal: n + m - 1 0/1 values. Returns m uint8 0/1 values.
+    """
+    n = bits.size
+    if m == 0 or n == 0:
+        return np.zeros(m, dtype=np.uint8)
+    size = 1 << (n + m - 2).bit_length()  # >= len(diagonal) + n - 1
+    conv = np.fft.irfft(np.fft.rfft(diagonal, size) * np.fft.rfft(bits, size), size)
+    return (np.rint(conv[n - 1:n - 1 + m]).astype(np.int64) & 1).astype(np.uint8)
+
+
+def amplify(bits: np.ndarray, qber: float, seed_bytes: bytes,
+            leaked_bits: Optional[int] = None) -> Tuple[bytes, Dict[str, Any]]:
+    """
+    bits: reconciled key bits as uint8 0/1. RETURNS: (key bytes, info)
+      info: {method, input_bits, output_bits, leak_ec, eps}
+    """
+    n = int(bits.size)
+    leak = math.ceil(EC_EFFICIENCY * n * _h2(min(qber, 0.5))) if leaked_bits is None else leaked_bits
+    m = output_bits(n, qber, leak)
+    key = b""
+    if m:
+        diag = BitStream(seed_bytes, LANE_TOEPLITZ).bits(n + m - 1)
+        diag_bits = np.unpackbits(np.frombuffer(diag.to_bytes(), dtype=np.uint8), count=n + m - 1)
+        key = np.packbits(toeplitz_hash(bits, diag_bits, m)).tobytes()
+    info = {"method": "toeplitz", "input_bits": n, "output_bits": m, "leak_ec": leak, "eps": EPS_PA}
+    return key, info
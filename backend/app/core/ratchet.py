@@ -0,0 +1,103 @@
+"""
+Symmetric KDF-chain ratchet over a chat's session key.
+
+  CK_0      = HKDF-Extract(salt=b"qw-ratchet-v1", base_key)
+  CK_{e+1}  = HMAC-SHA256(CK_e, 0x02)
+  MK_e      = HMAC-SHA256(CK_e, 0x01)      (32-byte key of epoch e)
+
+Clients holding the same base key (the /simulate_bb84 key for the chat seed)
+can derive the same chain themselves. Walking the chain costs one HMAC per
+epoch, so the Ratchet keeps:
+
+  - a checkpoint (CK) every `checkpoint_every` epochs up to the furthest epoch
+    derived so far; any epoch at or below it is at most checkpoint_every - 1
+    steps from the checkpoint found by bisect, never a walk from epoch 0;
+  - the `recent` most recently used message keys, for O(1) repeat lookups.
+
+Checkpoints are recorded while the chain advances, so the first request for
+a far epoch pays for the walk once and every later one is bounded.
+"""
+import hashlib
+import hmac
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import List
+
+SALT = b"qw-ratchet-v1"
+_CHAIN = b"\x02"
+_MESSAGE = b"\x01"
+_KEY_BYTES = 32
+_ENTRY_OVERHEAD = 96  # per cached key or checkpoint: dict/list slot, int, bytes header
+
+
+def _step(ck: bytes) -> bytes:
+    return hmac.new(ck, _CHAIN, hashlib.sha256).digest()
+
+
+def _message_key(ck: bytes) -> bytes:
+    return hmac.new(ck, _MESSAGE, hashlib.sha256).digest()
+
+
+class Ratchet:
+    def __init__(self, base_key: bytes, checkpoint_every: int = 256, recent: int = 128):
+        if checkpoint_every < 1:
+            raise ValueError("checkpoint_every must be >= 1")
+        self.checkpoint_every = checkpoint_every
+        self.recent = recent
+        ck0 = hmac.new(SALT, base_key, hashlib.sha256).digest()
+        self._cp_epochs: List[int] = [0]
+        self._cp_keys: List[bytes] = [ck0]
+        self._head = 0          # furthest epoch whose chain key has been derived
+        self._head_ck = ck0
+        self._keys: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.steps = 0          # HMAC chain steps taken, for stats and tests
+
+    def _advance(self, epoch: int) -> bytes:
+        # called with self._lock held; epoch > self._head
+        e, ck = self._head, self._head_ck
+        every = self.checkpoint_every
+        while e < epoch:
+            ck = _step(ck)
+            e += 1
+            if e % every == 0:
+                self._cp_epochs.append(e)
+                self._cp_keys.append(ck)
+        self.steps += epoch - self._head
+        self._head, self._head_ck = e, ck
+        return ck
+
+    def _chain_key(self, epoch: int) -> bytes:
+        if epoch >= self._head:
+            return self._advance(epoch) if epoch > self._head else self._head_ck
+        i = bisect_right(self._cp_epochs, epoch) - 1
+        e, ck = self._cp_epochs[i], self._cp_keys[i]
+        self.steps += epoch - e
+        while e < epoch:
+            ck = _step(ck)
+            e += 1
+        return ck
+
+    def key(self, epoch: int) -> bytes:
+        """MK_epoch."""
+        if epoch < 0:
+            raise ValueError("epoch must be >= 0")
+        with self._lock:
+            mk = self._keys.get(epoch)
+            if mk is not None:
+                self._keys.move_to_end(epoch)
+                return mk
+            mk = _message_key(self._chain_key(epoch))
+            self._keys[epoch] = mk
+            if len(self._keys) > self.recent:
+                self._keys.popitem(last=False)
+            return mk
+
+    @property
+    def head(self) -> int:
+        return self._head
+
+    def nbytes(self) -> int:
+        """Approximate memory held: checkpoints plus cached message keys."""
+        return (len(self._cp_keys) + len(self._keys) + 1) * (_KEY_BYTES + _ENTRY_OVERHEAD)
@@ -1,12 +1,18 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from typing import Optional
 from dotenv import load_dotenv
 import os
 
 from app.api.qrng import router as qrng_router
 from app.api.qkd import router as qkd_router
 from app.api.wrap import router as wrap_router
-from app.api.messages import router as messages_router
+from app.api.jobs import router as jobs_router
+from app.core.admission import AdmissionMiddleware
+from app.core.metrics import REGISTRY, MetricsMiddleware
+from app.core import profiling
+from app.services.firestore import enabled as messages_enabled
 
 load_dotenv()  # loads backend/.env if present
 
@@ -16,6 +22,8 @@ app = FastAPI(title="Quantum Chat Backend", version="1.0.0")
 frontend_origin = os.getenv("FRONTEND_ORIGIN", "*")
 allow_origins = [o.strip() for o in frontend_origin.split(",")] if frontend_origin else ["*"]
 
+# innermost: shed simulations (429/503) still get CORS headers; other routes pass straight through
+app.add_middleware(AdmissionMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allow_origins,
@@ -23,16 +31,51 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(profiling.ProfilingMiddleware)  # no-op unless PROFILE_TOKEN / PROFILE_SAMPLE_RATE set
+app.add_middleware(MetricsMiddleware)  # outermost: latency includes CORS handling
 
+# async: answered on the event loop, never queued behind simulations in the threadpool
 @app.get("/")
-def root():
+async def root():
     return {"ok": True}
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus text format: per-route latency, simulator stages, QRNG and store timings."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def _profile_admin(token: Optional[str]):
+    if not profiling.check_token(token):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/debug/profiles", include_in_schema=False)
+def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    _profile_admin(x_profile_token)
+    return profiling.get_store().list()
+
+@app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+def get_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """Collapsed stacks ("frame;frame weight" per line), ready for flamegraph.pl or speedscope."""
+    _profile_admin(x_profile_token)
+    s = profiling.get_store().get(profile_id)
+    if s is None:
+        raise HTTPException(status_code=404, detail="Unknown profile id")
+    return PlainTextResponse(s.collapsed(), headers={"X-Profile-Mode": s.mode})
+
 app.include_router(qrng_router)
 app.include_router(qkd_router)
 app.include_router(wrap_router)      # optional envelope encryption
-app.include_router(messages_router)  # optional server-side messages
+app.include_router(jobs_router)      # large simulations on worker processes
+
+# Optional server-side messages and per-chat ratchet keys: only mounted (and
+# their store, hub and realtime code only imported) when STORAGE_BACKEND is
+# local or FIREBASE_SERVER_WRITES=true; see services/firestore.enabled.
+if messages_enabled():
+    from app.api.messages import router as messages_router
+    from app.api.keys import router as keys_router
+    app.include_router(messages_router)
+    app.include_router(keys_router)
@@ -1,11 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
+
+MAX_BATCH = 1000  # items per /wrap_key/batch or /unwrap_key/batch request
+MAX_BULK = 5000   # messages per /messages/bulk request
 
 class BB84Out(BaseModel):
     base64_key: str
     qber: float
     kept: int
     discarded: int
+    privacy_amplification: Optional[Dict[str, Any]] = None  # privacy=toeplitz only
 
 class WrapRequest(BaseModel):
     wrap_key_b64: str = Field(..., description="AES-256-GCM key material (raw) in base64")
@@ -26,6 +30,87 @@ class MessageIn(BaseModel):
 class MessageOut(MessageIn):
     message_id: str
 
+class MessageBulkIn(BaseModel):
+    messages: List[MessageIn] = Field(..., min_length=1, max_length=MAX_BULK)
+
+class MessageBulkResult(BaseModel):
+    message_id: Optional[str] = None
+    error: Optional[str] = None
+
+class MessageBulkOut(BaseModel):
+    results: List[MessageBulkResult]  # same order as the request
+
 class ChatCreate(BaseModel):
     members: List[str]
     q_seed_b64: str
+
+class WrapItem(BaseModel):
+    wrap_key_b64: Optional[str] = None  # falls back to the batch-level key
+    plaintext_b64: str
+    iv_b64: Optional[str] = None
+
+class WrapBatchRequest(BaseModel):
+    wrap_key_b64: Optional[str] = Field(None, description="shared AES-GCM key for items without their own")
+    items: List[WrapItem] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+class WrapBatchResponse(BaseModel):
+    # parallel arrays, one entry per request item, in order
+    iv_b64: List[str]
+    ct_b64: List[str]
+    tag_included: bool = True
+
+class UnwrapItem(BaseModel):
+    wrap_key_b64: Optional[str] = None
+    iv_b64: str
+    ct_b64: str
+
+class UnwrapBatchRequest(BaseModel):
+    wrap_key_b64: Optional[str] = None
+    items: List[UnwrapItem] = Field(..., min_length=1, max_length=MAX_BATCH)
+
+class UnwrapBatchResponse(BaseModel):
+    plaintext_b64: List[Optional[str]]  # None where authentication failed
+    failed: List[int]                   # indexes of those items
+
+class JobSimulateIn(BaseModel):
+    seed_b64: str
+    n_bits: int = Field(2048, ge=128, description="upper bound set by JOBS_MAX_BITS")
+    mode: str = Field("bb84", pattern="^(bb84|decoy|mdi)$")
+    engine: str = Field("python", pattern="^(python|numpy)$")
+    rng_version: int = Field(1, ge=1, le=2)
+    eavesdrop: bool = False  # bb84 only
+    flip_prob: Optional[float] = Field(None, ge=0.0, le=1.0)
+
+class JobOut(BaseModel):
+    job_id: str
+    state: str                 # queued | running | cancelling | cancelled | done | failed
+    stage: Optional[str] = None
+    progress: float = 0.0
+    params: dict = {}
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[dict] = None  # {"base64_key", "stats"} once done
+    error: Optional[str] = None
+
+class MonteCarloIn(BaseModel):
+    seed_b64: str = Field(..., description="master seed; trial i uses HMAC(seed, i)")
+    trials: int = Field(1000, ge=1, le=1_000_000)
+    n_bits: int = Field(2048, ge=128, le=65536)
+    mode: str = Field("bb84", pattern="^(bb84|decoy|mdi)$")
+    engine: str = Field("python", pattern="^(python|numpy|analytic)$")  # analytic: decoy only
+    rng_version: int = Field(1, ge=1, le=2)
+    eavesdrop: bool = False  # bb84 only
+    flip_prob: Optional[float] = Field(None, ge=0.0, le=1.0)
+    reconcile: Optional[str] = Field(None, pattern="^cascade$")
+    quantiles: List[float] = Field([0.05, 0.25, 0.5, 0.75, 0.95], max_length=20)
+
+class ChatKey(BaseModel):
+    epoch: int
+    base64_key: str
+
+class ChatKeysOut(BaseModel):
+    chat_id: str
+    epoch: int
+    messages_per_epoch: Optional[int] = None  # set when the epoch came from message_index
+    keys: List[ChatKey]
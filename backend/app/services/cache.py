@@ -0,0 +1,205 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+# Per-entry bookkeeping (OrderedDict node, key, timestamps) charged against the budget.
+_ENTRY_OVERHEAD = 128
+
+_sim_cache = None
+
+
+def cache_key(*parts) -> str:
+    """Stable hex key over the given inputs (bytes are hashed raw, others via repr)."""
+    h = hashlib.sha256()
+    for p in parts:
+        b = p if isinstance(p, (bytes, bytearray)) else repr(p).encode()
+        h.update(len(b).to_bytes(4, "big"))
+        h.update(b)
+    return h.hexdigest()
+
+
+class FileStore:
+    """
+    Shared backend: one file per key under a directory that every worker can
+    see (e.g. /dev/shm/qwhisper-cache). Writes are atomic (tmp + rename); the
+    file's mtime is its insert time, so the TTL holds across processes.
+    """
+
+    def __init__(self, path: str, max_bytes: int, ttl: float, prune_every: int = 64):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._prune_every = prune_every
+        self._puts = 0
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        fn = self._file(key)
+        try:
+            if time.time() - os.stat(fn).st_mtime > self.ttl:
+                os.unlink(fn)
+                return None
+            with open(fn, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, value: bytes) -> None:
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp, self._file(key))
+        except OSError:
+            return
+        self._puts += 1
+        if self._puts % self._prune_every == 0:
+            self.prune()
+
+    def prune(self) -> int:
+        """Drop expired entries, then oldest until under max_bytes. Returns count removed."""
+        now = time.time()
+        entries = []
+        for e in os.scandir(self.path):
+            if e.name.startswith(".tmp-"):
+                continue
+            try:
+                st = e.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, e.path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, fn in entries:
+            if now - mtime <= self.ttl and total <= self.max_bytes:
+                break
+            try:
+                os.unlink(fn)
+            except OSError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+
+class ResultCache:
+    """
+    In-process LRU cache of serialized results with a byte budget and TTL,
+    optionally backed by a FileStore shared between workers. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 8 << 20,
+        ttl: float = 3600.0,
+        shared: Optional[FileStore] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.shared = shared
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self._bytes = 0
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _size(key: str, value: bytes) -> int:
+        return len(key) + len(value) + _ENTRY_OVERHEAD
+
+    def _drop(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= self._size(key, value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._drop(key)
+                self.expirations += 1
+        value = self.shared.get(key) if self.shared is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.shared_hits += 1
+        self._put_local(key, value)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        self._put_local(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+    def _put_local(self, key: str, value: bytes) -> None:
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (self._clock() + self.ttl, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], bytes]) -> bytes:
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def simulation_cache() -> ResultCache:
+    """
+    Process-wide cache for deterministic simulation results.
+    Env (optional):
+      SIM_CACHE_BYTES  in-process byte budget (default 8 MiB; 0 disables caching)
+      SIM_CACHE_TTL    seconds an entry stays valid (default 3600)
+      SIM_CACHE_DIR    directory for the shared file-backed store (e.g. /dev/shm/qw-sim)
+    """
+    global _sim_cache
+    if _sim_cache is None:
+        max_bytes = int(os.getenv("SIM_CACHE_BYTES", str(8 << 20)))
+        ttl = float(os.getenv("SIM_CACHE_TTL", "3600"))
+        shared_dir = os.getenv("SIM_CACHE_DIR")
+        shared = FileStore(shared_dir, max_bytes=max_bytes, ttl=ttl) if shared_dir and max_bytes > 0 else None
+        _sim_cache = ResultCache(max_bytes=max_bytes, ttl=ttl, shared=shared)
+    return _sim_cache
@@ -1,36 +1,295 @@
+import asyncio
+import base64
+import json
+import logging
 import os
-from typing import Dict, Any, List, Optional
-from google.cloud import firestore
+import weakref
+from datetime import datetime
+from typing import Callable, Dict, Any, Iterator, List, Optional, Set, Tuple
+
+from app.core.metrics import STORE_SECONDS
+from app.services import storage
+from app.services.hub import get_hub
+
+log = logging.getLogger(__name__)
 
 _db = None
+_async_db = None
+_writers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, BatchWriter]" = weakref.WeakKeyDictionary()
+
+MAX_BATCH_OPS = 500  # Firestore limit per batched write
+
+def _firestore():
+    """google.cloud.firestore on first use; grpc and protobuf cost ~0.2 s of startup."""
+    from google.cloud import firestore
+    return firestore
 
 def enabled() -> bool:
-    return os.getenv("FIREBASE_SERVER_WRITES", "false").lower() == "true"
+    """Server-side messages are on with FIREBASE_SERVER_WRITES=true or a local STORAGE_BACKEND."""
+    return storage.backend() != "firestore" or os.getenv("FIREBASE_SERVER_WRITES", "false").lower() == "true"
 
 def get_db():
     global _db
     if _db is None:
-        _db = firestore.Client(project=os.getenv("GCP_PROJECT_ID") or None)
+        _db = _firestore().Client(project=os.getenv("GCP_PROJECT_ID") or None)
     return _db
 
+def get_async_db():
+    global _async_db
+    if _async_db is None:
+        _async_db = _firestore().AsyncClient(project=os.getenv("GCP_PROJECT_ID") or None)
+    return _async_db
+
+def _message_ref(db, chat_id: str):
+    return db.collection("chats").document(chat_id).collection("messages").document()
+
+def _stamped(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Messages without createdAt get the server's commit time, so ordering is total."""
+    if data.get("createdAt") is None:
+        data = {**data, "createdAt": _firestore().SERVER_TIMESTAMP}
+    return data
+
+def _publish(chat_id: str, data: Dict[str, Any], message_id: str, created_at: Optional[datetime]) -> None:
+    """Push a committed message to realtime subscribers (see services/hub.py)."""
+    msg = {**data, "createdAt": created_at, "message_id": message_id,
+           "cursor": encode_cursor(created_at, message_id)}
+    try:
+        get_hub().publish(chat_id, msg)
+    except Exception:
+        # the write is already durable; failing it now would make the client retry and duplicate it
+        log.exception("realtime fan-out failed for message %s in chat %s", message_id, chat_id)
+
+def _publish_stored(chat_id: str, rec: Dict[str, Any]) -> str:
+    _publish(chat_id, {k: v for k, v in rec.items() if k != "message_id"}, rec["message_id"], rec["createdAt"])
+    return rec["message_id"]
+
 def add_message(chat_id: str, data: Dict[str, Any]) -> str:
+    store = storage.get_store()
+    if store is not None:
+        with STORE_SECONDS.time(storage.backend(), "add"):
+            rec = store.add_message(chat_id, data)
+        return _publish_stored(chat_id, rec)
     ref = get_db().collection("chats").document(chat_id).collection("messages").document()
-    ref.set(data)
+    data = _stamped(data)
+    with STORE_SECONDS.time("firestore", "add"):
+        res = ref.set(data)
+    # SERVER_TIMESTAMP resolves to the commit time, which the WriteResult reports
+    _publish(chat_id, data, ref.id, getattr(res, "update_time", None))
     return ref.id
 
-def list_messages(chat_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+# ---------- cursors ----------
+# Opaque to clients: base64url(JSON {"t": createdAt ISO-8601 or null, "id": message_id}).
+# Pages are ordered by (createdAt, document id) so ties never repeat or skip.
+
+def encode_cursor(created_at: Optional[datetime], message_id: str) -> str:
+    raw = json.dumps({"t": created_at.isoformat() if created_at else None, "id": message_id},
+                     separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """Cursor -> Firestore cursor fields; ValueError if malformed."""
+    try:
+        j = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        t = datetime.fromisoformat(j["t"]) if j["t"] else None
+        return {"createdAt": t, "__name__": str(j["id"])}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"invalid cursor: {e}") from None
+
+def _position(cursor: Optional[str]) -> Optional[storage.Cursor]:
+    if not cursor:
+        return None
+    f = decode_cursor(cursor)
+    return f["createdAt"], f["__name__"]
+
+def iter_messages(
+    chat_id: str,
+    limit: Optional[int] = 50,
+    start_after: Optional[str] = None,
+    end_before: Optional[str] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield messages as q.stream() produces them (constant memory).
+    start_after pages forward in createdAt order; end_before pages backward
+    and yields newest-first. Each item carries its own "cursor".
+    """
+    if start_after and end_before:
+        raise ValueError("use start_after or end_before, not both")
+    store = storage.get_store()
+    if store is not None:
+        for x in store.iter_messages(chat_id, limit, after=_position(start_after), before=_position(end_before)):
+            x["cursor"] = encode_cursor(x["createdAt"], x["message_id"])
+            yield x
+        return
+    backward = end_before is not None
+    Query = _firestore().Query
+    direction = Query.DESCENDING if backward else Query.ASCENDING
     q = (get_db()
          .collection("chats").document(chat_id)
-         .collection("messages").order_by("createdAt").limit(limit))
-    docs = q.stream()
-    out = []
-    for d in docs:
+         .collection("messages")
+         .order_by("createdAt", direction=direction)
+         .order_by("__name__", direction=direction))
+    cursor = end_before if backward else start_after
+    if cursor:
+        q = q.start_after(decode_cursor(cursor))
+    if limit:
+        q = q.limit(limit)
+    for d in q.stream():
         x = d.to_dict()
         x["message_id"] = d.id
-        out.append(x)
+        x["cursor"] = encode_cursor(x.get("createdAt"), d.id)
+        yield x
+
+def list_messages(
+    chat_id: str,
+    limit: int = 50,
+    start_after: Optional[str] = None,
+    end_before: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """One page in ascending createdAt order (backward pages are re-reversed)."""
+    with STORE_SECONDS.time(storage.backend(), "list"):
+        out = list(iter_messages(chat_id, limit, start_after, end_before))
+    if end_before is not None:
+        out.reverse()
     return out
 
 def create_chat(members: List[str], q_seed_b64: str) -> str:
+    store = storage.get_store()
+    if store is not None:
+        with STORE_SECONDS.time(storage.backend(), "create_chat"):
+            return store.create_chat(members, q_seed_b64)
     ref = get_db().collection("chats").document()
-    ref.set({"members": members, "q_seed_b64": q_seed_b64, "createdAt": firestore.SERVER_TIMESTAMP})
+    with STORE_SECONDS.time("firestore", "create_chat"):
+        ref.set({"members": members, "q_seed_b64": q_seed_b64, "createdAt": _firestore().SERVER_TIMESTAMP})
     return ref.id
+
+def get_chat(chat_id: str) -> Optional[Dict[str, Any]]:
+    """The chat document ({members, q_seed_b64, createdAt}) or None."""
+    store = storage.get_store()
+    if store is not None:
+        with STORE_SECONDS.time(storage.backend(), "get_chat"):
+            return store.get_chat(chat_id)
+    with STORE_SECONDS.time("firestore", "get_chat"):
+        snap = get_db().collection("chats").document(chat_id).get()
+    return snap.to_dict() if snap.exists else None
+
+
+class BatchWriter:
+    """
+    Coalesces message writes into Firestore batched commits (async client).
+    Writes queue up until max_ops are pending or max_delay seconds have passed
+    since the first one, then go out as one batch; each caller gets its own
+    result. A failed commit fails every write in that batch.
+    db_factory may return the real AsyncClient, an emulator-backed one
+    (FIRESTORE_EMULATOR_HOST) or an in-memory fake with the same shape.
+    """
+
+    def __init__(self, db_factory: Callable[[], Any] = get_async_db,
+                 max_ops: int = MAX_BATCH_OPS, max_delay: float = 0.01):
+        self._db_factory = db_factory
+        self.max_ops = min(max_ops, MAX_BATCH_OPS)
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, Any, Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.commits = 0
+
+    def _enqueue(self, chat_id: str, data: Dict[str, Any]) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((chat_id, _message_ref(self._db_factory(), chat_id), _stamped(data), fut))
+        if len(self._pending) >= self.max_ops:
+            self._schedule(loop, now=True)
+        elif self._timer is None:
+            self._schedule(loop, now=False)
+        return fut
+
+    def _schedule(self, loop: asyncio.AbstractEventLoop, now: bool) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if now:
+            self._spawn(loop)
+        else:
+            self._timer = loop.call_later(self.max_delay, self._spawn, loop)
+
+    def _spawn(self, loop: asyncio.AbstractEventLoop) -> None:
+        # the loop only keeps weak references to tasks; hold flushes until they finish
+        task = loop.create_task(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self) -> None:
+        ops, self._pending = self._pending[: self.max_ops], self._pending[self.max_ops:]
+        if self._pending:
+            self._schedule(asyncio.get_running_loop(), now=len(self._pending) >= self.max_ops)
+        else:
+            self._timer = None
+        if not ops:
+            return
+        try:
+            await self._commit(ops)
+        except Exception as e:
+            # whatever broke before the commit returned, no caller is left waiting
+            for *_, fut in ops:
+                if not fut.done():
+                    fut.set_exception(e)
+        except asyncio.CancelledError:
+            for *_, fut in ops:
+                fut.cancel()
+            raise
+
+    async def _commit(self, ops: List[Tuple[str, Any, Dict[str, Any], asyncio.Future]]) -> None:
+        batch = self._db_factory().batch()
+        for _, ref, data, _ in ops:
+            batch.set(ref, data)
+        with STORE_SECONDS.time("firestore", "batch_commit"):
+            results = await batch.commit()
+        self.commits += 1
+        times = [getattr(r, "update_time", None) for r in results] if results else [None] * len(ops)
+        for _, ref, _, fut in ops:
+            if not fut.done():
+                fut.set_result(ref.id)
+        for (chat_id, ref, data, _), t in zip(ops, times):
+            _publish(chat_id, data, ref.id, t)
+
+    async def add(self, chat_id: str, data: Dict[str, Any]) -> str:
+        return await self._enqueue(chat_id, data)
+
+    async def add_many(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Per-item results: {"message_id": id} or {"error": message}."""
+        futs = [self._enqueue(chat_id, data) for chat_id, data in items]
+        out = []
+        for r in await asyncio.gather(*futs, return_exceptions=True):
+            out.append({"error": str(r) or type(r).__name__} if isinstance(r, Exception) else {"message_id": r})
+        return out
+
+
+def get_writer() -> BatchWriter:
+    """One writer per event loop (futures and timers are loop-bound)."""
+    loop = asyncio.get_running_loop()
+    w = _writers.get(loop)
+    if w is None:
+        w = _writers[loop] = BatchWriter()
+    return w
+
+async def _local_call(store, op: str, fn, *args):
+    # SQLite blocks on disk I/O; keep it off the event loop
+    with STORE_SECONDS.time(storage.backend(), op):
+        return await asyncio.to_thread(fn, *args) if store.blocking else fn(*args)
+
+async def add_message_async(chat_id: str, data: Dict[str, Any]) -> str:
+    store = storage.get_store()
+    if store is not None:
+        return _publish_stored(chat_id, await _local_call(store, "add", store.add_message, chat_id, data))
+    return await get_writer().add(chat_id, data)
+
+async def add_messages_bulk(items: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    store = storage.get_store()
+    if store is not None:
+        # one transaction: all items land or none do
+        try:
+            recs = await _local_call(store, "add_batch", store.add_messages, items)
+        except Exception as e:
+            return [{"error": str(e) or type(e).__name__}] * len(items)
+        return [{"message_id": _publish_stored(chat_id, rec)} for (chat_id, _), rec in zip(items, recs)]
+    return await get_writer().add_many(items)
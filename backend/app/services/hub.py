@@ -0,0 +1,144 @@
+"""
+In-process pub/sub for new chat messages (feeds /ws/chats/{chat_id}).
+
+publish() may be called from any thread (the sync Firestore path runs in the
+threadpool); each subscription belongs to the event loop that created it and
+is fed through call_soon_threadsafe when published from elsewhere. An idle
+subscriber is just a bounded deque and an asyncio.Event: no task, no timer.
+
+Overflow policies, applied when a slow consumer's queue is full:
+  drop      discard the oldest queued message and count it in `dropped`
+  coalesce  discard the whole backlog and flag the subscription as
+            `overflowed`; the consumer re-reads from storage after the last
+            message it delivered, so nothing is lost, just delivered in bulk
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+POLICIES = ("drop", "coalesce")
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+class Subscription:
+    def __init__(self, hub: "Hub", chat_id: str, maxsize: int, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.chat_id = chat_id
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self.overflowed = False
+        self.closed = False
+        self._hub = hub
+        self._loop = asyncio.get_running_loop()
+        self._queue: "deque[Dict[str, Any]]" = deque()
+        self._ready = asyncio.Event()
+
+    def _push(self, msg: Dict[str, Any]) -> None:
+        # runs on self._loop
+        if self.closed or self.overflowed:
+            return
+        if len(self._queue) >= self.maxsize:
+            if self.policy == "coalesce":
+                self._queue.clear()
+                self.overflowed = True
+                self._hub.dropped += 1
+                self._ready.set()
+                return
+            self._queue.popleft()
+            self.dropped += 1
+            self._hub.dropped += 1
+        self._queue.append(msg)
+        self._ready.set()
+
+    async def get(self, max_items: int = 100, linger: float = 0.0) -> Tuple[List[Dict[str, Any]], int, bool]:
+        """
+        Wait for messages; returns (messages, dropped_since_last_call, overflowed).
+        With linger > 0, waits that long after the first message so a burst
+        goes out as one frame. Returns ([], 0, False) once closed.
+        """
+        while not self._queue and not self.overflowed and not self.closed:
+            self._ready.clear()
+            await self._ready.wait()
+        if linger > 0 and len(self._queue) < max_items and not self.closed:
+            await asyncio.sleep(linger)
+        n = min(max_items, len(self._queue))
+        out = [self._queue.popleft() for _ in range(n)]
+        dropped, self.dropped = self.dropped, 0
+        overflowed, self.overflowed = self.overflowed, False
+        return out, dropped, overflowed
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self._ready.set()
+            self._hub._remove(self)
+
+
+class Hub:
+    def __init__(self):
+        self._subs: Dict[str, Set[Subscription]] = {}
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, chat_id: str, maxsize: int = 256, policy: str = "drop") -> Subscription:
+        """Must be called from a running event loop."""
+        sub = Subscription(self, chat_id, maxsize, policy)
+        with self._lock:
+            self._subs.setdefault(chat_id, set()).add(sub)
+        return sub
+
+    def _remove(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subs.get(sub.chat_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.chat_id]
+
+    def publish(self, chat_id: str, msg: Dict[str, Any]) -> int:
+        """Fan msg out to the chat's subscribers; returns how many were notified."""
+        with self._lock:
+            subs = list(self._subs.get(chat_id, ()))
+            self.published += 1
+        if not subs:
+            return 0
+        try:
+            current: Optional[asyncio.AbstractEventLoop] = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for sub in subs:
+            if sub._loop is current:
+                sub._push(msg)
+            else:
+                try:
+                    sub._loop.call_soon_threadsafe(sub._push, msg)
+                except RuntimeError:  # loop closed under us
+                    sub.closed = True
+                    self._remove(sub)
+        return len(subs)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chats": len(self._subs),
+                "subscribers": sum(len(s) for s in self._subs.values()),
+                "published": self.published,
+                "dropped": self.dropped,
+            }
+
+
+def get_hub() -> Hub:
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub()
+    return _hub
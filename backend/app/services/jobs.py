@@ -0,0 +1,214 @@
+"""
+Background simulation jobs on a process pool (POST /jobs/simulate).
+
+Simulations hold the GIL for their whole run, so large ones are executed in
+separate worker processes (spawned, so no threads or sockets are inherited)
+instead of the request threadpool. Workers report the simulator stages they
+finish (see metrics.stages) over a queue; a listener thread turns those into
+job progress. The number of queued + running jobs is bounded.
+
+Cancelling a queued job removes it; a running job cannot be interrupted
+without killing its worker, so it is marked "cancelling" and its result is
+discarded when it finishes.
+"""
+import base64
+import multiprocessing as mp
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+# progress after each stage of simulate_* (bits -> sift -> hkdf)
+STAGE_PROGRESS = {"bits": 0.6, "sift": 0.8, "hkdf": 1.0}
+ACTIVE_STATES = ("queued", "running", "cancelling")
+
+_manager = None
+_manager_lock = threading.Lock()
+
+# ---------- worker side ----------
+
+_events = None
+_job_id = None
+
+
+def _on_stage(mode: str, engine: str, stage: str) -> None:
+    _events.put((_job_id, "stage", stage))
+
+
+def _init_worker(events) -> None:
+    global _events
+    from app.core import metrics
+    _events = events
+    metrics.set_stage_listener(_on_stage)
+
+
+def _run_job(job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    global _job_id
+    from app.core.bb84_sim import simulate_qkd
+    _job_id = job_id
+    _events.put((job_id, "running", None))
+    params = dict(params)
+    seed = base64.b64decode(params.pop("seed_b64"))
+    key, stats = simulate_qkd(seed, **params)
+    return {"base64_key": base64.b64encode(key).decode(), "stats": stats}
+
+
+# ---------- server side ----------
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    __slots__ = ("id", "params", "state", "stage", "progress", "result", "error",
+                 "submitted_at", "started_at", "finished_at", "future")
+
+    def __init__(self, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.params = params
+        self.state = "queued"
+        self.stage: Optional[str] = None
+        self.progress = 0.0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.future: Optional[Future] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        params = {k: v for k, v in self.params.items() if k != "seed_b64"}
+        return {
+            "job_id": self.id, "state": self.state, "stage": self.stage, "progress": self.progress,
+            "params": params, "submitted_at": self.submitted_at, "started_at": self.started_at,
+            "finished_at": self.finished_at, "result": self.result, "error": self.error,
+        }
+
+
+class JobManager:
+    def __init__(self, workers: Optional[int] = None, max_pending: int = 16,
+                 max_bits: int = 1 << 24, keep: int = 1000, ttl: float = 3600.0):
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_pending = max_pending
+        self.max_bits = max_bits
+        self.keep = keep
+        self.ttl = ttl
+        self._ctx = mp.get_context("spawn")
+        self._events = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._listener: Optional[threading.Thread] = None
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.RLock()  # Future.cancel() runs _done() synchronously
+
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        # called with self._lock held
+        if self._pool is None:
+            self._events = self._ctx.Queue()
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=self._ctx,
+                                             initializer=_init_worker, initargs=(self._events,))
+            self._listener = threading.Thread(target=self._listen, args=(self._events,),
+                                              name="qw-jobs", daemon=True)
+            self._listener.start()
+        return self._pool
+
+    def _listen(self, events) -> None:
+        while True:
+            msg = events.get()
+            if msg is None:
+                return
+            job_id, kind, value = msg
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.state not in ACTIVE_STATES:
+                    continue
+                if kind == "running" and job.state == "queued":
+                    job.state, job.started_at = "running", time.time()
+                elif kind == "stage":
+                    job.stage = value
+                    job.progress = max(job.progress, STAGE_PROGRESS.get(value, job.progress))
+
+    def _done(self, job: Job, fut: Future) -> None:
+        with self._lock:
+            job.finished_at = time.time()
+            if fut.cancelled() or job.state == "cancelling":
+                job.state = "cancelled"
+                return
+            try:
+                job.result = fut.result()
+                job.state, job.progress = "done", 1.0
+            except CancelledError:
+                job.state = "cancelled"
+            except Exception as e:
+                job.state, job.error = "failed", f"{type(e).__name__}: {e}"
+
+    def _prune(self, now: float) -> None:
+        # called with self._lock held; oldest first
+        for jid in list(self._jobs):
+            job = self._jobs[jid]
+            if job.state in ACTIVE_STATES:
+                continue
+            if len(self._jobs) > self.keep or now - (job.finished_at or now) > self.ttl:
+                del self._jobs[jid]
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(j.state in ACTIVE_STATES for j in self._jobs.values())
+
+    def submit(self, params: Dict[str, Any]) -> Job:
+        """params: seed_b64, n_bits, mode and any simulate_qkd kwargs."""
+        if not 1 <= params.get("n_bits", 0) <= self.max_bits:
+            raise ValueError(f"n_bits must be in [1, {self.max_bits}]")
+        job = Job(params)
+        with self._lock:
+            self._prune(time.time())
+            if sum(j.state in ACTIVE_STATES for j in self._jobs.values()) >= self.max_pending:
+                raise JobQueueFull(f"{self.max_pending} jobs already queued or running")
+            self._jobs[job.id] = job
+            job.future = self._ensure_pool().submit(_run_job, job.id, params)
+        job.future.add_done_callback(lambda f: self._done(job, f))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in ("queued", "running"):
+                return job
+            if job.state == "running" or not job.future.cancel():
+                job.state = "cancelling"
+        return job
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, events, self._pool = self._pool, self._events, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+            events.put(None)
+
+
+def get_manager() -> JobManager:
+    """
+    Process-wide job manager.
+    Env (optional):
+      JOBS_WORKERS      worker processes (default cpu_count - 1)
+      JOBS_MAX_PENDING  queued + running jobs before submissions get 429 (default 16)
+      JOBS_MAX_BITS     largest n_bits accepted (default 16777216)
+      JOBS_TTL          seconds finished jobs stay retrievable (default 3600)
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager(
+                    workers=int(os.getenv("JOBS_WORKERS", "0")) or None,
+                    max_pending=int(os.getenv("JOBS_MAX_PENDING", "16")),
+                    max_bits=int(os.getenv("JOBS_MAX_BITS", str(1 << 24))),
+                    ttl=float(os.getenv("JOBS_TTL", "3600")),
+                )
+    return _manager
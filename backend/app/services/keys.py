@@ -0,0 +1,148 @@
+"""
+Server-side per-chat session keys (GET /chats/{chat_id}/keys).
+
+The base key of a chat is the key clients get from
+/simulate_bb84?n_bits=2048&seed_b64=<q_seed_b64>; it is derived once per chat
+and fed to a Ratchet (core/ratchet.py) that yields per-epoch keys. Ratchets
+are kept in an LRU under a byte budget; an evicted chat simply re-derives its
+base key and checkpoints on the next request.
+
+Only chat members can read the chat document (firebase/firestore.rules), so
+holding q_seed_b64 is what proves membership here: every request carries
+
+  proof = HMAC-SHA256(key = seed bytes, b"qw-chat-keys-v1" || chat_id)
+
+and keys are derived only when it matches.
+"""
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.core.bb84_sim import simulate_bb84
+from app.core.ratchet import Ratchet
+from app.services import firestore as fs
+
+BASE_KEY_BITS = 2048  # what clients pass to /simulate_bb84
+PROOF_LABEL = b"qw-chat-keys-v1"
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class ChatNotFound(Exception):
+    pass
+
+
+class NotMember(Exception):
+    pass
+
+
+def membership_proof(seed: bytes, chat_id: str) -> bytes:
+    return hmac.new(seed, PROOF_LABEL + chat_id.encode(), hashlib.sha256).digest()
+
+
+class KeyCache:
+    def __init__(self, max_bytes: int = 4 << 20, checkpoint_every: int = 256,
+                 recent: int = 128, max_epoch: int = 1 << 20):
+        self.max_bytes = max_bytes
+        self.checkpoint_every = checkpoint_every
+        self.recent = recent
+        self.max_epoch = max_epoch
+        self._lock = threading.Lock()
+        self._ratchets: "OrderedDict[str, Ratchet]" = OrderedDict()
+        self._proofs: Dict[str, bytes] = {}  # chat_id -> expected membership proof
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load(self, chat_id: str) -> Tuple[bytes, bytes]:
+        """(base key, expected membership proof) from the chat document."""
+        chat = fs.get_chat(chat_id)
+        if chat is None:
+            raise ChatNotFound(chat_id)
+        seed = base64.b64decode(chat["q_seed_b64"])
+        key, _ = simulate_bb84(seed, n_bits=BASE_KEY_BITS)
+        return key, membership_proof(seed, chat_id)
+
+    def _ratchet(self, chat_id: str, proof: bytes) -> Ratchet:
+        with self._lock:
+            r = self._ratchets.get(chat_id)
+            if r is not None:
+                if not hmac.compare_digest(self._proofs[chat_id], proof):
+                    raise NotMember(chat_id)
+                self._ratchets.move_to_end(chat_id)
+                self.hits += 1
+                return r
+            self.misses += 1
+        # derive outside the lock; a concurrent miss derives the same key
+        base, expected = self._load(chat_id)
+        if not hmac.compare_digest(expected, proof):
+            raise NotMember(chat_id)
+        r = Ratchet(base, self.checkpoint_every, self.recent)
+        with self._lock:
+            if chat_id not in self._ratchets:
+                self._ratchets[chat_id] = r
+                self._proofs[chat_id] = expected
+                self._bytes += r.nbytes()
+            return self._ratchets[chat_id]
+
+    def _account(self, chat_id: str, r: Ratchet, delta: int) -> None:
+        with self._lock:
+            if self._ratchets.get(chat_id) is r:
+                self._bytes += delta
+            while self._bytes > self.max_bytes and len(self._ratchets) > 1:
+                old_id, old = self._ratchets.popitem(last=False)
+                del self._proofs[old_id]
+                self._bytes -= old.nbytes()
+                self.evictions += 1
+
+    def keys(self, chat_id: str, proof: bytes, epoch: int, count: int = 1) -> List[bytes]:
+        """MK_epoch .. MK_{epoch+count-1}; raises ChatNotFound, NotMember or ValueError."""
+        if epoch < 0 or epoch + count - 1 > self.max_epoch:
+            raise ValueError(f"epochs must be in [0, {self.max_epoch}]")
+        r = self._ratchet(chat_id, proof)
+        before = r.nbytes()
+        out = [r.key(e) for e in range(epoch, epoch + count)]
+        self._account(chat_id, r, r.nbytes() - before)
+        return out
+
+    def head(self, chat_id: str) -> Optional[int]:
+        with self._lock:
+            r = self._ratchets.get(chat_id)
+            return r.head if r is not None else None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "chats": len(self._ratchets),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def get_key_cache() -> KeyCache:
+    """
+    Process-wide chat key cache.
+    Env (optional):
+      KEYS_CACHE_BYTES        byte budget for ratchets (default 4 MiB)
+      KEYS_CHECKPOINT_EVERY   epochs between chain checkpoints (default 256)
+      KEYS_MAX_EPOCH          highest epoch served (default 1048576)
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = KeyCache(
+                    max_bytes=int(os.getenv("KEYS_CACHE_BYTES", str(4 << 20))),
+                    checkpoint_every=int(os.getenv("KEYS_CHECKPOINT_EVERY", "256")),
+                    max_epoch=int(os.getenv("KEYS_MAX_EPOCH", str(1 << 20))),
+                )
+    return _cache
@@ -0,0 +1,275 @@
+"""
+Local chat/message stores used instead of Firestore when STORAGE_BACKEND is
+"sqlite" or "memory" (see services/firestore.py, which keeps the public API).
+
+Both stores keep messages ordered by (createdAt, message_id) and page with
+keyset cursors, matching the Firestore path. createdAt is stamped on write
+from a per-store monotonic microsecond clock, so insertion order is preserved
+even when several writes land in the same microsecond.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+# (createdAt, message_id) of the message a page starts after / ends before
+Cursor = Tuple[Optional[datetime], str]
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def to_us(t: Optional[datetime]) -> int:
+    if t is None:
+        return -1
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return (t - EPOCH) // _US
+
+
+def from_us(us: int) -> datetime:
+    return EPOCH + us * _US
+
+
+def _new_id() -> str:
+    return os.urandom(10).hex()
+
+
+class _Clock:
+    """Strictly increasing microsecond timestamps (wall clock, never repeats)."""
+
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def __call__(self) -> int:
+        with self._lock:
+            self._last = max(time.time_ns() // 1000, self._last + 1)
+            return self._last
+
+
+class MemoryStore:
+    """Process-local store: one sorted list per chat. Thread-safe, nothing persisted."""
+
+    blocking = False
+
+    def __init__(self):
+        self._chats: Dict[str, Dict[str, Any]] = {}
+        self._msgs: Dict[str, List[Tuple[int, str, Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+        self._clock = _Clock()
+
+    def _insert(self, chat_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        mid = _new_id()
+        t = data.get("createdAt")
+        key = (to_us(t) if t is not None else self._clock(), mid)
+        rows = self._msgs.setdefault(chat_id, [])
+        row = (key[0], key[1], {k: v for k, v in data.items() if k != "createdAt"})
+        if not rows or rows[-1][:2] < key:
+            rows.append(row)
+        else:
+            rows.insert(bisect_right(rows, key, key=lambda r: r[:2]), row)
+        return {**row[2], "createdAt": from_us(key[0]), "message_id": mid}
+
+    def add_message(self, chat_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Store one message; returns it as read back (with createdAt and message_id)."""
+        with self._lock:
+            return self._insert(chat_id, data)
+
+    def add_messages(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [self._insert(chat_id, data) for chat_id, data in items]
+
+    def iter_messages(self, chat_id: str, limit: Optional[int] = None,
+                      after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Iterator[Dict[str, Any]]:
+        with self._lock:
+            rows = self._msgs.get(chat_id, [])
+            if before is not None:
+                hi = bisect_left(rows, (to_us(before[0]), before[1]), key=lambda r: r[:2])
+                page = rows[max(0, hi - limit) if limit else 0:hi][::-1]
+            else:
+                lo = bisect_right(rows, (to_us(after[0]), after[1]), key=lambda r: r[:2]) if after else 0
+                page = rows[lo:lo + limit if limit else None]
+        for us, mid, data in page:
+            yield {**data, "createdAt": from_us(us), "message_id": mid}
+
+    def create_chat(self, members: List[str], q_seed_b64: str) -> str:
+        chat_id = _new_id()
+        with self._lock:
+            self._chats[chat_id] = {"members": list(members), "q_seed_b64": q_seed_b64,
+                                    "createdAt": from_us(self._clock())}
+        return chat_id
+
+    def get_chat(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            chat = self._chats.get(chat_id)
+            return dict(chat) if chat is not None else None
+
+    def close(self) -> None:
+        pass
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    members TEXT NOT NULL,
+    q_seed_b64 TEXT NOT NULL,
+    created_us INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    created_us INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (chat_id, created_us, id)
+) WITHOUT ROWID;
+"""
+
+
+_READ_PAGE = 256  # rows per reader checkout in SQLiteStore.iter_messages
+
+
+class SQLiteStore:
+    """
+    Embedded SQLite store in WAL mode. Messages are clustered on
+    (chat_id, created_us, id), so keyset pages are a single index range scan.
+    Readers take connections from a fixed pool; writes go through one writer
+    connection and batches are inserted in a single transaction.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, pool_size: int = 4, timeout: float = 5.0):
+        self.path = path
+        self._timeout = timeout
+        self._clock = _Clock()
+        self._writer = self._connect()
+        self._writer.executescript(_SCHEMA)
+        self._write_lock = threading.Lock()
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        for _ in range(max(1, pool_size)):
+            self._pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self._timeout, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _reader(self):
+        conn = self._pool.get(timeout=self._timeout)
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def _row(self, chat_id: str, data: Dict[str, Any]) -> Tuple[str, str, int, str]:
+        t = data.get("createdAt")
+        body = json.dumps({k: v for k, v in data.items() if k != "createdAt"}, separators=(",", ":"))
+        return (_new_id(), chat_id, to_us(t) if t is not None else self._clock(), body)
+
+    def add_messages(self, items: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Insert all items in one transaction; returns them as stored."""
+        rows = [self._row(chat_id, data) for chat_id, data in items]
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                self._writer.executemany(
+                    "INSERT INTO messages (id, chat_id, created_us, data) VALUES (?, ?, ?, ?)", rows)
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+        return [{**json.loads(body), "createdAt": from_us(us), "message_id": mid} for mid, _, us, body in rows]
+
+    def add_message(self, chat_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self.add_messages([(chat_id, data)])[0]
+
+    def iter_messages(self, chat_id: str, limit: Optional[int] = None,
+                      after: Optional[Cursor] = None, before: Optional[Cursor] = None) -> Iterator[Dict[str, Any]]:
+        # Rows are fetched a page at a time and the pooled connection is returned
+        # before any are yielded, so a slow consumer (an NDJSON client) never
+        # keeps a reader checked out. Each page resumes after the last row.
+        desc = before is not None
+        edge = before if desc else after
+        pos = (to_us(edge[0]), edge[1]) if edge is not None else None
+        remaining = limit
+        while remaining is None or remaining > 0:
+            sql = "SELECT id, created_us, data FROM messages WHERE chat_id = ?"
+            args: List[Any] = [chat_id]
+            if pos is not None:
+                sql += " AND (created_us, id) < (?, ?)" if desc else " AND (created_us, id) > (?, ?)"
+                args += list(pos)
+            sql += " ORDER BY created_us DESC, id DESC" if desc else " ORDER BY created_us, id"
+            page = _READ_PAGE if remaining is None else min(_READ_PAGE, remaining)
+            sql += " LIMIT ?"
+            args.append(page)
+            with self._reader() as conn:
+                rows = conn.execute(sql, args).fetchall()
+            for mid, us, body in rows:
+                yield {**json.loads(body), "createdAt": from_us(us), "message_id": mid}
+            if len(rows) < page:
+                return
+            pos = (rows[-1][1], rows[-1][0])
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def create_chat(self, members: List[str], q_seed_b64: str) -> str:
+        chat_id = _new_id()
+        with self._write_lock:
+            self._writer.execute("INSERT INTO chats (id, members, q_seed_b64, created_us) VALUES (?, ?, ?, ?)",
+                                 (chat_id, json.dumps(list(members)), q_seed_b64, self._clock()))
+        return chat_id
+
+    def get_chat(self, chat_id: str) -> Optional[Dict[str, Any]]:
+        with self._reader() as conn:
+            row = conn.execute("SELECT members, q_seed_b64, created_us FROM chats WHERE id = ?",
+                               (chat_id,)).fetchone()
+        if row is None:
+            return None
+        return {"members": json.loads(row[0]), "q_seed_b64": row[1], "createdAt": from_us(row[2])}
+
+    def close(self) -> None:
+        self._writer.close()
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def backend() -> str:
+    return os.getenv("STORAGE_BACKEND", "firestore").lower()
+
+
+def get_store():
+    """
+    Process-wide local store, or None when messages go to Firestore.
+    Env (optional):
+      STORAGE_BACKEND   firestore (default) | sqlite | memory
+      SQLITE_PATH       database file for the sqlite backend (default qwhisper.db)
+      SQLITE_POOL_SIZE  reader connections (default 4)
+    """
+    global _store
+    kind = backend()
+    if kind == "firestore":
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if kind == "memory":
+                    _store = MemoryStore()
+                elif kind == "sqlite":
+                    _store = SQLiteStore(os.getenv("SQLITE_PATH", "qwhisper.db"),
+                                         pool_size=int(os.getenv("SQLITE_POOL_SIZE", "4")))
+                else:
+                    raise ValueError(f"unknown STORAGE_BACKEND {kind!r}")
+    return _store
@@ -0,0 +1,325 @@
+"""
+Benchmark harness for the backend.
+
+  python -m bench.run                        # full run, table on stdout
+  python -m bench.run --quick --out r.json   # smaller sizes, write JSON results
+  python -m bench.run --baseline bench/baseline.json --threshold 0.25
+  python -m bench.run --update-baseline      # rewrite bench/baseline.json
+  python -m bench.run --filter startup --startup-budget 0.8
+
+Run from backend/. Micro benchmarks report per-call seconds (min and median
+over --repeat timed rounds, each auto-sized to ~0.2 s like timeit). HTTP
+benchmarks drive the ASGI app in-process and report latency percentiles and
+throughput with --concurrency client threads. Comparison uses the median
+(p50 for HTTP); anything slower than baseline * (1 + threshold) is a
+regression and makes the exit status 1.
+
+The startup case imports app.main in fresh interpreters with server-side
+messages off (the scale-to-zero deployment) and also fails the run when its
+median exceeds --startup-budget, baseline or not.
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STARTUP_CASE = "startup import app.main"
+
+Case = Tuple[str, Callable[[], object]]
+
+
+# ---------- micro benchmarks ----------
+
+def sim_cases(quick: bool) -> Iterator[Case]:
+    from app.core.bb84_sim import simulate_bb84, simulate_bb84_decoy, simulate_mdi_bb84
+
+    seed = bytes(range(32))
+    sizes = [128, 1024] if quick else [128, 1024, 8192, 65536]
+    for fn in (simulate_bb84, simulate_bb84_decoy, simulate_mdi_bb84):
+        for engine in ("python", "numpy"):
+            for n in sizes:
+                yield f"{fn.__name__}[{engine},n={n}]", (lambda fn=fn, n=n, e=engine: fn(seed, n_bits=n, engine=e))
+
+
+def hkdf_cases(quick: bool) -> Iterator[Case]:
+    from app.core.bb84_sim import _hkdf_from_bits
+
+    for n in ([256, 4096] if quick else [256, 4096, 65536]):
+        bits = [i * 2654435761 >> 7 & 1 for i in range(n)]
+        yield f"hkdf_from_bits[n={n}]", (lambda bits=bits: _hkdf_from_bits(bits, b"bench"))
+
+
+def cascade_cases(quick: bool) -> Iterator[Case]:
+    import numpy as np
+    from app.core.cascade import reconcile
+
+    rng = np.random.default_rng(0)
+    for n in ([1 << 12] if quick else [1 << 12, 1 << 16]):
+        for q in (0.01, 0.05):
+            a = rng.integers(0, 2, n, dtype=np.uint8)
+            b = a ^ (rng.random(n) < q).astype(np.uint8)
+            yield f"cascade[n={n},q={q}]", (lambda a=a, b=b, q=q: reconcile(a, b, q, b"bench"))
+
+
+def privacy_cases(quick: bool) -> Iterator[Case]:
+    import numpy as np
+    from app.core.privacy import amplify
+
+    rng = np.random.default_rng(0)
+    for n in ([1 << 14] if quick else [1 << 14, 1 << 20]):
+        bits = rng.integers(0, 2, n, dtype=np.uint8)
+        yield f"toeplitz_amplify[n={n}]", (lambda bits=bits: amplify(bits, 0.02, b"bench"))
+
+
+def wrap_cases(quick: bool) -> Iterator[Case]:
+    from app.api.wrap import wrap_key
+    from app.core import cbor
+    from app.models.schemas import WrapRequest
+
+    def as_json(body: bytes) -> bytes:
+        req = WrapRequest.model_validate_json(body)
+        iv, ct = wrap_key(base64.b64decode(req.wrap_key_b64), base64.b64decode(req.plaintext_b64))
+        return json.dumps({"iv_b64": base64.b64encode(iv).decode(), "ct_b64": base64.b64encode(ct).decode(),
+                           "tag_included": True}).encode()
+
+    def as_cbor(body: bytes) -> bytes:
+        req = cbor.loads(body)
+        iv, ct = wrap_key(req["wrap_key"], req["plaintext"])
+        return cbor.dumps({"iv": iv, "ct": ct, "tag_included": True})
+
+    key = bytes(32)
+    sizes = [32, 1 << 10, 64 << 10] if quick else [32, 1 << 10, 64 << 10, 1 << 20, 10 << 20]
+    for size in sizes:
+        pt = os.urandom(size)
+        jbody = json.dumps({"wrap_key_b64": base64.b64encode(key).decode(),
+                            "plaintext_b64": base64.b64encode(pt).decode()}).encode()
+        cbody = cbor.dumps({"wrap_key": key, "plaintext": pt})
+        # request body in, response body out: what the handler does per representation
+        yield f"wrap_key[{size}B]", (lambda b=jbody: as_json(b))
+        yield f"wrap_key_cbor[{size}B]", (lambda b=cbody: as_cbor(b))
+
+
+MICRO = (sim_cases, hkdf_cases, cascade_cases, privacy_cases, wrap_cases)
+
+
+def measure(fn: Callable[[], object], repeat: int, min_time: float = 0.2) -> Dict[str, float]:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    per_call = [t / number for t in timer.repeat(repeat, number)]
+    med = statistics.median(per_call)
+    return {"min": min(per_call), "median": med, "ops_per_s": 1.0 / med}
+
+
+# ---------- startup ----------
+
+_STARTUP_SNIPPET = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+
+
+def measure_startup(repeat: int) -> Dict[str, float]:
+    """Seconds to import app.main, timed inside each of `repeat` fresh interpreters."""
+    env = {k: v for k, v in os.environ.items() if k not in ("STORAGE_BACKEND", "FIREBASE_SERVER_WRITES")}
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_SNIPPET], cwd=BACKEND, env=env,
+                             capture_output=True, text=True, check=True, timeout=120).stdout
+        times.append(float(out.strip().splitlines()[-1]))
+    med = statistics.median(times)
+    return {"min": min(times), "median": med, "ops_per_s": 1.0 / med}
+
+
+# ---------- HTTP benchmarks ----------
+
+class _QrngStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        n = int(parse_qs(urlparse(self.path).query)["length"][0])
+        body = json.dumps({"base64": base64.b64encode(os.urandom(n)).decode()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _http_env():
+    """Point the app at a local QRNG stand-in and the in-memory message store."""
+    from app.core import entropy
+    from app.services import cache, storage
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _QrngStandIn)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    os.environ["QRNG_URL"] = f"http://127.0.0.1:{srv.server_port}/bytes?length="
+    os.environ["STORAGE_BACKEND"] = "memory"
+    if entropy._pool is not None:
+        entropy._pool.close()
+    entropy._pool = None
+    storage._store = None
+    cache._sim_cache = None
+    return srv
+
+
+def http_cases(client, quick: bool) -> Iterator[Tuple[str, Callable[[int], object]]]:
+    seeds = itertools.count()
+    fixed = base64.b64encode(bytes(32)).decode()
+
+    def sim_cold(_):
+        seed = base64.b64encode(next(seeds).to_bytes(32, "big")).decode()
+        return client.get("/simulate_bb84", params={"n_bits": 2048, "seed_b64": seed})
+
+    msg = {"chat_id": "bench", "sender_uid": "u", "iv_b64": "aXY=", "ct_b64": "Y3Q=" * 16}
+    yield "http GET /simulate_bb84 (miss)", sim_cold
+    yield "http GET /simulate_bb84 (hit)", lambda _: client.get("/simulate_bb84", params={"n_bits": 2048, "seed_b64": fixed})
+    yield "http GET /qrng", lambda _: client.get("/qrng", params={"n": 32})
+    yield "http POST /messages", lambda _: client.post("/messages", json=msg)
+    yield "http GET /messages", lambda _: client.get("/messages", params={"chat_id": "bench", "limit": 50})
+
+
+def measure_http(call: Callable[[int], object], requests: int, concurrency: int) -> Dict[str, float]:
+    for i in range(min(20, requests)):  # warm-up (imports, pools, caches)
+        call(i)
+    lat = []
+    for i in range(requests):
+        t = time.perf_counter()
+        r = call(i)
+        lat.append(time.perf_counter() - t)
+        if r.status_code >= 400:
+            raise RuntimeError(f"HTTP {r.status_code}: {r.text[:200]}")
+    lat.sort()
+    pct = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))]
+    t = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, range(requests)))
+    wall = time.perf_counter() - t
+    return {"min": lat[0], "median": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "ops_per_s": requests / wall}
+
+
+# ---------- results ----------
+
+def _meta() -> Dict[str, str]:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             timeout=5).stdout.strip()
+    except OSError:
+        rev = ""
+    try:
+        import numpy
+        np_version = numpy.__version__
+    except ImportError:
+        np_version = ""
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git": rev,
+        "python": platform.python_version(),
+        "numpy": np_version,
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} cpu)",
+    }
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            threshold: float) -> List[Tuple[str, float]]:
+    """(name, ratio) for every case whose median exceeds baseline by more than threshold."""
+    out = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b and b.get("median"):
+            ratio = r["median"] / b["median"]
+            if ratio > 1 + threshold:
+                out.append((name, ratio))
+    return out
+
+
+def _fmt(sec: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e3), ("us", 1e6)):
+        if sec * scale >= 1:
+            return f"{sec * scale:8.2f} {unit}"
+    return f"{sec * 1e9:8.2f} ns"
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--quick", action="store_true", help="smaller sizes and fewer requests")
+    ap.add_argument("--filter", default="", help="only cases whose name contains this")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--requests", type=int, default=None, help="requests per HTTP case")
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--no-http", action="store_true")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--baseline", help=f"compare against this results file (e.g. {BASELINE})")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown ratio (default 0.25 = 25%%)")
+    ap.add_argument("--update-baseline", action="store_true", help=f"write results to {BASELINE}")
+    ap.add_argument("--startup-budget", type=float, default=1.0,
+                    help="max median seconds for the startup case (default 1.0)")
+    args = ap.parse_args(argv)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results: Dict[str, Dict[str, float]] = {}
+
+    def report(name: str, r: Dict[str, float]) -> None:
+        results[name] = r
+        b = baseline.get(name, {}).get("median")
+        delta = f"{(r['median'] / b - 1) * 100:+7.1f}%" if b else ""
+        print(f"{name:45s} {_fmt(r['median'])} {r['ops_per_s']:12.1f}/s {delta}", flush=True)
+
+    if args.filter in STARTUP_CASE:
+        report(STARTUP_CASE, measure_startup(args.repeat))
+
+    for cases in MICRO:
+        for name, fn in cases(args.quick):
+            if args.filter in name:
+                report(name, measure(fn, args.repeat))
+
+    if not args.no_http:
+        from fastapi.testclient import TestClient
+
+        srv = _http_env()
+        from app.main import app
+
+        n = args.requests or (50 if args.quick else 500)
+        with TestClient(app) as client:
+            for name, call in http_cases(client, args.quick):
+                if args.filter in name:
+                    report(name, measure_http(call, n, args.concurrency))
+        srv.shutdown()
+        srv.server_close()
+
+    doc = {"meta": _meta(), "results": results}
+    for path in [p for p in (args.out, BASELINE if args.update_baseline else None) if p]:
+        with open(path, "w") as f:
+            json.dump(doc, f, indent=1, sort_keys=True)
+            f.write("\n")
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+    for name, ratio in regressions:
+        print(f"REGRESSION {name}: {ratio:.2f}x baseline median", file=sys.stderr)
+    over_budget = STARTUP_CASE in results and results[STARTUP_CASE]["median"] > args.startup_budget
+    if over_budget:
+        print(f"BUDGET {STARTUP_CASE}: {results[STARTUP_CASE]['median']:.3f} s > {args.startup_budget} s",
+              file=sys.stderr)
+    return 1 if regressions or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
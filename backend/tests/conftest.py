@@ -0,0 +1,5 @@
+import os
+
+# app.main mounts the messages router only when server-side messages are
+# enabled; tests switch storage backends per test, so mount it for the session.
+os.environ.setdefault("FIREBASE_SERVER_WRITES", "true")
@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.admission import COSTS, AdmissionController, AdmissionMiddleware, Shed, sim_cost
+
+
+def test_cost_grows_with_bits_and_engine():
+    bb84 = COSTS["GET", "/simulate_bb84"]
+    small, big = bb84({"n_bits": ["2048"]}, None), bb84({"n_bits": ["65536"]}, None)
+    assert big > 20 * small
+    assert bb84({"n_bits": ["65536"], "engine": ["numpy"]}, None) < big / 5
+    assert bb84({"n_bits": ["junk"]}, None) == small
+    mc = COSTS["POST", "/simulate/montecarlo"]
+    assert mc({}, {"trials": 100, "n_bits": 65536, "mode": "decoy"}) == pytest.approx(
+        100 * sim_cost(65536, "decoy"))
+    assert mc({}, {"trials": 100, "engine": "analytic"}) < mc({}, {"trials": 100})
+
+
+def test_bucket_refills_and_allows_debt():
+    c = AdmissionController(rate=1.0, burst=2.0)
+    c.charge("a", 1.5, now=0.0)
+    with pytest.raises(Shed) as e:
+        c.charge("a", 1.0, now=0.0)
+    assert e.value.status == 429 and e.value.retry_after == 1
+    c.charge("b", 1.0, now=0.0)  # other clients are unaffected
+    c.charge("a", 1.0, now=0.6)
+    # an oversized request needs only a full bucket, then leaves the client in debt
+    c.charge("c", 10.0, now=0.0)
+    with pytest.raises(Shed) as e:
+        c.charge("c", 0.1, now=5.0)
+    assert e.value.retry_after == 4  # -8 + 5 refilled = -3 tokens, needs 0.1
+
+
+def test_queue_sheds_when_full_and_at_deadline():
+    async def scenario():
+        c = AdmissionController(concurrency=1, queue_size=1, queue_timeout=0.2)
+        assert await c.acquire() == 0.0
+        waiter = asyncio.ensure_future(c.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Shed) as full:
+            await c.acquire()
+        c.release(0.01)  # handed to the waiter
+        assert await waiter >= 0.0
+        with pytest.raises(Shed) as late:
+            await c.acquire()
+        c.release()
+        assert await c.acquire() == 0.0
+        return c, full.value, late.value
+
+    c, full, late = asyncio.run(scenario())
+    assert (full.status, late.status) == (429, 503)
+    assert c.stats()["shed"] == {"rate": 0, "queue": 1, "deadline": 1}
+
+
+def _app(controller):
+    app = FastAPI()
+
+    @app.get("/simulate_bb84")
+    def sim(n_bits: int = 2048):
+        return {"n_bits": n_bits}
+
+    @app.post("/simulate/montecarlo")
+    async def mc(request: Request):
+        return await request.json()
+
+    @app.get("/health")
+    def health():
+        return {"status": "ok"}
+
+    app.add_middleware(AdmissionMiddleware, controller=controller)
+    return TestClient(app)
+
+
+def test_middleware_sheds_simulations_but_not_health():
+    client = _app(AdmissionController(rate=0.001, burst=0.03))
+    assert client.get("/simulate_bb84", params={"n_bits": 65536}).status_code == 200
+    r = client.get("/simulate_bb84", params={"n_bits": 65536})
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    assert r.json()["detail"]
+    assert client.get("/health").status_code == 200
+
+
+def test_middleware_replays_json_body():
+    c = AdmissionController(rate=1.0, burst=1.0)
+    client = _app(c)
+    big = {"trials": 1_000_000, "n_bits": 65536}
+    assert client.post("/simulate/montecarlo", content=json.dumps(big)).json() == big
+    # charged from the body: the client is now deep in debt
+    r = client.post("/simulate/montecarlo", json={"trials": 10, "n_bits": 128})
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) > 1000
+    assert c.stats()["running"] == 0
+
+
+def test_stream_holds_slot_while_computing_not_while_delivering():
+    running = []
+    ctl = AdmissionController(concurrency=1, queue_timeout=0.5)
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        if scope["path"] != "/simulate_bb84/stream":
+            return await send({"type": "http.response.body", "body": b"{}"})
+        for block in (b"1\n", b"2\n"):
+            await asyncio.sleep(0.01)  # computing the block
+            running.append(ctl.stats()["running"])
+            await send({"type": "http.response.body", "body": block, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def call(mw, path, stall=False):
+        sent = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(msg):
+            sent.append(msg)
+            if stall and msg.get("body") == b"2\n":
+                await asyncio.sleep(3600)  # reader never drains the rest
+        scope = {"type": "http", "method": "GET", "path": path, "query_string": b"", "headers": [],
+                 "client": ("10.0.0.1", 1)}
+        await mw(scope, receive, send)
+        return sent[0]["status"]
+
+    async def scenario():
+        mw = AdmissionMiddleware(app, controller=ctl)
+        stream = asyncio.ensure_future(call(mw, "/simulate_bb84/stream", stall=True))
+        await asyncio.sleep(0.1)
+        status = await asyncio.wait_for(call(mw, "/simulate_bb84"), 1.0)
+        stream.cancel()
+        await asyncio.sleep(0)
+        return status
+
+    assert asyncio.run(scenario()) == 200
+    assert running == [1, 1]  # every block is computed inside the global budget
+    assert ctl.stats()["running"] == 0 and ctl.stats()["shed"]["deadline"] == 0
+
+
+def test_resumed_stream_waits_its_turn():
+    async def scenario():
+        c = AdmissionController(concurrency=1, queue_size=0, queue_timeout=0.01)
+        await c.acquire()
+        with pytest.raises(Shed):
+            await c.acquire()  # a new request is shed
+        resumed = asyncio.ensure_future(c.acquire(resume=True))
+        await asyncio.sleep(0.05)  # past queue_timeout, still waiting
+        assert not resumed.done()
+        c.release()
+        await resumed
+        c.release()
+        return c.stats()
+
+    assert asyncio.run(scenario())["running"] == 0
@@ -0,0 +1,63 @@
+import base64
+import os
+
+import pytest
+from cryptography.exceptions import InvalidTag
+from fastapi.testclient import TestClient
+
+from app.core.aead_stream import HEADER_LEN, TAG_LEN, StreamEncryptor, decrypt_iter, encrypt_iter
+from app.main import app
+
+
+def _pieces(data, size):
+    return (data[i:i + size] for i in range(0, len(data), size))
+
+
+@pytest.mark.parametrize("length", [0, 1, 1024, 1025, 5000])
+def test_roundtrip_any_piece_size(length):
+    key = os.urandom(32)
+    data = os.urandom(length)
+    ct = b"".join(encrypt_iter(key, _pieces(data, 333), chunk_size=1024))
+    n_chunks = max(1, -(-length // 1024))
+    assert len(ct) == HEADER_LEN + length + n_chunks * TAG_LEN
+    assert b"".join(decrypt_iter(key, _pieces(ct, 77))) == data
+
+
+def test_truncation_and_reordering_are_detected():
+    key = os.urandom(32)
+    ct = b"".join(encrypt_iter(key, [os.urandom(3000)], chunk_size=1024))
+    sealed = 1024 + TAG_LEN
+    with pytest.raises(InvalidTag):  # drop the final chunk
+        b"".join(decrypt_iter(key, [ct[:HEADER_LEN + 2 * sealed]]))
+    body = ct[HEADER_LEN:]
+    swapped = ct[:HEADER_LEN] + body[sealed:2 * sealed] + body[:sealed] + body[2 * sealed:]
+    with pytest.raises(InvalidTag):
+        b"".join(decrypt_iter(key, [swapped]))
+
+
+def test_encryptor_buffers_at_most_one_chunk():
+    enc = StreamEncryptor(os.urandom(32), chunk_size=1024)
+    for _ in range(100):
+        enc.update(os.urandom(1000))
+        assert len(enc._buf) <= 1024
+
+
+def test_http_stream_roundtrip():
+    client = TestClient(app)
+    key = base64.b64encode(os.urandom(32)).decode()
+    data = os.urandom(200_000)
+    ct = client.post("/encrypt_stream?chunk_size=4096", content=data, headers={"X-Wrap-Key": key})
+    assert ct.status_code == 200
+    pt = client.post("/decrypt_stream", content=ct.content, headers={"X-Wrap-Key": key})
+    assert pt.content == data
+    assert client.post("/encrypt_stream", content=b"x", headers={"X-Wrap-Key": "bad"}).status_code == 400
+
+
+def test_http_decrypt_rejects_tampering():
+    client = TestClient(app)
+    key = base64.b64encode(os.urandom(32)).decode()
+    ct = bytearray(client.post("/encrypt_stream", content=b"attachment" * 1000,
+                               headers={"X-Wrap-Key": key}).content)
+    ct[-1] ^= 1
+    r = client.post("/decrypt_stream", content=bytes(ct), headers={"X-Wrap-Key": key})
+    assert r.status_code == 400
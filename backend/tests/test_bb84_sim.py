@@ -0,0 +1,96 @@
+import hashlib
+import statistics
+
+import pytest
+
+from app.core.bb84_sim import simulate_bb84, simulate_bb84_decoy, simulate_mdi_bb84, simulate_qkd
+
+
+def _seeds(n):
+    return [hashlib.sha256(bytes([i])).digest() for i in range(n)]
+
+
+@pytest.mark.parametrize("fn", [simulate_bb84, simulate_bb84_decoy, simulate_mdi_bb84])
+def test_numpy_engine_is_deterministic(fn):
+    seed = _seeds(1)[0]
+    k1, s1 = fn(seed, n_bits=4096, engine="numpy")
+    k2, s2 = fn(seed, n_bits=4096, engine="numpy")
+    assert k1 == k2 and len(k1) == 32
+    assert s1 == s2
+    assert s1["engine"] == "numpy"
+
+
+@pytest.mark.parametrize("fn", [simulate_bb84, simulate_bb84_decoy, simulate_mdi_bb84])
+def test_numpy_engine_matches_reference_statistics(fn):
+    n = 8192
+    py = [fn(s, n_bits=n)[1] for s in _seeds(8)]
+    vec = [fn(s, n_bits=n, engine="numpy")[1] for s in _seeds(8)]
+    for key, tol in (("qber", 0.01), ("kept", 0.02 * n)):
+        assert abs(statistics.mean(p[key] for p in py) - statistics.mean(v[key] for v in vec)) < tol
+
+
+def test_eavesdrop_raises_qber_in_both_engines():
+    seed = _seeds(1)[0]
+    for engine in ("python", "numpy"):
+        _, stats = simulate_bb84(seed, n_bits=8192, eavesdrop=True, engine=engine)
+        assert 0.08 < stats["qber"] < 0.16
+
+
+def test_unknown_engine_rejected():
+    with pytest.raises(ValueError):
+        simulate_qkd(b"seed", mode="bb84", engine="fortran")
+
+
+@pytest.mark.parametrize("mode", ["bb84", "decoy", "mdi"])
+def test_stream_version_is_engine_independent(mode):
+    for seed in _seeds(4):
+        k_py, s_py = simulate_qkd(seed, n_bits=3000, mode=mode, rng_version=2)
+        k_np, s_np = simulate_qkd(seed, n_bits=3000, mode=mode, rng_version=2, engine="numpy")
+        assert k_py == k_np
+        assert {k: v for k, v in s_py.items() if k != "engine"} == \
+               {k: v for k, v in s_np.items() if k != "engine"}
+
+
+def test_stream_version_statistics_and_legacy_default():
+    seed = _seeds(1)[0]
+    _, legacy = simulate_bb84(seed, n_bits=8192)
+    _, v2 = simulate_bb84(seed, n_bits=8192, rng_version=2)
+    assert legacy["rng_version"] == 1 and v2["rng_version"] == 2
+    assert 0.01 < v2["qber"] < 0.03
+    assert abs(v2["kept"] - 4096) < 300
+    with pytest.raises(ValueError):
+        simulate_bb84(seed, rng_version=3)
+
+
+def test_binomial_sampler_moments():
+    import random
+    from app.core.bb84_sim import _binomial
+
+    rng = random.Random(1)
+    for n, p in ((50, 0.1), (10_000, 0.3), (10_000, 0.9)):
+        xs = [_binomial(rng, n, p) for _ in range(4000)]
+        assert all(0 <= x <= n for x in xs)
+        assert abs(statistics.mean(xs) - n * p) < 4 * (n * p * (1 - p) / 4000) ** 0.5
+        assert abs(statistics.variance(xs) / (n * p * (1 - p)) - 1) < 0.1
+
+
+def test_decoy_counts_match_per_pulse_simulator():
+    from app.core.bb84_sim import simulate_bb84_decoy_counts
+
+    n = 4096
+    pulse = [simulate_bb84_decoy(s, n_bits=n)[1] for s in _seeds(40)]
+    fast = [simulate_bb84_decoy_counts(s, n_bits=n) for s in _seeds(200)]
+    for get, tol in ((lambda s: s["kept"], 15), (lambda s: s["decoy"]["detected_signal"], 15),
+                     (lambda s: s["decoy"]["detected_decoy"], 10), (lambda s: s["qber"], 0.004)):
+        assert abs(statistics.mean(map(get, pulse)) - statistics.mean(map(get, fast))) < tol
+    # spread matches too (kept ~ binomial over all pulses)
+    ratio = statistics.stdev(s["kept"] for s in fast) / statistics.stdev(s["kept"] for s in pulse)
+    assert 0.7 < ratio < 1.4
+
+
+def test_decoy_counts_cost_is_independent_of_n_bits():
+    from app.core.bb84_sim import simulate_bb84_decoy_counts
+
+    stats = simulate_bb84_decoy_counts(b"seed", n_bits=10**12)
+    assert stats["engine"] == "analytic"
+    assert abs(stats["kept"] / 10**12 - 0.5 * 0.9 * (0.7 * 0.3935 + 0.3 * 0.0952)) < 1e-3
@@ -0,0 +1,22 @@
+import json
+
+from bench import run
+
+
+def test_compare_flags_only_slowdowns_past_threshold():
+    base = {"a": {"median": 1.0}, "b": {"median": 1.0}, "c": {"median": 1.0}}
+    cur = {"a": {"median": 1.1}, "b": {"median": 1.5}, "c": {"median": 0.5}, "new": {"median": 9.0}}
+    assert run.compare(cur, base, 0.25) == [("b", 1.5)]
+
+
+def test_run_writes_results_and_fails_on_regression(tmp_path):
+    out = tmp_path / "r.json"
+    args = ["--no-http", "--filter", "wrap_key[32B]", "--repeat", "1"]
+    assert run.main(args + ["--out", str(out)]) == 0
+    doc = json.loads(out.read_text())
+    assert set(doc["results"]) == {"wrap_key[32B]"} and doc["meta"]["python"]
+
+    doc["results"]["wrap_key[32B]"]["median"] /= 100
+    fast = tmp_path / "fast.json"
+    fast.write_text(json.dumps(doc))
+    assert run.main(args + ["--baseline", str(fast)]) == 1
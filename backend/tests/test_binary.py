@@ -0,0 +1,98 @@
+import base64
+import os
+
+from fastapi.testclient import TestClient
+
+from app.core import cbor
+from app.main import app
+from app.services import storage
+
+client = TestClient(app)
+CBOR = {"Content-Type": "application/cbor", "Accept": "application/cbor"}
+
+
+def b64(b):
+    return base64.b64encode(b).decode()
+
+
+def test_qrng_negotiation():
+    assert "base64" in client.get("/qrng", params={"n": 16}).json()
+    r = client.get("/qrng", params={"n": 16}, headers={"Accept": "application/octet-stream"})
+    assert r.headers["content-type"] == "application/octet-stream" and len(r.content) == 16
+    r = client.get("/qrng", params={"n": 16}, headers={"Accept": "application/cbor"})
+    assert len(cbor.loads(r.content)["data"]) == 16
+    # JSON wins when the client prefers it, and for */*
+    for accept in ("application/json, application/cbor", "application/cbor;q=0.5, */*", "*/*"):
+        assert "base64" in client.get("/qrng", headers={"Accept": accept}).json()
+
+
+def test_simulate_bb84_representations_agree():
+    params = {"n_bits": 1024, "seed_b64": b64(b"binary-neg")}
+    js = client.get("/simulate_bb84", params=params).json()
+    cb = cbor.loads(client.get("/simulate_bb84", params=params, headers={"Accept": "application/cbor"}).content)
+    raw = client.get("/simulate_bb84", params=params, headers={"Accept": "application/octet-stream"})
+    assert base64.b64decode(js["base64_key"]) == cb["key"] == raw.content
+    assert js["qber"] == cb["qber"] == float(raw.headers["X-QBER"])
+    assert js["kept"] == int(raw.headers["X-Kept"]) and "privacy_amplification" not in js
+
+
+def test_wrap_key_cbor_body_matches_json():
+    key, iv, pt = os.urandom(32), os.urandom(12), b"member key"
+    js = client.post("/wrap_key", json={"wrap_key_b64": b64(key), "plaintext_b64": b64(pt), "iv_b64": b64(iv)}).json()
+    r = client.post("/wrap_key", content=cbor.dumps({"wrap_key": key, "plaintext": pt, "iv": iv}), headers=CBOR)
+    assert r.headers["content-type"] == "application/cbor"
+    assert cbor.loads(r.content) == {"iv": iv, "ct": base64.b64decode(js["ct_b64"]), "tag_included": True}
+
+    r = client.post("/wrap_key", content=cbor.dumps({"wrap_key": key, "plaintext": pt, "iv": iv}),
+                    headers={"Content-Type": "application/cbor", "Accept": "application/octet-stream"})
+    assert r.content == base64.b64decode(js["ct_b64"]) and r.headers["X-IV"] == b64(iv)
+
+    assert client.post("/wrap_key", content=cbor.dumps({"wrap_key": b64(key), "plaintext": pt}),
+                       headers=CBOR).status_code == 400
+    assert client.post("/wrap_key", content=b"\x9f", headers=CBOR).status_code == 400
+    assert client.post("/wrap_key", json={"plaintext_b64": b64(pt)}).status_code == 422
+    r = client.post("/wrap_key", json={"wrap_key_b64": "abc", "plaintext_b64": b64(pt)})
+    assert r.status_code == 400 and r.json()["detail"] == "wrap_key_b64 is not valid base64"
+
+
+def test_batch_cbor_roundtrip():
+    k1, k2 = os.urandom(32), os.urandom(16)
+    pts = [os.urandom(n) for n in (1, 32, 1000)]
+    items = [{"plaintext": pts[0]}, {"plaintext": pts[1], "wrap_key": k2}, {"plaintext": pts[2]}]
+    w = cbor.loads(client.post("/wrap_key/batch", content=cbor.dumps({"wrap_key": k1, "items": items}),
+                               headers=CBOR).content)
+    un = [{"iv": iv, "ct": ct} for iv, ct in zip(w["iv"], w["ct"])]
+    un[1]["wrap_key"] = k2
+    un[2]["ct"] = bytes(len(un[2]["ct"]))  # tampered
+    r = cbor.loads(client.post("/unwrap_key/batch", content=cbor.dumps({"wrap_key": k1, "items": un}),
+                               headers=CBOR).content)
+    assert r == {"plaintext": pts[:2] + [None], "failed": [2]}
+    assert client.post("/wrap_key/batch", content=cbor.dumps({"items": []}), headers=CBOR).status_code == 400
+
+
+def test_messages_cbor(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(storage, "_store", None)
+    iv, ct = os.urandom(12), os.urandom(40)
+    msgs = [{"chat_id": "c1", "sender_uid": "u", "iv": iv, "ct": ct}] * 3
+    r = client.post("/messages/bulk", content=cbor.dumps({"messages": msgs}), headers=CBOR)
+    assert all(x["message_id"] for x in cbor.loads(r.content)["results"])
+
+    page = client.get("/messages", params={"chat_id": "c1"}).json()
+    assert page[0]["iv_b64"] == b64(iv)  # stored as base64 for direct Firestore readers
+    r = client.get("/messages", params={"chat_id": "c1"}, headers={"Accept": "application/cbor"})
+    items = cbor.loads(r.content)
+    assert [(m["iv"], m["ct"], m["cursor"]) for m in items] == [(iv, ct, m["cursor"]) for m in page]
+    assert r.headers["X-Prev-Cursor"] == page[0]["cursor"]
+    bad = client.post("/messages", content=cbor.dumps({"chat_id": "c1", "iv": iv, "ct": ct}), headers=CBOR)
+    assert bad.status_code == 400
+
+
+def test_simulate_bb84_rejects_bad_seed():
+    r = client.get("/simulate_bb84", params={"n_bits": 128, "seed_b64": "not base64!"})
+    assert r.status_code == 400 and r.json()["detail"] == "seed_b64 is not valid base64"
+
+
+def test_qrng_bounds_n():
+    for n in (-32, 0, 65537):
+        assert client.get("/qrng", params={"n": n}).status_code == 422
@@ -0,0 +1,31 @@
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from app.core.bitstream import BitStream, bernoulli_limit, stream_key
+
+
+def test_lane_matches_spec():
+    # AES-256-CTR under HMAC-SHA256("qw-bitstream-v2", seed), counter block lane||0^96
+    seed = b"\x01" * 32
+    iv = (7).to_bytes(4, "big") + bytes(12)
+    enc = Cipher(algorithms.AES(stream_key(seed)), modes.CTR(iv)).encryptor()
+    expected = enc.update(bytes(96))
+    s = BitStream(seed, 7)
+    assert s.read(10) + s.read(86) == expected
+
+
+def test_block_reads_are_sequential_and_lanes_independent():
+    seed = b"chat-seed"
+    a = BitStream(seed, 0)
+    whole = BitStream(seed, 0).bits(1000).to_bytes()
+    assert a.bits(1000).to_bytes() == whole
+    assert BitStream(seed, 1).read(16) != BitStream(seed, 0).read(16)
+
+
+def test_uniforms_and_bernoulli_agree():
+    seed = b"chat-seed"
+    us = BitStream(seed, 3).uniforms(5000)
+    assert all(0.0 <= u < 1.0 for u in us)
+    mask = BitStream(seed, 3).bernoulli(5000, 0.3)
+    assert mask.to_list() == [1 if u < 0.3 else 0 for u in us]
+    assert 1300 < mask.popcount() < 1700
+    assert bernoulli_limit(0.0) == 0 and bernoulli_limit(1.0) == 1 << 53
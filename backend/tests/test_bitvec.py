@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from app.core.bb84_sim import _hkdf_from_bits
+from app.core.bitvec import BitVector
+
+
+def _legacy_pack(bits):
+    by, acc, n = bytearray(), 0, 0
+    for b in bits:
+        acc = (acc << 1) | (1 if b else 0)
+        n += 1
+        if n == 8:
+            by.append(acc)
+            acc, n = 0, 0
+    if n:
+        by.append((acc << (8 - n)) & 0xFF)
+    return bytes(by)
+
+
+@pytest.mark.parametrize("n", [0, 1, 7, 8, 9, 1000])
+def test_roundtrip_and_packing_layout(n):
+    r = random.Random(n)
+    bits = [r.getrandbits(1) for _ in range(n)]
+    bv = BitVector.from_bits(bits)
+    assert len(bv) == n
+    assert bv.to_list() == bits
+    assert bv.to_bytes() == _legacy_pack(bits)
+    assert bv.popcount() == sum(bits)
+
+
+def test_word_ops_match_per_bit_reference():
+    r = random.Random(1)
+    a = [r.getrandbits(1) for _ in range(333)]
+    b = [r.getrandbits(1) for _ in range(333)]
+    va, vb = BitVector.from_bits(a), BitVector.from_bits(b)
+    assert (va ^ vb).to_list() == [x ^ y for x, y in zip(a, b)]
+    assert (va & vb).to_list() == [x & y for x, y in zip(a, b)]
+    assert (~va).to_list() == [1 - x for x in a]
+    assert (~va).popcount() == 333 - sum(a)
+    assert va.compress(vb).to_list() == [x for x, y in zip(a, b) if y]
+    with pytest.raises(ValueError):
+        va ^ BitVector.zeros(10)
+
+
+def test_from_rng_words_matches_getrandbits():
+    r1, r2 = random.Random(42), random.Random(42)
+    expected = [r1.getrandbits(1) for _ in range(500)]
+    assert BitVector.from_rng_words(r2.getrandbits(32 * 500), 500).to_list() == expected
+    assert r1.random() == r2.random()
+
+
+def test_hkdf_accepts_lists_and_bitvectors():
+    bits = [1, 0, 1, 1, 0, 0, 1, 0, 1, 1]
+    assert _hkdf_from_bits(bits, b"s") == _hkdf_from_bits(BitVector.from_bits(bits), b"s")
@@ -0,0 +1,49 @@
+from app.services.cache import FileStore, ResultCache, cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.t = 0.0
+
+    def __call__(self):
+        return self.t
+
+
+def test_lru_eviction_respects_byte_budget():
+    c = ResultCache(max_bytes=3 * (1 + 100 + 128), ttl=60)
+    for k in "abc":
+        c.put(k, b"x" * 100)
+    assert c.get("a") is not None  # a becomes most recent
+    c.put("d", b"x" * 100)
+    assert c.get("b") is None
+    assert c.get("a") is not None and c.get("d") is not None
+    s = c.stats()
+    assert s["evictions"] == 1 and s["bytes"] <= s["max_bytes"]
+    assert s["hits"] == 3 and s["misses"] == 1
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    c = ResultCache(max_bytes=1 << 20, ttl=10, clock=clock)
+    c.put("k", b"v")
+    clock.t = 9.9
+    assert c.get("k") == b"v"
+    clock.t = 10.1
+    assert c.get("k") is None
+    assert c.stats()["expirations"] == 1
+
+
+def test_shared_store_serves_other_workers(tmp_path):
+    worker_a = ResultCache(shared=FileStore(str(tmp_path), max_bytes=1 << 20, ttl=60))
+    worker_b = ResultCache(shared=FileStore(str(tmp_path), max_bytes=1 << 20, ttl=60))
+    calls = []
+    key = cache_key("simulate_bb84", b"seed", 2048, False)
+    worker_a.get_or_compute(key, lambda: calls.append(1) or b"result")
+    assert worker_b.get_or_compute(key, lambda: calls.append(1) or b"other") == b"result"
+    assert calls == [1]
+    assert worker_b.stats()["shared_hits"] == 1
+
+
+def test_cache_key_separates_inputs():
+    assert cache_key(b"ab", "c") != cache_key(b"a", "bc")
+    assert cache_key(b"s", 2048, False) != cache_key(b"s", 2048, True)
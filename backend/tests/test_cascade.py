@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from app.core.bb84_sim import _h2, simulate_qkd
+from app.core.cascade import reconcile
+
+
+@pytest.mark.parametrize("qber", [0.0, 0.01, 0.03, 0.06])
+def test_reconciles_and_counts_leakage(qber):
+    rng = np.random.default_rng(5)
+    n = 1 << 16
+    alice = rng.integers(0, 2, n, dtype=np.uint8)
+    flips = (rng.random(n) < qber).astype(np.uint8)
+    fixed, info = reconcile(alice, alice ^ flips, qber, b"seed")
+    assert np.array_equal(fixed, alice)
+    assert info["residual_errors"] == 0 and info["corrected"] == int(flips.sum())
+    if qber:
+        # Cascade leaks a little more than the Shannon bound n * H2(q)
+        assert n * _h2(qber) < info["leaked_bits"] < 1.5 * n * _h2(qber)
+
+
+def test_deterministic_in_seed():
+    rng = np.random.default_rng(6)
+    a = rng.integers(0, 2, 4096, dtype=np.uint8)
+    b = a ^ (rng.random(4096) < 0.05).astype(np.uint8)
+    assert reconcile(a, b, 0.05, b"s")[1] == reconcile(a, b, 0.05, b"s")[1]
+
+
+@pytest.mark.parametrize("mode", ["bb84", "decoy", "mdi"])
+def test_simulators_reconcile_identically_in_both_engines(mode):
+    k_py, s_py = simulate_qkd(b"rec", n_bits=8192, mode=mode, rng_version=2, reconcile="cascade")
+    k_np, s_np = simulate_qkd(b"rec", n_bits=8192, mode=mode, rng_version=2, reconcile="cascade", engine="numpy")
+    assert k_py == k_np
+    rec = s_py["reconciliation"]
+    assert rec == s_np["reconciliation"] and rec["residual_errors"] == 0 and rec["leaked_bits"] > 0
+    assert "reconciliation" not in simulate_qkd(b"rec", n_bits=8192, mode=mode)[1]
+
+
+def test_leakage_lowers_decoy_rate():
+    _, plain = simulate_qkd(b"rec", n_bits=8192, mode="decoy")
+    _, rec = simulate_qkd(b"rec", n_bits=8192, mode="decoy", reconcile="cascade")
+    leak = rec["reconciliation"]["leaked_bits"] / 8192
+    assert rec["decoy"]["secure_key_rate_toy"] == pytest.approx(plain["decoy"]["secure_key_rate_toy"] - leak)
+
+
+def test_unknown_method_rejected():
+    with pytest.raises(ValueError):
+        simulate_qkd(b"seed", reconcile="ldpc")
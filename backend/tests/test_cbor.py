@@ -0,0 +1,44 @@
+import pytest
+
+from app.core import cbor
+
+
+def test_roundtrip():
+    obj = {"key": b"\x00" * 300, "n": [0, 23, 24, 255, 65536, 2**64 - 1, -1, -2**64],
+           "qber": 0.015, "ok": True, "no": False, "pa": None, "text": "hé" * 20, 7: {"nested": []}}
+    assert cbor.loads(cbor.dumps(obj)) == obj
+
+
+@pytest.mark.parametrize("hexdata, value", [
+    ("1a000f4240", 1000000),
+    ("3903e7", -1000),
+    ("f93c00", 1.0),                          # half precision
+    ("fa47c35000", 100000.0),                 # single precision
+    ("c11a514b67b0", 1363896240),             # tag 1 dropped
+    ("5f42010243030405ff", b"\x01\x02\x03\x04\x05"),
+    ("7f657374726561646d696e67ff", "streaming"),
+    ("9f018202039f0405ffff", [1, [2, 3], [4, 5]]),
+    ("bf61610161629f0203ffff", {"a": 1, "b": [2, 3]}),
+])
+def test_rfc8949_vectors(hexdata, value):
+    assert cbor.loads(bytes.fromhex(hexdata)) == value
+
+
+@pytest.mark.parametrize("hexdata", [
+    "",
+    "9f01",           # unterminated indefinite array
+    "5affffffff00",   # byte string longer than the input
+    "9bffffffffffffffff",  # array header claiming 2**64 items
+    "1c",             # reserved additional info
+    "a101",           # map missing a value
+    "0101",           # trailing bytes
+    "62c328",         # invalid UTF-8
+])
+def test_rejects_malformed(hexdata):
+    with pytest.raises(ValueError):
+        cbor.loads(bytes.fromhex(hexdata))
+
+
+def test_rejects_deep_nesting():
+    with pytest.raises(ValueError):
+        cbor.loads(b"\x81" * (cbor.MAX_DEPTH + 2) + b"\x00")
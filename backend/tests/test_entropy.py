@@ -0,0 +1,92 @@
+import base64
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+from app.core.entropy import EntropyPool, _Ring
+
+
+class _QrngStandIn(BaseHTTPRequestHandler):
+    def do_GET(self):
+        n = int(parse_qs(urlparse(self.path).query)["length"][0])
+        body = json.dumps({"base64": base64.b64encode(b"\xab" * n).decode()}).encode()
+        self.server.requests += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def qrng_server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _QrngStandIn)
+    srv.requests = 0
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _wait_for(cond, timeout=5.0):
+    deadline = time.time() + timeout
+    while not cond():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+def test_ring_wraps():
+    r = _Ring(8)
+    assert r.write(b"abcdef") == 6
+    assert r.read(4) == b"abcd"
+    assert r.write(b"ghijkl") == 6
+    assert r.write(b"z") == 0
+    assert r.read(8) == b"efghijkl"
+    with pytest.raises(ValueError):
+        r.read(-1)
+    with pytest.raises(ValueError):
+        r.read(1)  # empty
+
+
+def test_pool_prefetches_and_serves_from_buffer(qrng_server):
+    url = f"http://127.0.0.1:{qrng_server.server_address[1]}/bytes?length="
+    pool = EntropyPool(url=url, low_water=64, high_water=256, fetch_bytes=128).start()
+    try:
+        _wait_for(lambda: pool.stats()["buffered"] == 256)
+        assert pool.take(32) == b"\xab" * 32
+        assert pool.stats()["served"] == 1
+        with pytest.raises(ValueError):
+            pool.take(-32)  # would rewind the ring and re-serve bytes
+        assert pool.stats()["buffered"] == 224
+        # more than is buffered -> per-request urandom fallback, refill triggered
+        assert len(pool.take(1000)) == 1000
+        assert pool.stats()["fallbacks"] == 1
+        for _ in range(7):
+            pool.take(32)
+        _wait_for(lambda: pool.stats()["buffered"] >= 192)
+    finally:
+        pool.close()
+
+
+def test_pool_falls_back_when_provider_unreachable():
+    pool = EntropyPool(url="http://127.0.0.1:9/?length=", timeout=0.2, retry_backoff=0.05).start()
+    try:
+        assert len(pool.take(16)) == 16
+        _wait_for(lambda: pool.stats()["fetch_errors"] >= 1)
+        assert pool.stats()["fallbacks"] >= 1
+    finally:
+        pool.close()
+
+
+def test_without_provider_uses_urandom():
+    pool = EntropyPool(url=None)
+    assert len(pool.take(32)) == 32
+    assert pool.stats()["fallbacks"] == 1
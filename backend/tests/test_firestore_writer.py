@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import firestore as fs
+
+_ids = itertools.count()
+
+
+class _Doc:
+    def __init__(self, path):
+        self.id = f"m{next(_ids)}"
+        self.path = path + "/" + self.id
+
+    def collection(self, name):
+        return _Coll(self.path + "/" + name)
+
+
+class _Coll:
+    def __init__(self, path):
+        self.path = path
+
+    def document(self, doc_id=None):
+        d = _Doc(self.path)
+        if doc_id:
+            d.id, d.path = doc_id, self.path + "/" + doc_id
+        return d
+
+
+class _Batch:
+    def __init__(self, db):
+        self.db, self.ops = db, []
+
+    def set(self, ref, data):
+        self.ops.append((ref.path, data))
+
+    async def commit(self):
+        await asyncio.sleep(0)
+        if self.db.fail_next:
+            self.db.fail_next = False
+            raise RuntimeError("deadline exceeded")
+        self.db.commits.append(self.ops)
+
+
+class FakeAsyncDB:
+    """In-memory stand-in for firestore.AsyncClient (collections, docs, batches)."""
+
+    def __init__(self):
+        self.commits = []
+        self.fail_next = False
+
+    def collection(self, name):
+        return _Coll(name)
+
+    def batch(self):
+        return _Batch(self)
+
+
+def test_bulk_writes_split_at_batch_limit():
+    db = FakeAsyncDB()
+
+    async def run():
+        w = fs.BatchWriter(lambda: db, max_delay=0.001)
+        return await w.add_many([("c1", {"n": i}) for i in range(1200)])
+
+    results = asyncio.run(run())
+    assert [len(c) for c in db.commits] == [500, 500, 200]
+    assert all("message_id" in r for r in results)
+    assert db.commits[0][0][0].startswith("chats/c1/messages/")
+
+
+def test_concurrent_single_writes_are_coalesced():
+    db = FakeAsyncDB()
+
+    async def run():
+        w = fs.BatchWriter(lambda: db, max_delay=0.005)
+        return await asyncio.gather(*(w.add("c", {"n": i}) for i in range(50)))
+
+    ids = asyncio.run(run())
+    assert len(set(ids)) == 50
+    assert len(db.commits) == 1
+
+
+def test_failed_commit_reports_per_item_errors():
+    db = FakeAsyncDB()
+    db.fail_next = True
+
+    async def run():
+        w = fs.BatchWriter(lambda: db, max_ops=10, max_delay=0.001)
+        return await w.add_many([("c", {"n": i}) for i in range(15)])
+
+    results = asyncio.run(run())
+    assert all(r["error"] == "deadline exceeded" for r in results[:10])
+    assert all("message_id" in r for r in results[10:])
+
+
+def test_fanout_failure_does_not_fail_committed_writes(monkeypatch, caplog):
+    db = FakeAsyncDB()
+
+    class BrokenHub:
+        def publish(self, chat_id, msg):
+            raise RuntimeError("listener exploded")
+    monkeypatch.setattr(fs, "get_hub", BrokenHub)
+
+    async def run():
+        w = fs.BatchWriter(lambda: db, max_delay=0.001)
+        results = await asyncio.wait_for(w.add_many([("c", {"n": i}) for i in range(3)]), 1.0)
+        return results, w._tasks
+
+    results, tasks = asyncio.run(run())
+    assert all("message_id" in r for r in results)  # durable, so no retry (and duplicate)
+    assert sum(len(c) for c in db.commits) == 3
+    assert "realtime fan-out failed" in caplog.text
+    assert not tasks  # finished flushes are released
+
+
+def test_bulk_endpoint(monkeypatch):
+    db = FakeAsyncDB()
+    monkeypatch.setenv("FIREBASE_SERVER_WRITES", "true")
+    monkeypatch.setattr(fs, "get_writer", lambda: fs.BatchWriter(lambda: db, max_delay=0.001))
+    msgs = [{"chat_id": "c", "sender_uid": "u", "iv_b64": "aXY=", "ct_b64": "Y3Q="}] * 3
+    r = TestClient(app).post("/messages/bulk", json={"messages": msgs})
+    assert r.status_code == 200
+    assert len(r.json()["results"]) == 3 and sum(len(c) for c in db.commits) == 3
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import storage
+from app.services.hub import Hub
+
+
+def test_drop_policy_keeps_newest_and_counts():
+    async def run():
+        hub = Hub()
+        sub = hub.subscribe("c", maxsize=3, policy="drop")
+        for i in range(5):
+            hub.publish("c", {"n": i})
+        hub.publish("other", {"n": -1})
+        return await sub.get()
+
+    msgs, dropped, overflowed = asyncio.run(run())
+    assert [m["n"] for m in msgs] == [2, 3, 4]
+    assert dropped == 2 and not overflowed
+
+
+def test_coalesce_flags_overflow_and_threaded_publish():
+    async def run():
+        hub = Hub()
+        sub = hub.subscribe("c", maxsize=2, policy="coalesce")
+        t = threading.Thread(target=lambda: [hub.publish("c", {"n": i}) for i in range(3)])
+        t.start()
+        t.join()
+        first = await sub.get()
+        hub.publish("c", {"n": 9})
+        second = await sub.get()
+        sub.close()
+        return first, second, hub.stats()
+
+    first, second, stats = asyncio.run(run())
+    assert first == ([], 0, True)
+    assert [m["n"] for m in second[0]] == [9]
+    assert stats["subscribers"] == 0 and stats["published"] == 4
+
+
+def test_batching_lingers_for_burst():
+    async def run():
+        hub = Hub()
+        sub = hub.subscribe("c")
+        loop = asyncio.get_running_loop()
+        for i in range(3):
+            loop.call_later(0.001 * i, hub.publish, "c", {"n": i})
+        return await sub.get(linger=0.05)
+
+    assert [m["n"] for m in asyncio.run(run())[0]] == [0, 1, 2]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(storage, "_store", None)
+    return TestClient(app)
+
+
+def test_websocket_live_and_resume(client):
+    msg = {"chat_id": "c", "sender_uid": "a", "iv_b64": "aXY=", "ct_b64": "Y3Q="}
+    with client.websocket_connect("/ws/chats/c") as ws:
+        client.post("/messages", json=msg)
+        frame = ws.receive_json()
+        assert frame["type"] == "messages" and frame["messages"][0]["ct_b64"] == "Y3Q="
+        cursor = frame["messages"][0]["cursor"]
+
+    client.post("/messages/bulk", json={"messages": [msg] * 3})
+    with client.websocket_connect(f"/ws/chats/c?cursor={cursor}") as ws:
+        replay = ws.receive_json()
+        assert replay["replay"] and len(replay["messages"]) == 3
+        client.post("/messages", json=msg)
+        live = ws.receive_json()
+        assert len(live["messages"]) == 1 and "replay" not in live
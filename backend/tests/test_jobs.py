@@ -0,0 +1,54 @@
+import base64
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.bb84_sim import simulate_qkd
+from app.main import app
+from app.services import jobs
+
+SEED = base64.b64encode(b"job-seed").decode()
+
+
+def _wait(mgr, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while mgr.get(job_id).state in jobs.ACTIVE_STATES:
+        assert time.time() < deadline
+        time.sleep(0.02)
+    return mgr.get(job_id)
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    mgr = jobs.JobManager(workers=1, max_pending=2)
+    monkeypatch.setattr(jobs, "_manager", mgr)
+    yield mgr
+    mgr.shutdown()
+
+
+def test_job_matches_direct_call_and_reports_progress(manager):
+    client = TestClient(app)
+    r = client.post("/jobs/simulate", json={"seed_b64": SEED, "n_bits": 200_000, "mode": "decoy", "rng_version": 2})
+    assert r.status_code == 202
+    job = _wait(manager, r.json()["job_id"])
+    out = client.get(f"/jobs/{job.id}").json()
+    assert out["state"] == "done" and out["progress"] == 1.0
+    key, stats = simulate_qkd(b"job-seed", n_bits=200_000, mode="decoy", engine="python", rng_version=2)
+    assert out["result"]["base64_key"] == base64.b64encode(key).decode()
+    assert out["result"]["stats"]["kept"] == stats["kept"]
+
+
+def test_queue_bound_and_cancel(manager):
+    client = TestClient(app)
+    body = {"seed_b64": SEED, "n_bits": 2_000_000}
+    first = client.post("/jobs/simulate", json=body).json()["job_id"]
+    second = client.post("/jobs/simulate", json=body).json()["job_id"]
+    full = client.post("/jobs/simulate", json=body)
+    assert full.status_code == 429 and full.headers["retry-after"]
+
+    for jid in (first, second):
+        assert client.delete(f"/jobs/{jid}").json()["state"] in ("cancelled", "cancelling")
+    assert {_wait(manager, jid).state for jid in (first, second)} == {"cancelled"}
+    assert client.get("/jobs/nope").status_code == 404
+    assert client.post("/jobs/simulate", json={**body, "n_bits": 1 << 30}).status_code == 400
@@ -0,0 +1,92 @@
+import base64
+import hashlib
+import hmac
+
+from fastapi.testclient import TestClient
+
+from app.core.bb84_sim import simulate_bb84
+from app.core.ratchet import Ratchet
+from app.main import app
+from app.services import keys, storage
+
+
+def _walk(base: bytes, epoch: int) -> bytes:
+    ck = hmac.new(b"qw-ratchet-v1", base, hashlib.sha256).digest()
+    for _ in range(epoch):
+        ck = hmac.new(ck, b"\x02", hashlib.sha256).digest()
+    return hmac.new(ck, b"\x01", hashlib.sha256).digest()
+
+
+def test_ratchet_matches_chain_definition():
+    r = Ratchet(b"base", checkpoint_every=16)
+    for e in (0, 1, 15, 16, 17, 100, 3):
+        assert r.key(e) == _walk(b"base", e)
+    assert len({r.key(e) for e in range(50)}) == 50
+
+
+def test_catch_up_uses_checkpoints():
+    r = Ratchet(b"base", checkpoint_every=64, recent=4)
+    r.key(10_000)
+    assert r.steps == 10_000
+    for e in (9_000, 1234, 5):
+        before = r.steps
+        assert r.key(e) == _walk(b"base", e)
+        assert r.steps - before < 64
+    before = r.steps
+    r.key(5)  # recent: no chain steps at all
+    assert r.steps == before
+
+
+def test_cache_budget_evicts_least_recent_chat(monkeypatch):
+    monkeypatch.setattr(keys.fs, "get_chat", lambda cid: {"q_seed_b64": base64.b64encode(cid.encode()).decode()})
+    cache = keys.KeyCache(max_bytes=20_000, checkpoint_every=8)
+    for cid in ("a", "b", "c"):
+        cache.keys(cid, keys.membership_proof(cid.encode(), cid), 400)  # ~50 checkpoints each
+    st = cache.stats()
+    assert st["evictions"] >= 1 and st["bytes"] <= 20_000
+    assert cache.head("a") is None and cache.head("c") == 400
+
+
+def test_endpoint(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(storage, "_store", None)
+    monkeypatch.setattr(keys, "_cache", None)
+    client = TestClient(app)
+    seed = base64.b64encode(b"chat-seed").decode()
+    chat = client.post("/chats", json={"members": ["a", "b"], "q_seed_b64": seed}).json()["chat_id"]
+
+    base, _ = simulate_bb84(b"chat-seed", n_bits=2048)
+    auth = {"X-Chat-Proof": base64.b64encode(keys.membership_proof(b"chat-seed", chat)).decode()}
+    r = client.get(f"/chats/{chat}/keys", params={"epoch": 2, "count": 3}, headers=auth).json()
+    assert [k["epoch"] for k in r["keys"]] == [2, 3, 4]
+    assert base64.b64decode(r["keys"][0]["base64_key"]) == _walk(base, 2)
+
+    r = client.get(f"/chats/{chat}/keys", params={"message_index": 250, "messages_per_epoch": 100},
+                   headers=auth).json()
+    assert r["epoch"] == 2 and r["messages_per_epoch"] == 100
+    assert client.get("/chats/nope/keys", headers=auth).status_code == 404
+    assert client.get(f"/chats/{chat}/keys", params={"epoch": 1, "message_index": 1},
+                      headers=auth).status_code == 400
+
+
+def test_endpoint_requires_membership_proof(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.setattr(storage, "_store", None)
+    monkeypatch.setattr(keys, "_cache", None)
+    client = TestClient(app)
+    seed = base64.b64encode(b"chat-seed").decode()
+    chat = client.post("/chats", json={"members": ["a", "b"], "q_seed_b64": seed}).json()["chat_id"]
+
+    assert client.get(f"/chats/{chat}/keys").status_code == 401
+    wrong = base64.b64encode(keys.membership_proof(b"other-seed", chat)).decode()
+    for _ in range(2):  # on the derive path, then with the ratchet cached
+        assert client.get(f"/chats/{chat}/keys", headers={"X-Chat-Proof": wrong}).status_code == 403
+        ok = base64.b64encode(keys.membership_proof(b"chat-seed", chat)).decode()
+        assert client.get(f"/chats/{chat}/keys", headers={"X-Chat-Proof": ok}).status_code == 200
+
+
+def test_endpoint_unavailable_when_messages_disabled(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "firestore")
+    monkeypatch.setenv("FIREBASE_SERVER_WRITES", "false")
+    r = TestClient(app).get("/chats/c1/keys", headers={"X-Chat-Proof": "AAAA"})
+    assert r.status_code == 503
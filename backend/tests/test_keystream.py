@@ -0,0 +1,63 @@
+import base64
+import json
+import tracemalloc
+
+from fastapi.testclient import TestClient
+
+from app.core.bb84_sim import simulate_bb84
+from app.core.keystream import bb84_key_stream
+from app.main import app
+
+SEED = b"stream-seed"
+
+
+def test_first_block_matches_monolithic_run():
+    blk = next(bb84_key_stream(SEED, block_bits=4096, max_keys=1))
+    _, stats = simulate_bb84(SEED, n_bits=4096, rng_version=2)
+    assert (blk["kept"], blk["qber"]) == (stats["kept"], stats["qber"])
+    assert len(blk["keys"]) == 1 and len(blk["keys"][0][1]) == 32
+
+
+def test_residue_carries_across_blocks():
+    # small blocks: no single block sifts 256 bits, so keys need residue from earlier blocks
+    blocks = list(bb84_key_stream(SEED, block_bits=256, key_bits=256, max_keys=5))
+    keys = [k for b in blocks for k in b["keys"]]
+    assert [i for i, _ in keys] == list(range(5))
+    assert len({k for _, k in keys}) == 5
+    assert all(b["residue_bits"] < 256 for b in blocks)
+    # deterministic in the seed, independent of how many keys are asked for
+    more = [k for b in bb84_key_stream(SEED, block_bits=256, max_keys=8) for k in b["keys"]]
+    assert more[:5] == keys
+
+
+def test_high_qber_blocks_are_discarded():
+    blocks = list(bb84_key_stream(SEED, block_bits=2048, max_blocks=5, eavesdrop=True, max_qber=0.05))
+    assert all(not b["accepted"] and not b["keys"] and b["residue_bits"] == 0 for b in blocks)
+
+
+def test_memory_is_constant_in_key_count():
+    def peak(n):
+        tracemalloc.start()
+        for _ in bb84_key_stream(SEED, block_bits=1024, max_keys=n):
+            pass
+        p = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return p
+
+    assert peak(400) < 2 * peak(20) + 64 * 1024
+
+
+def test_stream_endpoint():
+    seed = base64.b64encode(SEED).decode()
+    with TestClient(app).stream("GET", "/simulate_bb84/stream",
+                                params={"seed_b64": seed, "block_bits": 1024, "max_keys": 6}) as r:
+        assert r.status_code == 200 and r.headers["content-type"].startswith("application/x-ndjson")
+        blocks = [json.loads(line) for line in r.iter_lines() if line]
+    keys = [k for b in blocks for k in b["keys"]]
+    assert [k["index"] for k in keys] == list(range(6))
+    assert blocks[0]["keys"], "first keys arrive with the first block"
+    for cap in ({"max_keys": 4097}, {"max_blocks": 1001}):
+        r = TestClient(app).get("/simulate_bb84/stream", params={"seed_b64": seed, **cap})
+        assert r.status_code == 422
+    r = TestClient(app).get("/simulate_bb84/stream", params={"seed_b64": "not base64!"})
+    assert r.status_code == 400 and r.json()["detail"] == "seed_b64 is not valid base64"
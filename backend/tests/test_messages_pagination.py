@@ -0,0 +1,113 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from google.cloud import firestore
+
+from app.api.messages import MAX_PAGE
+from app.main import app
+from app.services import firestore as fs
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+class _Snap:
+    def __init__(self, doc_id, data):
+        self.id, self._data = doc_id, data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Query:
+    """Enough of google.cloud.firestore.Query for iter_messages: order_by/start_after/limit/stream."""
+
+    def __init__(self, docs, desc=False, after=None, n=None):
+        self.docs, self.desc, self.after, self.n = docs, desc, after, n
+        self.streamed = 0
+
+    def order_by(self, field, direction=firestore.Query.ASCENDING):
+        return _Query(self.docs, direction == firestore.Query.DESCENDING, self.after, self.n)
+
+    def start_after(self, fields):
+        return _Query(self.docs, self.desc, (fields["createdAt"], fields["__name__"]), self.n)
+
+    def limit(self, n):
+        return _Query(self.docs, self.desc, self.after, n)
+
+    def stream(self):
+        rows = sorted(self.docs.items(), key=lambda kv: (kv[1]["createdAt"], kv[0]), reverse=self.desc)
+        if self.after is not None:
+            past = (lambda k: k < self.after) if self.desc else (lambda k: k > self.after)
+            rows = [r for r in rows if past((r[1]["createdAt"], r[0]))]
+        for doc_id, data in rows[: self.n]:
+            yield _Snap(doc_id, data)
+
+
+class FakeDB:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def collection(self, name):
+        return self
+
+    def document(self, doc_id=None):
+        return self
+
+    def order_by(self, *a, **kw):
+        return _Query(self.docs).order_by(*a, **kw)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # two messages share a timestamp to exercise the document-id tiebreak
+    docs = {f"m{i:02d}": {"senderUid": "u", "createdAt": T0 + timedelta(seconds=i // 2)} for i in range(25)}
+    fake = FakeDB(docs)
+    monkeypatch.setattr(fs, "get_db", lambda: fake)
+    monkeypatch.setenv("FIREBASE_SERVER_WRITES", "true")
+    return fake
+
+
+def test_cursor_roundtrip():
+    c = fs.encode_cursor(T0, "abc")
+    assert fs.decode_cursor(c) == {"createdAt": T0, "__name__": "abc"}
+    assert fs.decode_cursor(fs.encode_cursor(None, "x"))["createdAt"] is None
+    with pytest.raises(ValueError):
+        fs.decode_cursor("not-a-cursor")
+
+
+def test_forward_and_backward_pages_cover_everything_once(db):
+    seen, cursor = [], None
+    while True:
+        page = fs.list_messages("c", 10, start_after=cursor)
+        if not page:
+            break
+        seen += [m["message_id"] for m in page]
+        cursor = page[-1]["cursor"]
+    assert seen == sorted(db.docs)
+
+    back = fs.list_messages("c", 10, end_before=fs.encode_cursor(db.docs["m20"]["createdAt"], "m20"))
+    assert [m["message_id"] for m in back] == [f"m{i:02d}" for i in range(10, 20)]
+
+
+def test_http_pages_and_ndjson(db):
+    client = TestClient(app)
+    r = client.get("/messages", params={"chat_id": "c", "limit": 10})
+    assert r.status_code == 200 and len(r.json()) == 10
+    nxt = client.get("/messages", params={"chat_id": "c", "limit": 10, "start_after": r.headers["X-Next-Cursor"]})
+    assert nxt.json()[0]["message_id"] == "m10"
+    prev = client.get("/messages", params={"chat_id": "c", "limit": 10, "end_before": nxt.headers["X-Prev-Cursor"]})
+    assert prev.json() == r.json()
+
+    s = client.get("/messages", params={"chat_id": "c", "limit": 100}, headers={"Accept": "application/x-ndjson"})
+    assert s.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(x) for x in s.text.splitlines()]
+    assert [x["message_id"] for x in lines] == sorted(db.docs)
+    assert client.get("/messages", params={"chat_id": "c", "start_after": "%%"}).status_code == 400
+    assert client.get("/messages", params={"chat_id": "c", "limit": MAX_PAGE + 1}).status_code == 422
+
+
+def test_writes_get_server_timestamp():
+    assert fs._stamped({"a": 1})["createdAt"] is firestore.SERVER_TIMESTAMP
+    assert fs._stamped({"createdAt": T0})["createdAt"] == T0
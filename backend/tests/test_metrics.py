@@ -0,0 +1,34 @@
+import os
+
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.core.bb84_sim import simulate_mdi_bb84
+from app.main import app
+
+
+def test_histogram_exposition_is_cumulative():
+    h = metrics.Histogram("t_seconds", "test", ("op",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 5.0):
+        h.observe(v, "x")
+    lines = h.collect()
+    assert 't_seconds_bucket{op="x",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{op="x",le="1.0"} 3' in lines
+    assert 't_seconds_bucket{op="x",le="+Inf"} 4' in lines
+    assert 't_seconds_count{op="x"} 4' in lines
+
+
+def test_simulator_stages_recorded():
+    before = metrics.SIM_STAGE_SECONDS._series.get(("mdi", "python", "hkdf"), [0])[-1]
+    simulate_mdi_bb84(os.urandom(16), n_bits=256)
+    assert metrics.SIM_STAGE_SECONDS._series[("mdi", "python", "hkdf")][-1] == before + 1
+
+
+def test_metrics_endpoint_uses_route_templates():
+    client = TestClient(app)
+    client.get("/simulate_bb84", params={"n_bits": 256, "seed_b64": "AAAA"})
+    client.get("/no/such/path")
+    body = client.get("/metrics").text
+    assert 'qw_http_request_duration_seconds_count{method="GET",route="/simulate_bb84",status="200"}' in body
+    assert 'route="<unmatched>",status="404"' in body
+    assert 'qw_sim_stage_seconds_bucket{mode="bb84",engine="python",stage="bits"' in body
@@ -0,0 +1,54 @@
+import math
+import random
+
+from fastapi.testclient import TestClient
+
+from app.core import montecarlo
+from app.main import app
+
+
+def test_merge_matches_single_pass():
+    rng = random.Random(7)
+    xs = [rng.random() for _ in range(1000)]
+    whole, parts = montecarlo.RunningStats(), [montecarlo.RunningStats() for _ in range(3)]
+    for i, x in enumerate(xs):
+        whole.add(x)
+        parts[i % 3].add(x)
+    merged = montecarlo.RunningStats()
+    for p in parts:
+        merged.merge(p)
+    assert merged.n == 1000 and merged.hist == whole.hist
+    assert math.isclose(merged.mean, sum(xs) / 1000)
+    assert math.isclose(merged.m2, whole.m2)
+    assert abs(merged.quantile(0.5) - sorted(xs)[499]) <= 1 / montecarlo.BINS
+
+
+def test_child_seeds_are_distinct_and_stable():
+    seeds = {montecarlo.child_seed(b"m", i) for i in range(1000)}
+    assert len(seeds) == 1000
+    assert montecarlo.child_seed(b"m", 3) == montecarlo.child_seed(b"m", 3)
+
+
+def test_result_independent_of_worker_count():
+    kw = dict(n_bits=256, mode="mdi", rng_version=2)
+    one = montecarlo.run_trials(b"master", 100, workers=1, **kw)
+    two = montecarlo.run_trials(b"master", 100, workers=2, **kw)
+    assert one == two
+    q = one["stats"]["qber"]
+    assert q["n"] == 100 and q["ci95"][0] < q["mean"] < q["ci95"][1]
+
+
+def test_endpoint(monkeypatch):
+    monkeypatch.setenv("MC_WORKERS", "1")
+    r = TestClient(app).post("/simulate/montecarlo", json={"seed_b64": "AAAA", "trials": 40, "n_bits": 256, "mode": "decoy"})
+    assert r.status_code == 200
+    assert set(r.json()["stats"]) == {"qber", "kept_fraction", "secure_key_rate_toy"}
+    r = TestClient(app).post("/simulate/montecarlo", json={"seed_b64": "not base64!", "trials": 4})
+    assert r.status_code == 400 and r.json()["detail"] == "seed_b64 is not valid base64"
+
+
+def test_analytic_engine_is_decoy_only():
+    out = montecarlo.run_trials(b"m", 50, workers=1, mode="decoy", engine="analytic", n_bits=1 << 20)
+    assert 0.01 < out["stats"]["qber"]["mean"] < 0.03
+    r = TestClient(app).post("/simulate/montecarlo", json={"seed_b64": "AAAA", "trials": 4, "engine": "analytic"})
+    assert r.status_code == 400
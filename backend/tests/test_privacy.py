@@ -0,0 +1,59 @@
+import base64
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.bb84_sim import simulate_qkd
+from app.core.privacy import output_bits, toeplitz_hash
+from app.main import app
+
+
+def test_fft_matches_matrix_product():
+    rng = np.random.default_rng(3)
+    n, m = 300, 120
+    x = rng.integers(0, 2, n, dtype=np.uint8)
+    diag = rng.integers(0, 2, n + m - 1, dtype=np.uint8)
+    T = np.array([[diag[i - j + n - 1] for j in range(n)] for i in range(m)], dtype=np.int64)
+    assert np.array_equal(toeplitz_hash(x, diag, m), (T @ x) & 1)
+
+
+def test_output_length_tracks_leakage():
+    assert output_bits(10_000, 0.0) == 9928  # only the 2*log2(1/eps) margin
+    assert output_bits(10_000, 0.02) < output_bits(10_000, 0.01)
+    assert output_bits(10_000, 0.02, leaked_bits=5000) < output_bits(10_000, 0.02)
+    assert output_bits(10_000, 0.2) == 0
+
+
+def test_million_bit_input_is_interactive():
+    rng = np.random.default_rng(4)
+    x = rng.integers(0, 2, 1 << 20, dtype=np.uint8)
+    diag = rng.integers(0, 2, (1 << 20) + 800_000 - 1, dtype=np.uint8)
+    t = time.perf_counter()
+    y = toeplitz_hash(x, diag, 800_000)
+    assert time.perf_counter() - t < 5.0
+    assert y.size == 800_000 and 0.45 < y.mean() < 0.55
+
+
+@pytest.mark.parametrize("mode", ["bb84", "decoy", "mdi"])
+def test_simulators_select_toeplitz(mode):
+    k_py, s_py = simulate_qkd(b"pa", n_bits=16384, mode=mode, rng_version=2, reconcile="cascade", privacy="toeplitz")
+    k_np, s_np = simulate_qkd(b"pa", n_bits=16384, mode=mode, rng_version=2, reconcile="cascade", privacy="toeplitz",
+                              engine="numpy")
+    pa = s_py["privacy_amplification"]
+    assert k_py == k_np and pa == s_np["privacy_amplification"]
+    assert len(k_py) * 8 == pa["output_bits"] > 0
+    assert pa["leak_ec"] == s_py["reconciliation"]["leaked_bits"]
+    assert len(simulate_qkd(b"pa", n_bits=16384, mode=mode)[0]) == 32
+
+
+def test_simulate_bb84_endpoint():
+    client = TestClient(app)
+    params = {"n_bits": 8192, "seed_b64": base64.b64encode(b"pa-api").decode()}
+    plain = client.get("/simulate_bb84", params=params).json()
+    assert "privacy_amplification" not in plain
+    pa = client.get("/simulate_bb84", params={**params, "privacy": "toeplitz"}).json()
+    assert len(base64.b64decode(pa["base64_key"])) * 8 == pa["privacy_amplification"]["output_bits"] > 256
+    short = client.get("/simulate_bb84", params={**params, "n_bits": 128, "privacy": "toeplitz"})
+    assert short.status_code == 422 and "too short" in short.json()["detail"]
@@ -0,0 +1,66 @@
+import base64
+import os
+import time
+
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.main import app
+
+
+def test_trace_session_records_handler_stacks():
+    s = profiling.Session("trace")
+
+    @profiling.profiled
+    def handler():
+        return sum(i * i for i in range(1000))
+
+    token = profiling._current.set(s)
+    try:
+        handler()
+    finally:
+        profiling._current.reset(token)
+    s.stop()
+    out = s.collapsed()
+    assert "test_profiling.py:test_trace_session_records_handler_stacks.<locals>.handler;" in out
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in out.splitlines())
+
+
+def test_sampled_session_sees_busy_thread():
+    s = profiling.Session("sample", interval=0.0005)
+
+    @profiling.profiled
+    def busy():
+        end = time.perf_counter() + 0.05
+        while time.perf_counter() < end:
+            pass
+
+    token = profiling._current.set(s)
+    try:
+        busy()
+    finally:
+        profiling._current.reset(token)
+    s.stop()
+    assert "busy" in s.collapsed()
+
+
+def test_endpoint_profile_roundtrip(monkeypatch):
+    monkeypatch.setenv("PROFILE_TOKEN", "sekrit")
+    app.middleware_stack = None  # rebuild so the middleware picks up the token
+    client = TestClient(app)
+    params = {"n_bits": 4096, "seed_b64": base64.b64encode(os.urandom(16)).decode()}
+
+    assert "x-profile-id" not in client.get("/simulate_bb84", params=params).headers
+    r = client.get("/simulate_bb84", params=params, headers={"X-Profile-Token": "sekrit", "X-Profile-Mode": "trace"})
+    pid = r.headers["x-profile-id"]
+    prof = client.get(f"/debug/profiles/{pid}", headers={"X-Profile-Token": "sekrit"})
+    assert prof.status_code == 200 and "simulate_bb84" in prof.text
+    assert client.get(f"/debug/profiles/{pid}").status_code == 404
+    app.middleware_stack = None
+
+
+def test_malformed_profile_token_query_is_ignored():
+    mw = profiling.ProfilingMiddleware(None, token="sekrit")
+    for qs in (b"profile_token=", b"xprofile_token=1", b"a=1&profile_token"):
+        assert mw._mode({"headers": [], "query_string": qs}) is None
+    assert mw._mode({"headers": [], "query_string": b"profile_token=sekrit&profile_mode=trace"}) == "trace"
@@ -0,0 +1,38 @@
+import json
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_PROBE = """
+import json, sys
+import app.main
+print(json.dumps({
+    "modules": [m for m in ("google.cloud.firestore", "requests", "app.api.messages") if m in sys.modules],
+    "messages_routes": [p for p in app.main.app.openapi()["paths"] if p.startswith("/messages")],
+    "chat_routes": [p for p in app.main.app.openapi()["paths"] if p.startswith("/chats")],
+}))
+"""
+
+
+def _probe(**env):
+    base = {k: v for k, v in os.environ.items() if k not in ("STORAGE_BACKEND", "FIREBASE_SERVER_WRITES")}
+    base.update(env)
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=BACKEND, env=base,
+                         capture_output=True, text=True, check=True, timeout=120).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def test_import_skips_heavy_modules_when_messages_disabled():
+    r = _probe(FIREBASE_SERVER_WRITES="false")
+    assert r["modules"] == []
+    assert r["messages_routes"] == [] and r["chat_routes"] == []
+
+
+def test_messages_router_mounted_when_enabled():
+    r = _probe(STORAGE_BACKEND="memory")
+    assert "app.api.messages" in r["modules"]
+    assert "google.cloud.firestore" not in r["modules"]
+    assert r["messages_routes"]
+    assert "/chats/{chat_id}/keys" in r["chat_routes"]
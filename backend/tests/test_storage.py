@@ -0,0 +1,97 @@
+import threading
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services import firestore as fs
+from app.services import storage
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    s = storage.MemoryStore() if request.param == "memory" else storage.SQLiteStore(str(tmp_path / "qw.db"), pool_size=2)
+    yield s
+    s.close()
+
+
+def test_keyset_pages(store):
+    ids = [m["message_id"] for m in store.add_messages([("c", {"n": i}) for i in range(25)])]
+    store.add_message("other", {"n": -1})
+    assert [m["n"] for m in store.iter_messages("c")] == list(range(25))
+
+    seen, after = [], None
+    while True:
+        page = list(store.iter_messages("c", 10, after=after))
+        if not page:
+            break
+        seen += [m["message_id"] for m in page]
+        after = (page[-1]["createdAt"], page[-1]["message_id"])
+    assert seen == ids
+
+    last = list(store.iter_messages("c"))[20]
+    back = list(store.iter_messages("c", 5, before=(last["createdAt"], last["message_id"])))
+    assert [m["n"] for m in back] == [19, 18, 17, 16, 15]
+
+
+def test_explicit_created_at_is_ordered(store):
+    first = store.add_message("c", {"n": 0})
+    t0 = first["createdAt"]
+    assert next(store.iter_messages("c")) == first
+    store.add_message("c", {"n": -1, "createdAt": t0 - timedelta(seconds=1)})
+    assert [m["n"] for m in store.iter_messages("c")] == [-1, 0]
+    assert store.create_chat(["a", "b"], "c2VlZA==") != first["message_id"]
+
+
+def test_sqlite_concurrent_writers(tmp_path):
+    s = storage.SQLiteStore(str(tmp_path / "qw.db"))
+
+    def work(k):
+        for i in range(20):
+            s.add_message("c", {"w": k, "i": i})
+
+    threads = [threading.Thread(target=work, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    rows = list(s.iter_messages("c"))
+    assert len(rows) == 80
+    assert [r["i"] for r in rows if r["w"] == 2] == list(range(20))
+    s.close()
+
+
+def test_sqlite_suspended_readers_keep_no_connection(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "_READ_PAGE", 4)
+    s = storage.SQLiteStore(str(tmp_path / "qw.db"), pool_size=1, timeout=0.5)
+    s.add_messages([("c", {"n": i}) for i in range(10)])
+    stalled = [s.iter_messages("c", 10) for _ in range(3)]
+    for it in stalled:
+        next(it)  # a slow NDJSON client, parked mid-page
+    assert s.get_chat("nope") is None  # the single pooled reader is free
+    assert [m["n"] for m in stalled[0]] == list(range(1, 10))  # resumes across pages
+    s.close()
+
+
+def test_get_chat(store):
+    cid = store.create_chat(["a", "b"], "c2VlZA==")
+    chat = store.get_chat(cid)
+    assert chat["members"] == ["a", "b"] and chat["q_seed_b64"] == "c2VlZA==" and chat["createdAt"]
+    assert store.get_chat("missing") is None
+
+
+def test_endpoints_on_memory_backend(monkeypatch):
+    monkeypatch.setenv("STORAGE_BACKEND", "memory")
+    monkeypatch.delenv("FIREBASE_SERVER_WRITES", raising=False)
+    monkeypatch.setattr(storage, "_store", None)
+    client = TestClient(app)
+    chat = client.post("/chats", json={"members": ["a", "b"], "q_seed_b64": "c2VlZA=="}).json()["chat_id"]
+    msg = {"chat_id": chat, "sender_uid": "a", "iv_b64": "aXY=", "ct_b64": "Y3Q="}
+    assert client.post("/messages", json=msg).status_code == 200
+    assert client.post("/messages/bulk", json={"messages": [msg] * 4}).status_code == 200
+    page = client.get("/messages", params={"chat_id": chat, "limit": 3})
+    assert len(page.json()) == 3 and page.json()[0]["createdAt"]
+    rest = client.get("/messages", params={"chat_id": chat, "start_after": page.headers["X-Next-Cursor"]})
+    assert len(rest.json()) == 2
+    assert fs.enabled()
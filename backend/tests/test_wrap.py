@@ -0,0 +1,57 @@
+import base64
+import os
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def b64(b):
+    return base64.b64encode(b).decode()
+
+
+def test_batch_roundtrip_with_shared_and_per_item_keys():
+    k1, k2 = os.urandom(32), os.urandom(32)
+    pts = [os.urandom(32) for _ in range(5)]
+    items = [{"plaintext_b64": b64(p)} for p in pts[:3]]
+    items += [{"plaintext_b64": b64(p), "wrap_key_b64": b64(k2)} for p in pts[3:]]
+    r = client.post("/wrap_key/batch", json={"wrap_key_b64": b64(k1), "items": items})
+    assert r.status_code == 200
+    body = r.json()
+    assert len(body["iv_b64"]) == len(body["ct_b64"]) == 5
+
+    un = [{"iv_b64": iv, "ct_b64": ct} for iv, ct in zip(body["iv_b64"], body["ct_b64"])]
+    for u in un[3:]:
+        u["wrap_key_b64"] = b64(k2)
+    un[0]["ct_b64"] = b64(b"\x00" * 48)  # tampered
+    r = client.post("/unwrap_key/batch", json={"wrap_key_b64": b64(k1), "items": un})
+    assert r.status_code == 200
+    out = r.json()
+    assert out["failed"] == [0] and out["plaintext_b64"][0] is None
+    assert [base64.b64decode(p) for p in out["plaintext_b64"][1:]] == pts[1:]
+
+
+def test_batch_matches_single_wrap_for_fixed_iv():
+    key, iv, pt = os.urandom(32), os.urandom(12), b"member key"
+    single = client.post("/wrap_key", json={
+        "wrap_key_b64": b64(key), "plaintext_b64": b64(pt), "iv_b64": b64(iv)}).json()
+    batch = client.post("/wrap_key/batch", json={
+        "wrap_key_b64": b64(key), "items": [{"plaintext_b64": b64(pt), "iv_b64": b64(iv)}]}).json()
+    assert batch["ct_b64"] == [single["ct_b64"]]
+
+
+def test_batch_rejects_iv_reuse_under_same_key():
+    key, iv = b64(os.urandom(32)), b64(os.urandom(12))
+    items = [{"plaintext_b64": b64(b"a"), "iv_b64": iv}, {"plaintext_b64": b64(b"b"), "iv_b64": iv}]
+    r = client.post("/wrap_key/batch", json={"wrap_key_b64": key, "items": items})
+    assert r.status_code == 400
+    # same IV under different keys is fine
+    items[1]["wrap_key_b64"] = b64(os.urandom(32))
+    assert client.post("/wrap_key/batch", json={"wrap_key_b64": key, "items": items}).status_code == 200
+
+
+def test_batch_requires_a_key():
+    r = client.post("/wrap_key/batch", json={"items": [{"plaintext_b64": b64(b"x")}]})
+    assert r.status_code == 400